@@ -1,38 +1,77 @@
 # backend/src/api/database_api.py
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from typing import Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Dict, Any, List, Optional, AsyncIterator
 import os
+import orjson
 from datetime import datetime
 
 from database.db_manager import db_manager
-from database.data_access import data_access
+from database.data_access import data_access, next_page_cursor
+from services.task_queue import task_queue
+from api.responses import json_response, make_etag, cached_json_response, utcnow_iso
 from models.data_models import (
     KnowledgeBase, QAPairModel, ConversationRecord,
     SearchRequest, SearchResponse
 )
 
-router = APIRouter(prefix="/api/database", tags=["database"])
+router = APIRouter(
+    prefix="/api/database",
+    tags=["database"],
+    default_response_class=ORJSONResponse
+)
+
+
+async def _stream_json_list(first,
+                            items: AsyncIterator,
+                            limit: int,
+                            cursor_field: str) -> AsyncIterator[bytes]:
+    """将模型流逐条序列化为 {"status", "data", "total", "next_cursor"} 结构的JSON字节流
+
+    first 为调用方预取的首条结果，查询本身的失败在开始发送响应前就已抛出。
+    """
+    yield b'{"status":"success","data":['
+    total = 0
+    last = None
+    item = first
+    while item is not None:
+        yield (b',' if total else b'') + orjson.dumps(item.model_dump(mode="json"))
+        total += 1
+        last = item
+        item = await anext(items, None)
+    next_cursor = next_page_cursor(last, total, limit, cursor_field)
+    yield b'],"total":' + str(total).encode() + b',"next_cursor":' + orjson.dumps(next_cursor) + b'}'
 
 
 @router.get("/stats")
 async def get_database_stats():
     """获取数据库统计信息"""
     try:
-        stats = data_access.get_database_stats()
-        return {
+        stats = await data_access.get_database_stats()
+        return json_response({
             "status": "success",
             "data": stats,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": utcnow_iso()
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """获取缓存命中统计"""
+    return {
+        "status": "success",
+        "data": db_manager.get_cache_stats(),
+        "timestamp": utcnow_iso()
+    }
+
+
 @router.post("/knowledge")
 async def create_knowledge(knowledge: KnowledgeBase):
     """创建知识记录"""
     try:
-        knowledge_id = data_access.create_knowledge(knowledge)
+        knowledge_id = await data_access.create_knowledge(knowledge)
         return {
             "status": "success",
             "message": "知识记录创建成功",
@@ -42,29 +81,52 @@ async def create_knowledge(knowledge: KnowledgeBase):
         raise HTTPException(status_code=500, detail=f"创建知识记录失败: {str(e)}")
 
 
+@router.post("/knowledge/bulk")
+async def create_knowledge_bulk(items: List[KnowledgeBase]):
+    """批量创建知识记录"""
+    try:
+        created = await data_access.create_knowledge_bulk(items)
+        return {
+            "status": "success",
+            "message": "知识记录批量创建成功",
+            "created": created
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量创建知识记录失败: {str(e)}")
+
+
 @router.get("/knowledge/{knowledge_id}")
-async def get_knowledge(knowledge_id: int):
-    """获取知识记录"""
-    knowledge = data_access.get_knowledge_by_id(knowledge_id)
+async def get_knowledge(knowledge_id: int, request: Request):
+    """获取知识记录，以 id+updated_at 作为ETag支持条件请求"""
+    knowledge = await data_access.get_knowledge_by_id(knowledge_id)
     if not knowledge:
         raise HTTPException(status_code=404, detail="知识记录不存在")
-    return {"status": "success", "data": knowledge.dict()}
+
+    etag = make_etag(f"{knowledge.id}-{knowledge.updated_at}".encode())
+    return cached_json_response(
+        request,
+        {"status": "success", "data": knowledge.model_dump()},
+        etag
+    )
 
 
 @router.get("/knowledge")
 async def search_knowledge(
         query: Optional[str] = None,
         limit: int = 10,
-        offset: int = 0
+        offset: int = 0,
+        before: Optional[datetime] = None,
+        before_id: Optional[int] = None
 ):
-    """搜索知识记录"""
+    """搜索知识记录，翻页时优先使用上一页返回的 next_cursor"""
     try:
-        results = data_access.search_knowledge(query, limit, offset)
-        return {
-            "status": "success",
-            "data": [item.dict() for item in results],
-            "total": len(results)
-        }
+        items = data_access.iter_knowledge(query, limit, offset, before, before_id)
+        # 预取首条：查询失败时在发送响应头之前返回500，而不是输出截断的JSON
+        first = await anext(items, None)
+        return StreamingResponse(
+            _stream_json_list(first, items, limit, "updated_at"),
+            media_type="application/json"
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
 
@@ -73,7 +135,7 @@ async def search_knowledge(
 async def create_qa_pair(qa_pair: QAPairModel):
     """创建问答对"""
     try:
-        qa_id = data_access.create_qa_pair(qa_pair)
+        qa_id = await data_access.create_qa_pair(qa_pair)
         return {
             "status": "success",
             "message": "问答对创建成功",
@@ -87,7 +149,7 @@ async def create_qa_pair(qa_pair: QAPairModel):
 async def create_conversation(conversation: ConversationRecord):
     """创建对话记录"""
     try:
-        conv_id = data_access.create_conversation(conversation)
+        conv_id = await data_access.create_conversation(conversation)
         return {
             "status": "success",
             "message": "对话记录创建成功",
@@ -101,16 +163,19 @@ async def create_conversation(conversation: ConversationRecord):
 async def get_user_conversations(
         user_id: str,
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        before: Optional[datetime] = None,
+        before_id: Optional[int] = None
 ):
-    """获取用户对话历史"""
+    """获取用户对话历史，翻页时优先使用上一页返回的 next_cursor"""
     try:
-        conversations = data_access.get_user_conversations(user_id, limit, offset)
-        return {
-            "status": "success",
-            "data": [conv.dict() for conv in conversations],
-            "total": len(conversations)
-        }
+        items = data_access.iter_user_conversations(user_id, limit, offset, before, before_id)
+        # 预取首条：查询失败时在发送响应头之前返回500，而不是输出截断的JSON
+        first = await anext(items, None)
+        return StreamingResponse(
+            _stream_json_list(first, items, limit, "created_at"),
+            media_type="application/json"
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取对话历史失败: {str(e)}")
 
@@ -123,7 +188,7 @@ async def create_memory_node(
 ):
     """创建记忆节点"""
     try:
-        success = data_access.create_memory_node(entity, node_type, properties or {})
+        success = await data_access.create_memory_node(entity, node_type, properties or {})
         if success:
             return {"status": "success", "message": "记忆节点创建成功"}
         else:
@@ -139,7 +204,7 @@ async def search_memories(
 ):
     """搜索记忆"""
     try:
-        results = data_access.search_memories(query, limit)
+        results = await data_access.search_memories(query, limit)
         return {
             "status": "success",
             "data": results,
@@ -152,62 +217,70 @@ async def search_memories(
 @router.get("/memory/graph/{entity}")
 async def get_memory_graph(
         entity: str,
+        request: Request,
         depth: int = 2
 ):
-    """获取记忆图"""
+    """获取记忆图，以子图内容摘要作为ETag支持条件请求"""
     try:
-        graph = data_access.get_memory_subgraph(entity, depth)
-        return {
-            "status": "success",
-            "data": graph
-        }
+        graph = await data_access.get_memory_subgraph(entity, depth)
+        return cached_json_response(
+            request,
+            {"status": "success", "data": graph},
+            make_etag(orjson.dumps(graph))
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取记忆图失败: {str(e)}")
 
 
 @router.post("/backup/mysql")
-async def backup_mysql(background_tasks: BackgroundTasks):
-    """备份MySQL数据库"""
+async def backup_mysql():
+    """备份MySQL数据库（投递到后台任务队列）"""
     try:
-        def do_backup():
-            backup_file = db_manager.backup_mysql()
-            if backup_file:
-                logger.info(f"MySQL备份任务完成: {backup_file}")
-
-        background_tasks.add_task(do_backup)
+        job_id = await task_queue.enqueue("backup_mysql_task")
         return {
             "status": "success",
-            "message": "MySQL备份任务已启动",
-            "timestamp": datetime.utcnow().isoformat()
+            "message": "MySQL备份任务已提交",
+            "job_id": job_id,
+            "timestamp": utcnow_iso()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"启动备份失败: {str(e)}")
 
 
 @router.post("/backup/neo4j")
-async def backup_neo4j(background_tasks: BackgroundTasks):
-    """备份Neo4j数据库"""
+async def backup_neo4j():
+    """备份Neo4j数据库（投递到后台任务队列）"""
     try:
-        def do_backup():
-            backup_file = db_manager.backup_neo4j()
-            if backup_file:
-                logger.info(f"Neo4j备份任务完成: {backup_file}")
-
-        background_tasks.add_task(do_backup)
+        job_id = await task_queue.enqueue("backup_neo4j_task")
         return {
             "status": "success",
-            "message": "Neo4j备份任务已启动",
-            "timestamp": datetime.utcnow().isoformat()
+            "message": "Neo4j备份任务已提交",
+            "job_id": job_id,
+            "timestamp": utcnow_iso()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"启动备份失败: {str(e)}")
 
 
+@router.get("/backup/status/{job_id}")
+async def get_backup_status(job_id: str):
+    """查询备份任务状态"""
+    try:
+        job_info = await task_queue.get_status(job_id)
+        return {
+            "status": "success",
+            "data": job_info,
+            "timestamp": utcnow_iso()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"查询备份任务失败: {str(e)}")
+
+
 @router.post("/cleanup")
 async def cleanup_old_data(days: int = 30):
     """清理旧数据"""
     try:
-        stats = data_access.cleanup_old_data(days)
+        stats = await data_access.cleanup_old_data(days)
         return {
             "status": "success",
             "message": f"清理了 {days} 天前的数据",
@@ -219,26 +292,23 @@ async def cleanup_old_data(days: int = 30):
 
 @router.get("/health")
 async def database_health():
-    """数据库健康检查"""
+    """数据库健康检查，各数据库并发探测，结果短时缓存"""
     try:
-        # 检查MySQL连接
-        with db_manager.mysql_session() as session:
-            session.execute("SELECT 1")
-
-        # 检查Neo4j连接
-        with db_manager.neo4j_session() as session:
-            session.run("RETURN 1")
+        checks = await db_manager.cached_health()
+        for name in ("mysql", "neo4j"):
+            if checks[name]["status"] != "connected":
+                raise Exception(checks[name]["error"])
 
         return {
             "status": "healthy",
             "mysql": "connected",
             "neo4j": "connected",
-            "redis": "connected" if db_manager._redis_client else "not_configured",
-            "timestamp": datetime.utcnow().isoformat()
+            "redis": "disconnected" if checks["redis"]["status"] == "error" else checks["redis"]["status"],
+            "timestamp": utcnow_iso()
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
\ No newline at end of file
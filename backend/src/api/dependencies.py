@@ -0,0 +1,48 @@
+# backend/src/api/dependencies.py
+from functools import lru_cache
+
+from services.llm_service import LLMService
+from services.retriever_service import RetrieverService
+from services.rag_agent import RAGAgent
+from services.semantic_cache import SemanticCache
+
+
+# 各服务组件在进程内只创建一次，lifespan 启动时预先调用完成初始化，
+# 之后的调用直接返回同一实例
+
+@lru_cache(maxsize=1)
+def get_llm_service() -> LLMService:
+    # 与检索服务共用同一个LLM服务实例，提示词缓存在各调用方之间共享
+    return get_retriever_service().llm_service
+
+
+@lru_cache(maxsize=1)
+def get_retriever_service() -> RetrieverService:
+    return RetrieverService()
+
+
+@lru_cache(maxsize=1)
+def get_rag_agent() -> RAGAgent:
+    return RAGAgent(llm_service=get_llm_service(), retriever=get_retriever_service())
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache:
+    """语义缓存复用RAG检索使用的向量模型，索引需在启动时调用 load() 从Redis重建"""
+    return SemanticCache(get_retriever_service().embedding_model)
+
+
+def is_initialized(factory) -> bool:
+    """组件是否已创建（用于状态接口，不会触发初始化）"""
+    return factory.cache_info().currsize > 0
+
+
+# 供 Depends 使用的 async 包装：FastAPI 会把同步依赖放到线程池执行，
+# async 依赖则在事件循环内直接调用，取缓存实例无需每次请求切换线程
+
+async def rag_agent_dependency() -> RAGAgent:
+    return get_rag_agent()
+
+
+async def semantic_cache_dependency() -> SemanticCache:
+    return get_semantic_cache()
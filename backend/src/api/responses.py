@@ -0,0 +1,64 @@
+# backend/src/api/responses.py
+import hashlib
+import time
+from datetime import datetime
+from typing import Any
+
+import orjson
+from fastapi import Request
+from fastapi.responses import Response
+
+# datetime 由 orjson 原生序列化，numpy 数组/标量（如相似度分数）直接输出
+JSON_DUMPS_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# 单实体只读接口的客户端缓存策略
+ENTITY_CACHE_CONTROL = "private, max-age=30"
+
+# 响应时间戳字符串的复用时长（秒）
+UTCNOW_ISO_RESOLUTION = 0.5
+
+_utcnow_iso_cache = [0.0, ""]
+
+
+class ServiceError(Exception):
+    """业务异常，由应用注册的异常处理器统一转换为错误响应"""
+
+    def __init__(self, detail: str, status_code: int = 500):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def json_response(payload: Any, status_code: int = 200) -> Response:
+    """将已构建好的负载直接序列化为JSON响应，跳过 jsonable_encoder 与响应模型校验"""
+    return Response(
+        content=orjson.dumps(payload, option=JSON_DUMPS_OPTIONS),
+        status_code=status_code,
+        media_type="application/json"
+    )
+
+
+def make_etag(version: bytes) -> str:
+    """由版本信息（如 id+updated_at 或负载本身）计算ETag"""
+    return f'"{hashlib.blake2b(version, digest_size=8).hexdigest()}"'
+
+
+def cached_json_response(request: Request, payload: Any, etag: str) -> Response:
+    """带 ETag/Cache-Control 的JSON响应，If-None-Match 命中时直接返回无响应体的304"""
+    headers = {"ETag": etag, "Cache-Control": ENTITY_CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    response = json_response(payload)
+    response.headers.update(headers)
+    return response
+
+
+def utcnow_iso() -> str:
+    """当前UTC时间的ISO格式字符串，UTCNOW_ISO_RESOLUTION 内复用同一字符串，免去每次响应的构造与格式化"""
+    now = time.time()
+    if now - _utcnow_iso_cache[0] >= UTCNOW_ISO_RESOLUTION:
+        _utcnow_iso_cache[:] = [now, datetime.utcfromtimestamp(now).isoformat()]
+    return _utcnow_iso_cache[1]
@@ -1,30 +1,102 @@
 # backend/src/config/settings.py
-import os
-from dotenv import load_dotenv
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
 
-load_dotenv()
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
-class Settings:
+# backend/.env，按模块位置定位，不受启动目录影响
+ENV_FILE = Path(__file__).resolve().parents[2] / ".env"
+
+
+class Settings(BaseSettings):
+    """应用配置，启动时从环境变量/.env 一次性解析并完成类型转换"""
+    model_config = SettingsConfigDict(env_file=ENV_FILE, extra="ignore")
+
     # 数据库配置
-    MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
-    MYSQL_PORT = os.getenv("MYSQL_PORT", 3306)
-    MYSQL_USER = os.getenv("MYSQL_USER", "root")
-    MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "password")
-    MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "rag_knowledge")
+    MYSQL_HOST: str = "localhost"
+    MYSQL_PORT: int = 3306
+    MYSQL_USER: str = "root"
+    MYSQL_PASSWORD: str = "password"
+    MYSQL_DATABASE: str = "rag_knowledge"
+    MYSQL_POOL_SIZE: int = 20
+    MYSQL_MAX_OVERFLOW: int = 10
+    MYSQL_POOL_RECYCLE: int = 1800
+    MYSQL_POOL_TIMEOUT: int = 10
+    # 每次检出都ping的开销较大，默认关闭，改为仅对空闲较久的连接探活
+    MYSQL_PRE_PING: bool = False
+    MYSQL_PING_IDLE_SECONDS: int = 300
 
     # Neo4j配置
-    NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-    NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
-    NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
+    NEO4J_URI: str = "bolt://localhost:7687"
+    NEO4J_USER: str = "neo4j"
+    NEO4J_PASSWORD: str = "password"
+
+    # Redis配置
+    REDIS_HOST: str = "localhost"
+    REDIS_PORT: int = 6379
+    REDIS_DB: int = 0
+    REDIS_PASSWORD: Optional[str] = None
+    REDIS_MAX_CONNECTIONS: int = 50
+
+    # 健康检查探测结果的缓存时间（秒），监控高频轮询时不再每次访问数据库/LLM
+    HEALTH_CACHE_TTL: float = 2.0
+
+    # 阻塞调用（LLM请求、检索、向量编码）所用线程池的大小
+    THREAD_POOL_SIZE: int = 64
+
+    # 后台任务队列配置
+    WORKER_MAX_JOBS: int = 2
+    WORKER_JOB_TIMEOUT: int = 3600
+
+    # 查询缓存键沿用旧的MD5哈希（切换期间保留已有缓存）
+    QUERY_CACHE_MD5_KEYS: bool = False
+
+    # 进程内L1查询缓存容量与过期时间上限（秒），条目有效期还受写入时的ttl与Redis剩余时间限制
+    L1_CACHE_SIZE: int = 10000
+    L1_CACHE_TTL: int = 300
+
+    # /query 语义缓存：问题向量余弦相似度命中阈值与条目过期时间（秒）
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_TTL: int = 3600
+
+    # LLM调用语义缓存：提示词相似度命中阈值、条目过期时间（秒）与最大条目数
+    LLM_CACHE_THRESHOLD: float = 0.95
+    LLM_CACHE_TTL: int = 300
+    LLM_CACHE_SIZE: int = 1024
+
+    # 对话记录批量写入：每批最大条数、最长攒批时间（秒）与待写入队列容量
+    CONVERSATION_BATCH_SIZE: int = 100
+    CONVERSATION_FLUSH_INTERVAL: float = 0.5
+    CONVERSATION_QUEUE_SIZE: int = 10000
+
+    # 记忆更新（实体抽取 + Neo4j写入）后台队列容量，队列满时丢弃新的更新
+    MEMORY_UPDATE_QUEUE_SIZE: int = 1024
+
+    # 知识向量索引文件（由后台worker维护）
+    FAISS_INDEX_PATH: str = "./data/faiss/knowledge.index"
+    # 检索服务临时文本索引（index_texts 写入）
+    TEXT_INDEX_PATH: str = "./data/faiss/text.index"
 
     # DeepSeek API配置
-    DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-    DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+    DEEPSEEK_API_KEY: Optional[str] = None
+    DEEPSEEK_API_URL: str = "https://api.deepseek.com/v1/chat/completions"
 
     # 其他配置
-    DEBUG = os.getenv("DEBUG", "True") == "True"
-    PORT = int(os.getenv("PORT", 8000))
+    DEBUG: bool = True
+    HOST: str = "0.0.0.0"
+    PORT: int = 8000
+    # uvicorn worker进程数，0 表示按CPU核数启动（DEBUG模式固定单worker热重载）
+    WORKERS: int = 0
+    # 单个worker同时处理的最大连接数，超出时直接返回503
+    LIMIT_CONCURRENCY: int = 1000
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """获取全局配置（仅解析一次）"""
+    return Settings()
 
 
-settings = Settings()
\ No newline at end of file
+settings = get_settings()
@@ -1,13 +1,77 @@
 # backend/src/database/data_access.py
-from typing import List, Optional, Dict, Any
-from sqlalchemy import desc, or_, and_
+from typing import List, Optional, Dict, Any, AsyncIterator
+from sqlalchemy import select, insert, update, delete, func, desc, or_, and_, text
+from sqlalchemy.dialects.mysql import match
 from datetime import datetime, timedelta
-import json
+import logging
+import asyncio
 
-from database.db_manager import db_manager
+from database.db_manager import db_manager, redis_cached
+from services.task_queue import task_queue
 from database.mysql_models import TextbookKnowledge, QAPair, ConversationHistory
 from models.data_models import KnowledgeBase, QAPairModel, ConversationRecord
 
+logger = logging.getLogger(__name__)
+
+# 流式查询时服务端游标每批拉取的行数
+STREAM_BATCH_SIZE = 200
+
+# 允许通过 update_knowledge 修改的列
+KNOWLEDGE_UPDATABLE_COLUMNS = frozenset(
+    column.key for column in TextbookKnowledge.__table__.columns
+    if column.key not in ('id', 'created_at', 'updated_at')
+)
+
+# 清理旧数据时每批删除的行数及批间停顿（秒）
+CLEANUP_BATCH_SIZE = 10000
+CLEANUP_BATCH_PAUSE = 0.05
+
+# 缓存键与过期时间（秒）
+STATS_CACHE_KEY = "db:stats"
+STATS_CACHE_TTL = 60
+SUBGRAPH_CACHE_TTL = 120
+
+# 记忆子图遍历的最大深度
+MAX_SUBGRAPH_DEPTH = 5
+
+
+NEO4J_STATS_QUERY = """
+CALL { MATCH (n) RETURN count(n) AS node_count }
+CALL { MATCH ()-[r]->() RETURN count(r) AS relationship_count }
+CALL {
+    MATCH (n)
+    WITH n.type AS type, count(*) AS count
+    ORDER BY count DESC
+    RETURN collect({type: type, count: count}) AS node_types
+}
+CALL {
+    MATCH ()-[r]->()
+    WITH r.type AS type, count(*) AS count
+    ORDER BY count DESC
+    RETURN collect({type: type, count: count}) AS relationship_types
+}
+RETURN node_count, relationship_count, node_types, relationship_types
+"""
+
+
+def next_page_cursor(last: Any, count: int, limit: int, field: str) -> Optional[Dict[str, Any]]:
+    """根据本页最后一条记录生成下一页的键集游标，不足一页时返回None"""
+    if last is None or count < limit:
+        return None
+
+    return {"before": getattr(last, field), "before_id": last.id}
+
+
+def _keyset_filter(column, id_column, before: Optional[datetime], before_id: Optional[int]):
+    """键集分页条件：(column, id) 严格小于游标"""
+    if before_id is None:
+        return column < before
+    return or_(column < before, and_(column == before, id_column < before_id))
+
+
+def _subgraph_cache_key(entity: str, depth="*") -> str:
+    return f"graph:{entity}:{depth}"
+
 
 class DataAccessLayer:
     """数据访问层，处理所有数据库操作"""
@@ -17,416 +81,623 @@ class DataAccessLayer:
 
     # ========== Textbook Knowledge 操作 ==========
 
-    def create_knowledge(self, knowledge: KnowledgeBase) -> int:
+    async def create_knowledge(self, knowledge: KnowledgeBase) -> int:
         """创建知识记录"""
-        with self.db_manager.mysql_session() as session:
+        async with self.db_manager.async_session() as session:
             db_knowledge = TextbookKnowledge(
                 title=knowledge.title,
                 content=knowledge.content,
                 chapter=knowledge.chapter,
                 section=knowledge.section,
-                tags=json.dumps(knowledge.tags, ensure_ascii=False),
+                tags=knowledge.tags,
                 created_at=datetime.utcnow(),
                 updated_at=datetime.utcnow()
             )
+            # 提交时自动flush并回填主键，无需单独flush
             session.add(db_knowledge)
-            session.flush()
-            knowledge_id = db_knowledge.id
 
-            # 更新FAISS索引
-            self._update_faiss_index(knowledge.content)
+        await self.db_manager.invalidate_cache_async(STATS_CACHE_KEY)
+        await self._schedule_indexing()
+
+        return db_knowledge.id
+
+    async def create_knowledge_bulk(self, items: List[KnowledgeBase]) -> int:
+        """批量创建知识记录，单个事务内一次executemany写入"""
+        if not items:
+            return 0
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "title": item.title,
+                "content": item.content,
+                "chapter": item.chapter,
+                "section": item.section,
+                "tags": item.tags,
+                "created_at": now,
+                "updated_at": now
+            }
+            for item in items
+        ]
+
+        async with self.db_manager.async_session() as session:
+            await session.execute(insert(TextbookKnowledge), rows)
 
-            return knowledge_id
+        await self.db_manager.invalidate_cache_async(STATS_CACHE_KEY)
+        await self._schedule_indexing()
 
-    def get_knowledge_by_id(self, knowledge_id: int) -> Optional[KnowledgeBase]:
+        return len(rows)
+
+    async def get_knowledge_by_id(self, knowledge_id: int) -> Optional[KnowledgeBase]:
         """根据ID获取知识"""
-        with self.db_manager.mysql_session() as session:
-            db_knowledge = session.query(TextbookKnowledge).get(knowledge_id)
+        async with self.db_manager.async_session() as session:
+            db_knowledge = await session.get(TextbookKnowledge, knowledge_id)
             if db_knowledge:
                 return self._convert_to_knowledge_model(db_knowledge)
         return None
 
-    def search_knowledge(self,
-                         query: str,
-                         limit: int = 10,
-                         offset: int = 0) -> List[KnowledgeBase]:
-        """搜索知识"""
-        with self.db_manager.mysql_session() as session:
-            # 全文搜索
-            if query:
-                db_results = session.query(TextbookKnowledge).filter(
-                    or_(
-                        TextbookKnowledge.title.contains(query),
-                        TextbookKnowledge.content.contains(query)
-                    )
-                ).order_by(desc(TextbookKnowledge.updated_at))
-            else:
-                db_results = session.query(TextbookKnowledge).order_by(
-                    desc(TextbookKnowledge.updated_at)
-                )
-
-            db_results = db_results.limit(limit).offset(offset).all()
+    async def search_knowledge(self,
+                               query: str,
+                               limit: int = 10,
+                               offset: int = 0,
+                               before: Optional[datetime] = None,
+                               before_id: Optional[int] = None) -> List[KnowledgeBase]:
+        """搜索知识，传入 before/before_id 时使用键集分页代替 offset"""
+        async with self.db_manager.async_session() as session:
+            stmt = self._knowledge_search_stmt(query, limit, offset, before, before_id)
+            db_results = (await session.execute(stmt)).scalars().all()
             return [self._convert_to_knowledge_model(item) for item in db_results]
 
-    def update_knowledge(self, knowledge_id: int, updates: Dict[str, Any]) -> bool:
-        """更新知识"""
-        with self.db_manager.mysql_session() as session:
-            db_knowledge = session.query(TextbookKnowledge).get(knowledge_id)
-            if not db_knowledge:
+    async def iter_knowledge(self,
+                             query: str,
+                             limit: int = 10,
+                             offset: int = 0,
+                             before: Optional[datetime] = None,
+                             before_id: Optional[int] = None) -> AsyncIterator[KnowledgeBase]:
+        """流式搜索知识，基于服务端游标逐行产出"""
+        async with self.db_manager.async_session() as session:
+            stmt = self._knowledge_search_stmt(query, limit, offset, before, before_id)
+            db_results = await session.stream_scalars(
+                stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for item in db_results:
+                yield self._convert_to_knowledge_model(item)
+
+    async def update_knowledge(self, knowledge_id: int, updates: Dict[str, Any]) -> bool:
+        """更新知识，单条UPDATE语句完成，无需先加载整行"""
+        values = {
+            key: value for key, value in updates.items()
+            if key in KNOWLEDGE_UPDATABLE_COLUMNS
+        }
+        values['updated_at'] = datetime.utcnow()
+
+        async with self.db_manager.async_session() as session:
+            result = await session.execute(
+                update(TextbookKnowledge)
+                .where(TextbookKnowledge.id == knowledge_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
                 return False
 
-            for key, value in updates.items():
-                if hasattr(db_knowledge, key):
-                    if key == 'tags' and isinstance(value, list):
-                        setattr(db_knowledge, key, json.dumps(value, ensure_ascii=False))
-                    else:
-                        setattr(db_knowledge, key, value)
-
-            db_knowledge.updated_at = datetime.utcnow()
-            return True
-
-    def delete_knowledge(self, knowledge_id: int) -> bool:
-        """删除知识"""
-        with self.db_manager.mysql_session() as session:
-            db_knowledge = session.query(TextbookKnowledge).get(knowledge_id)
-            if not db_knowledge:
+        if 'content' in values:
+            # 向量只由正文编码，其它列变更无需重建
+            await self._schedule_reindexing(knowledge_id)
+        return True
+
+    async def delete_knowledge(self, knowledge_id: int) -> bool:
+        """删除知识，单条DELETE语句完成，根据影响行数判断记录是否存在"""
+        async with self.db_manager.async_session() as session:
+            result = await session.execute(
+                delete(TextbookKnowledge)
+                .where(TextbookKnowledge.id == knowledge_id)
+                .execution_options(synchronize_session=False)
+            )
+            if not result.rowcount:
                 return False
 
-            session.delete(db_knowledge)
-            return True
+        await self.db_manager.invalidate_cache_async(STATS_CACHE_KEY)
+        await self._schedule_reindexing(knowledge_id)
+        return True
 
     # ========== QA Pair 操作 ==========
 
-    def create_qa_pair(self, qa_pair: QAPairModel) -> int:
+    async def create_qa_pair(self, qa_pair: QAPairModel) -> int:
         """创建问答对"""
-        with self.db_manager.mysql_session() as session:
+        async with self.db_manager.async_session() as session:
             db_qa = QAPair(
                 question=qa_pair.question,
                 answer=qa_pair.answer,
                 source=qa_pair.source,
                 difficulty=qa_pair.difficulty,
                 subject=qa_pair.subject,
-                tags=json.dumps(qa_pair.tags, ensure_ascii=False),
+                tags=qa_pair.tags,
                 created_at=datetime.utcnow()
             )
             session.add(db_qa)
-            session.flush()
-            return db_qa.id
 
-    def get_qa_pair_by_id(self, qa_id: int) -> Optional[QAPairModel]:
+        await self.db_manager.invalidate_cache_async(STATS_CACHE_KEY)
+        return db_qa.id
+
+    async def create_qa_pairs_bulk(self, items: List[QAPairModel]) -> int:
+        """批量创建问答对，单个事务内一次executemany写入"""
+        if not items:
+            return 0
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "question": item.question,
+                "answer": item.answer,
+                "source": item.source,
+                "difficulty": item.difficulty,
+                "subject": item.subject,
+                "tags": item.tags,
+                "created_at": now
+            }
+            for item in items
+        ]
+
+        async with self.db_manager.async_session() as session:
+            await session.execute(insert(QAPair), rows)
+
+        await self.db_manager.invalidate_cache_async(STATS_CACHE_KEY)
+
+        return len(rows)
+
+    async def get_qa_pair_by_id(self, qa_id: int) -> Optional[QAPairModel]:
         """根据ID获取问答对"""
-        with self.db_manager.mysql_session() as session:
-            db_qa = session.query(QAPair).get(qa_id)
+        async with self.db_manager.async_session() as session:
+            db_qa = await session.get(QAPair, qa_id)
             if db_qa:
                 return self._convert_to_qa_model(db_qa)
         return None
 
-    def search_qa_pairs(self,
-                        query: str = None,
-                        difficulty: str = None,
-                        subject: str = None,
-                        limit: int = 10,
-                        offset: int = 0) -> List[QAPairModel]:
+    async def search_qa_pairs(self,
+                              query: str = None,
+                              difficulty: str = None,
+                              subject: str = None,
+                              limit: int = 10,
+                              offset: int = 0) -> List[QAPairModel]:
         """搜索问答对"""
-        with self.db_manager.mysql_session() as session:
-            query_filters = []
-
-            if query:
-                query_filters.append(
-                    or_(
-                        QAPair.question.contains(query),
-                        QAPair.answer.contains(query)
-                    )
-                )
-
-            if difficulty:
-                query_filters.append(QAPair.difficulty == difficulty)
-
-            if subject:
-                query_filters.append(QAPair.subject == subject)
-
-            db_results = session.query(QAPair)
-            if query_filters:
-                db_results = db_results.filter(and_(*query_filters))
-
-            db_results = db_results.order_by(desc(QAPair.created_at))
-            db_results = db_results.limit(limit).offset(offset).all()
+        async with self.db_manager.async_session() as session:
+            stmt = self._qa_search_stmt(query, difficulty, subject, limit, offset)
+            db_results = (await session.execute(stmt)).scalars().all()
 
             return [self._convert_to_qa_model(item) for item in db_results]
 
+    async def iter_qa_pairs(self,
+                            query: str = None,
+                            difficulty: str = None,
+                            subject: str = None,
+                            limit: int = 10,
+                            offset: int = 0) -> AsyncIterator[QAPairModel]:
+        """流式搜索问答对，基于服务端游标逐行产出"""
+        async with self.db_manager.async_session() as session:
+            stmt = self._qa_search_stmt(query, difficulty, subject, limit, offset)
+            db_results = await session.stream_scalars(
+                stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for item in db_results:
+                yield self._convert_to_qa_model(item)
+
     # ========== Conversation History 操作 ==========
 
-    def create_conversation(self, record: ConversationRecord) -> int:
+    async def create_conversation(self, record: ConversationRecord) -> int:
         """创建对话记录"""
-        with self.db_manager.mysql_session() as session:
+        async with self.db_manager.async_session() as session:
             db_conv = ConversationHistory(
                 user_id=record.user_id,
                 session_id=record.session_id,
                 query=record.query,
                 response=record.response,
-                context=json.dumps(record.context, ensure_ascii=False) if record.context else None,
-                memory_used=json.dumps(
-                    [mem.dict() for mem in record.memory_used] if record.memory_used else [],
-                    ensure_ascii=False
-                ),
+                context=record.context,
+                memory_used=[
+                    mem.model_dump(mode="json") for mem in record.memory_used
+                ] if record.memory_used else [],
                 created_at=datetime.utcnow()
             )
             session.add(db_conv)
-            session.flush()
-            return db_conv.id
-
-    def get_user_conversations(self,
-                               user_id: str,
-                               limit: int = 50,
-                               offset: int = 0) -> List[ConversationRecord]:
-        """获取用户对话历史"""
-        with self.db_manager.mysql_session() as session:
-            db_convs = session.query(ConversationHistory).filter(
-                ConversationHistory.user_id == user_id
-            ).order_by(desc(ConversationHistory.created_at))
 
-            db_convs = db_convs.limit(limit).offset(offset).all()
+        return db_conv.id
+
+    async def create_conversations_bulk(self, records: List[ConversationRecord]) -> int:
+        """批量创建对话记录，单个事务内一次executemany写入"""
+        if not records:
+            return 0
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "user_id": record.user_id,
+                "session_id": record.session_id,
+                "query": record.query,
+                "response": record.response,
+                "context": record.context,
+                "memory_used": [
+                    mem.model_dump(mode="json") for mem in record.memory_used
+                ] if record.memory_used else [],
+                "created_at": record.created_at or now
+            }
+            for record in records
+        ]
+
+        async with self.db_manager.async_session() as session:
+            await session.execute(insert(ConversationHistory), rows)
+
+        return len(rows)
+
+    async def get_user_conversations(self,
+                                     user_id: str,
+                                     limit: int = 50,
+                                     offset: int = 0,
+                                     before: Optional[datetime] = None,
+                                     before_id: Optional[int] = None) -> List[ConversationRecord]:
+        """获取用户对话历史，传入 before/before_id 时使用键集分页代替 offset"""
+        async with self.db_manager.async_session() as session:
+            stmt = self._user_conversations_stmt(user_id, limit, offset, before, before_id)
+
+            db_convs = (await session.execute(stmt)).scalars().all()
 
             return [self._convert_to_conversation_model(conv) for conv in db_convs]
 
-    def get_recent_conversations(self, hours: int = 24) -> List[ConversationRecord]:
+    async def iter_user_conversations(self,
+                                      user_id: str,
+                                      limit: int = 50,
+                                      offset: int = 0,
+                                      before: Optional[datetime] = None,
+                                      before_id: Optional[int] = None) -> AsyncIterator[ConversationRecord]:
+        """流式获取用户对话历史，基于服务端游标逐行产出"""
+        async with self.db_manager.async_session() as session:
+            stmt = self._user_conversations_stmt(user_id, limit, offset, before, before_id)
+
+            db_convs = await session.stream_scalars(
+                stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for conv in db_convs:
+                yield self._convert_to_conversation_model(conv)
+
+    async def get_recent_conversations(self, hours: int = 24) -> List[ConversationRecord]:
         """获取最近对话"""
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
 
-        with self.db_manager.mysql_session() as session:
-            db_convs = session.query(ConversationHistory).filter(
+        async with self.db_manager.async_session() as session:
+            stmt = select(ConversationHistory).where(
                 ConversationHistory.created_at >= time_threshold
-            ).order_by(desc(ConversationHistory.created_at)).all()
+            ).order_by(desc(ConversationHistory.created_at))
+
+            db_convs = (await session.execute(stmt)).scalars().all()
 
             return [self._convert_to_conversation_model(conv) for conv in db_convs]
 
     # ========== Memory Graph 操作 ==========
 
-    def create_memory_node(self,
-                           entity: str,
-                           node_type: str,
-                           properties: Dict[str, Any] = None) -> bool:
+    async def create_memory_node(self,
+                                 entity: str,
+                                 node_type: str,
+                                 properties: Dict[str, Any] = None) -> bool:
         """创建记忆节点"""
         try:
-            with self.db_manager.neo4j_session() as session:
-                query = """
-                MERGE (n:Memory {entity: $entity})
-                SET n.type = $type,
-                    n.properties = $properties,
-                    n.created_at = datetime(),
-                    n.updated_at = datetime()
-                RETURN n
-                """
-
-                session.run(query,
-                            entity=entity,
-                            type=node_type,
-                            properties=properties or {})
-                return True
+            query = """
+            MERGE (n:Memory {entity: $entity})
+            SET n.type = $type,
+                n.properties = $properties,
+                n.created_at = datetime(),
+                n.updated_at = datetime()
+            """
+
+            await self.db_manager.neo4j_query(query,
+                                              entity=entity,
+                                              type=node_type,
+                                              properties=properties or {})
+
+            await self.db_manager.invalidate_cache_async(STATS_CACHE_KEY, _subgraph_cache_key(entity))
+            return True
         except Exception as e:
             logger.error(f"创建记忆节点失败: {e}")
             return False
 
-    def create_memory_relation(self,
-                               subject: str,
-                               relation: str,
-                               object: str,
-                               properties: Dict[str, Any] = None) -> bool:
+    async def create_memory_relation(self,
+                                     subject: str,
+                                     relation: str,
+                                     object: str,
+                                     properties: Dict[str, Any] = None) -> bool:
         """创建记忆关系"""
         try:
-            with self.db_manager.neo4j_session() as session:
-                query = """
-                MATCH (a:Memory {entity: $subject})
-                MATCH (b:Memory {entity: $object})
-                MERGE (a)-[r:RELATION {type: $relation}]->(b)
-                SET r.properties = $properties,
-                    r.created_at = datetime()
-                RETURN r
-                """
-
-                session.run(query,
-                            subject=subject,
-                            object=object,
-                            relation=relation,
-                            properties=properties or {})
-                return True
+            query = """
+            MATCH (a:Memory {entity: $subject})
+            MATCH (b:Memory {entity: $object})
+            MERGE (a)-[r:RELATION {type: $relation}]->(b)
+            SET r.properties = $properties,
+                r.created_at = datetime()
+            """
+
+            await self.db_manager.neo4j_query(query,
+                                              subject=subject,
+                                              object=object,
+                                              relation=relation,
+                                              properties=properties or {})
+
+            await self.db_manager.invalidate_cache_async(
+                STATS_CACHE_KEY,
+                _subgraph_cache_key(subject),
+                _subgraph_cache_key(object)
+            )
+            return True
         except Exception as e:
             logger.error(f"创建记忆关系失败: {e}")
             return False
 
-    def get_related_memories(self,
-                             entity: str,
-                             relation_type: str = None,
-                             limit: int = 10) -> List[Dict[str, Any]]:
+    async def get_related_memories(self,
+                                   entity: str,
+                                   relation_type: str = None,
+                                   limit: int = 10) -> List[Dict[str, Any]]:
         """获取相关记忆"""
         try:
-            with self.db_manager.neo4j_session() as session:
-                if relation_type:
-                    query = """
-                    MATCH (n:Memory {entity: $entity})-[r:RELATION]->(m:Memory)
-                    WHERE r.type = $relation_type
-                    RETURN m.entity as entity, m.type as type, 
-                           m.properties as properties, r.type as relation_type,
-                           r.properties as relation_properties,
-                           r.created_at as relation_created
-                    LIMIT $limit
-                    """
-                    result = session.run(query,
-                                         entity=entity,
-                                         relation_type=relation_type,
-                                         limit=limit)
-                else:
-                    query = """
-                    MATCH (n:Memory {entity: $entity})-[r:RELATION]->(m:Memory)
-                    RETURN m.entity as entity, m.type as type,
-                           m.properties as properties, r.type as relation_type,
-                           r.properties as relation_properties,
-                           r.created_at as relation_created
-                    LIMIT $limit
-                    """
-                    result = session.run(query, entity=entity, limit=limit)
-
-                return [dict(record) for record in result]
+            if relation_type:
+                query = """
+                MATCH (n:Memory {entity: $entity})-[r:RELATION]->(m:Memory)
+                WHERE r.type = $relation_type
+                RETURN m.entity as entity, m.type as type, 
+                       m.properties as properties, r.type as relation_type,
+                       r.properties as relation_properties,
+                       r.created_at as relation_created
+                LIMIT $limit
+                """
+                records = await self.db_manager.neo4j_query(query,
+                                                            entity=entity,
+                                                            relation_type=relation_type,
+                                                            limit=limit)
+            else:
+                query = """
+                MATCH (n:Memory {entity: $entity})-[r:RELATION]->(m:Memory)
+                RETURN m.entity as entity, m.type as type,
+                       m.properties as properties, r.type as relation_type,
+                       r.properties as relation_properties,
+                       r.created_at as relation_created
+                LIMIT $limit
+                """
+                records = await self.db_manager.neo4j_query(query, entity=entity, limit=limit)
+
+            return [dict(record) for record in records]
         except Exception as e:
             logger.error(f"获取相关记忆失败: {e}")
             return []
 
-    def search_memories(self,
-                        search_text: str,
-                        limit: int = 10) -> List[Dict[str, Any]]:
+    async def search_memories(self,
+                              search_text: str,
+                              limit: int = 10) -> List[Dict[str, Any]]:
         """搜索记忆"""
         try:
-            with self.db_manager.neo4j_session() as session:
-                query = """
-                CALL db.index.fulltext.queryNodes('memory_search_index', $search_text) 
-                YIELD node, score
-                RETURN node.entity as entity, node.type as type,
-                       node.properties as properties, score
-                ORDER BY score DESC
-                LIMIT $limit
-                """
-
-                result = session.run(query,
-                                     search_text=f"*{search_text}*",
-                                     limit=limit)
-                return [dict(record) for record in result]
+            query = """
+            CALL db.index.fulltext.queryNodes('memory_search_index', $search_text) 
+            YIELD node, score
+            RETURN node.entity as entity, node.type as type,
+                   node.properties as properties, score
+            ORDER BY score DESC
+            LIMIT $limit
+            """
+
+            records = await self.db_manager.neo4j_query(query,
+                                                        search_text=f"*{search_text}*",
+                                                        limit=limit)
+            return [dict(record) for record in records]
         except Exception as e:
             logger.error(f"搜索记忆失败: {e}")
             return []
 
-    def get_memory_subgraph(self,
-                            entity: str,
-                            depth: int = 2) -> Dict[str, Any]:
-        """获取记忆子图"""
-        try:
-            with self.db_manager.neo4j_session() as session:
-                query = """
-                MATCH path = (n:Memory {entity: $entity})-[*1..$depth]-(m:Memory)
-                WITH path, relationships(path) as rels, nodes(path) as nodes
-                UNWIND nodes as node
-                UNWIND rels as rel
-                RETURN collect(DISTINCT {
-                    entity: node.entity,
-                    type: node.type,
-                    properties: node.properties
-                }) as nodes,
-                collect(DISTINCT {
-                    start: startNode(rel).entity,
-                    type: rel.type,
-                    end: endNode(rel).entity,
-                    properties: rel.properties
-                }) as relationships
-                """
-
-                result = session.run(query, entity=entity, depth=depth)
-                record = result.single()
+    async def get_memory_subgraph(self,
+                                  entity: str,
+                                  depth: int = 2) -> Dict[str, Any]:
+        """获取记忆子图，查询失败时返回空图（失败结果不写入缓存）"""
+        # APOC按层数做BFS并去重，深度限制在 [1, MAX_SUBGRAPH_DEPTH]；先规范化再查缓存，同一深度只占一个缓存键
+        depth = min(max(int(depth), 1), MAX_SUBGRAPH_DEPTH)
 
-                if record:
-                    return {
-                        "nodes": record["nodes"],
-                        "relationships": record["relationships"]
-                    }
-                return {"nodes": [], "relationships": []}
+        try:
+            return await self._fetch_memory_subgraph(entity, depth)
         except Exception as e:
             logger.error(f"获取记忆子图失败: {e}")
             return {"nodes": [], "relationships": []}
 
-    # ========== 统计和监控 ==========
-
-    def get_database_stats(self) -> Dict[str, Any]:
-        """获取数据库统计信息"""
-        stats = {}
-
-        # MySQL统计
-        with self.db_manager.mysql_session() as session:
-            # 知识库统计
-            knowledge_count = session.query(TextbookKnowledge).count()
-            qa_count = session.query(QAPair).count()
-            conv_count = session.query(ConversationHistory).count()
-
-            # 最近活动
-            recent_conv = session.query(ConversationHistory).order_by(
-                desc(ConversationHistory.created_at)
-            ).first()
-
-            stats['mysql'] = {
-                'knowledge_count': knowledge_count,
-                'qa_count': qa_count,
-                'conversation_count': conv_count,
-                'last_activity': recent_conv.created_at if recent_conv else None
+    @redis_cached(ttl=SUBGRAPH_CACHE_TTL,
+                  key_fn=lambda self, entity, depth: _subgraph_cache_key(entity, depth))
+    async def _fetch_memory_subgraph(self, entity: str, depth: int) -> Dict[str, Any]:
+        """查询记忆子图，失败时异常直接抛出，不会写入缓存"""
+        query = """
+        MATCH (n:Memory {entity: $entity})
+        CALL apoc.path.subgraphAll(n, {
+            maxLevel: $depth,
+            relationshipFilter: 'RELATION',
+            labelFilter: '+Memory'
+        })
+        YIELD nodes, relationships
+        RETURN [node IN nodes | {
+            entity: node.entity,
+            type: node.type,
+            properties: node.properties
+        }] as nodes,
+        [rel IN relationships | {
+            start: startNode(rel).entity,
+            type: rel.type,
+            end: endNode(rel).entity,
+            properties: rel.properties
+        }] as relationships
+        """
+
+        records = await self.db_manager.neo4j_query(query, entity=entity, depth=depth)
+
+        if records:
+            return {
+                "nodes": records[0]["nodes"],
+                "relationships": records[0]["relationships"]
             }
+        return {"nodes": [], "relationships": []}
+
+    async def warmup(self):
+        """以哨兵参数执行一遍只读Cypher模板，预先填充Neo4j查询计划缓存并建立驱动连接"""
+        sentinel = "__warmup__"
+        await asyncio.gather(
+            self.get_related_memories(sentinel),
+            self.get_related_memories(sentinel, relation_type=sentinel),
+            self.search_memories(sentinel, limit=1)
+        )
+        logger.info("Neo4j查询计划预热完成")
 
-        # Neo4j统计
-        try:
-            with self.db_manager.neo4j_session() as session:
-                # 节点统计
-                node_count = session.run(
-                    "MATCH (n) RETURN count(n) as count"
-                ).single()["count"]
-
-                # 关系统计
-                rel_count = session.run(
-                    "MATCH ()-[r]->() RETURN count(r) as count"
-                ).single()["count"]
-
-                # 类型统计
-                node_types = session.run(
-                    "MATCH (n) RETURN n.type as type, count(*) as count ORDER BY count DESC"
-                ).data()
-
-                rel_types = session.run(
-                    "MATCH ()-[r]->() RETURN r.type as type, count(*) as count ORDER BY count DESC"
-                ).data()
-
-                stats['neo4j'] = {
-                    'node_count': node_count,
-                    'relationship_count': rel_count,
-                    'node_types': node_types,
-                    'relationship_types': rel_types
-                }
-        except Exception as e:
-            logger.error(f"获取Neo4j统计失败: {e}")
-            stats['neo4j'] = {'error': str(e)}
+    # ========== 统计和监控 ==========
 
-        return stats
+    @redis_cached(ttl=STATS_CACHE_TTL, key_fn=lambda self: STATS_CACHE_KEY)
+    async def get_database_stats(self) -> Dict[str, Any]:
+        """获取数据库统计信息"""
+        # MySQL与Neo4j统计并发查询，总耗时取两者较慢的一方
+        mysql_stats, neo4j_stats = await asyncio.gather(
+            self._get_mysql_stats(),
+            self._get_neo4j_stats(),
+            return_exceptions=True
+        )
 
-    def cleanup_old_data(self, days: int = 30) -> Dict[str, int]:
+        if isinstance(mysql_stats, BaseException):
+            raise mysql_stats
+
+        if isinstance(neo4j_stats, BaseException):
+            logger.error(f"获取Neo4j统计失败: {neo4j_stats}")
+            neo4j_stats = {'error': str(neo4j_stats)}
+
+        return {'mysql': mysql_stats, 'neo4j': neo4j_stats}
+
+    async def _get_mysql_stats(self) -> Dict[str, Any]:
+        """MySQL统计：单条语句内用标量子查询一次取回全部计数"""
+        async with self.db_manager.async_session() as session:
+            row = (await session.execute(select(
+                select(func.count()).select_from(TextbookKnowledge)
+                .scalar_subquery().label('knowledge_count'),
+                select(func.count()).select_from(QAPair)
+                .scalar_subquery().label('qa_count'),
+                select(func.count()).select_from(ConversationHistory)
+                .scalar_subquery().label('conversation_count'),
+                select(func.max(ConversationHistory.created_at))
+                .scalar_subquery().label('last_activity')
+            ))).one()
+
+        return {
+            'knowledge_count': row.knowledge_count,
+            'qa_count': row.qa_count,
+            'conversation_count': row.conversation_count,
+            'last_activity': row.last_activity
+        }
+
+    async def _get_neo4j_stats(self) -> Dict[str, Any]:
+        """Neo4j统计：单条Cypher通过子查询返回全部聚合"""
+        record = (await self.db_manager.neo4j_query(NEO4J_STATS_QUERY))[0]
+
+        return {
+            'node_count': record["node_count"],
+            'relationship_count': record["relationship_count"],
+            'node_types': record["node_types"],
+            'relationship_types': record["relationship_types"]
+        }
+
+    async def cleanup_old_data(self, days: int = 30) -> Dict[str, int]:
         """清理旧数据"""
         cleanup_stats = {}
         time_threshold = datetime.utcnow() - timedelta(days=days)
 
-        # 清理对话历史
-        with self.db_manager.mysql_session() as session:
-            deleted_convs = session.query(ConversationHistory).filter(
-                ConversationHistory.created_at < time_threshold
-            ).delete(synchronize_session=False)
-            cleanup_stats['conversations_deleted'] = deleted_convs
+        # 清理对话历史：分批删除并逐批提交，避免单个大事务长时间锁表和产生巨量binlog
+        deleted_convs = 0
+        while True:
+            async with self.db_manager.async_session() as session:
+                result = await session.execute(
+                    text(
+                        f"DELETE FROM {ConversationHistory.__tablename__} "
+                        "WHERE created_at < :threshold LIMIT :batch_size"
+                    ),
+                    {"threshold": time_threshold, "batch_size": CLEANUP_BATCH_SIZE}
+                )
+
+            deleted_convs += result.rowcount
+            if result.rowcount < CLEANUP_BATCH_SIZE:
+                break
+            await asyncio.sleep(CLEANUP_BATCH_PAUSE)
+
+        cleanup_stats['conversations_deleted'] = deleted_convs
 
+        await self.db_manager.invalidate_cache_async(STATS_CACHE_KEY)
         logger.info(f"清理了 {deleted_convs} 条旧对话记录")
         return cleanup_stats
 
     # ========== 私有方法 ==========
 
+    def _knowledge_search_stmt(self,
+                               query: str,
+                               limit: int,
+                               offset: int,
+                               before: Optional[datetime] = None,
+                               before_id: Optional[int] = None):
+        """构建知识搜索语句，有查询词时走FULLTEXT索引"""
+        stmt = select(TextbookKnowledge)
+
+        if query:
+            stmt = stmt.where(
+                match(TextbookKnowledge.title, TextbookKnowledge.content, against=query)
+                .in_natural_language_mode()
+            )
+
+        stmt = stmt.order_by(
+            desc(TextbookKnowledge.updated_at), desc(TextbookKnowledge.id)
+        ).limit(limit)
+
+        if before is not None:
+            return stmt.where(_keyset_filter(
+                TextbookKnowledge.updated_at, TextbookKnowledge.id, before, before_id
+            ))
+        return stmt.offset(offset)
+
+    def _qa_search_stmt(self,
+                        query: str,
+                        difficulty: str,
+                        subject: str,
+                        limit: int,
+                        offset: int):
+        """构建问答对搜索语句，有查询词时走FULLTEXT索引"""
+        query_filters = []
+
+        if query:
+            query_filters.append(
+                match(QAPair.question, QAPair.answer, against=query)
+                .in_natural_language_mode()
+            )
+
+        if difficulty:
+            query_filters.append(QAPair.difficulty == difficulty)
+
+        if subject:
+            query_filters.append(QAPair.subject == subject)
+
+        stmt = select(QAPair)
+        if query_filters:
+            stmt = stmt.where(and_(*query_filters))
+
+        return stmt.order_by(desc(QAPair.created_at)).limit(limit).offset(offset)
+
+    def _user_conversations_stmt(self,
+                                 user_id: str,
+                                 limit: int,
+                                 offset: int,
+                                 before: Optional[datetime] = None,
+                                 before_id: Optional[int] = None):
+        """构建用户对话历史查询语句，命中 (user_id, created_at, id) 索引"""
+        stmt = select(ConversationHistory).where(
+            ConversationHistory.user_id == user_id
+        ).order_by(
+            desc(ConversationHistory.created_at), desc(ConversationHistory.id)
+        ).limit(limit)
+
+        if before is not None:
+            return stmt.where(_keyset_filter(
+                ConversationHistory.created_at, ConversationHistory.id, before, before_id
+            ))
+        return stmt.offset(offset)
+
     def _convert_to_knowledge_model(self, db_knowledge) -> KnowledgeBase:
         """转换数据库对象到知识模型"""
         return KnowledgeBase(
@@ -435,7 +706,7 @@ class DataAccessLayer:
             content=db_knowledge.content,
             chapter=db_knowledge.chapter,
             section=db_knowledge.section,
-            tags=json.loads(db_knowledge.tags) if db_knowledge.tags else [],
+            tags=db_knowledge.tags or [],
             created_at=db_knowledge.created_at,
             updated_at=db_knowledge.updated_at
         )
@@ -449,7 +720,7 @@ class DataAccessLayer:
             source=db_qa.source,
             difficulty=db_qa.difficulty,
             subject=db_qa.subject,
-            tags=json.loads(db_qa.tags) if db_qa.tags else [],
+            tags=db_qa.tags or [],
             created_at=db_qa.created_at
         )
 
@@ -461,16 +732,32 @@ class DataAccessLayer:
             session_id=db_conv.session_id,
             query=db_conv.query,
             response=db_conv.response,
-            context=json.loads(db_conv.context) if db_conv.context else None,
-            memory_used=json.loads(db_conv.memory_used) if db_conv.memory_used else None,
+            context=db_conv.context,
+            memory_used=db_conv.memory_used or None,
             created_at=db_conv.created_at
         )
 
-    def _update_faiss_index(self, text: str):
-        """更新FAISS索引（简化的实现）"""
-        # 这里可以集成实际的向量索引更新逻辑
-        # 比如：text_to_vector -> add_to_faiss_index
-        pass
+    async def _schedule_indexing(self):
+        """投递增量向量索引任务，文本编码与写索引由worker完成，不占用请求路径"""
+        if not task_queue.available:
+            logger.warning("任务队列不可用，跳过向量索引")
+            return
+
+        try:
+            await task_queue.enqueue("index_knowledge_task")
+        except Exception as e:
+            logger.warning(f"投递向量索引任务失败: {e}")
+
+    async def _schedule_reindexing(self, knowledge_id: int):
+        """投递单条知识的向量重建任务，修改或删除已索引的知识后使用"""
+        if not task_queue.available:
+            logger.warning(f"任务队列不可用，跳过知识 {knowledge_id} 的向量重建")
+            return
+
+        try:
+            await task_queue.enqueue("reindex_knowledge_task", knowledge_id)
+        except Exception as e:
+            logger.warning(f"投递知识 {knowledge_id} 向量重建任务失败: {e}")
 
 
 # 全局数据访问实例
@@ -1,16 +1,27 @@
 # backend/src/database/db_manager.py
 import logging
-from contextlib import contextmanager
-from sqlalchemy import create_engine, text
+import asyncio
+from collections import defaultdict
+from contextlib import contextmanager, asynccontextmanager
+from sqlalchemy import create_engine, text, event
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.exc import SQLAlchemyError
-from neo4j import GraphDatabase, exceptions
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.exc import SQLAlchemyError, DisconnectionError
+from neo4j import GraphDatabase, AsyncGraphDatabase, exceptions
+from neo4j import time as neo4j_time
 import redis
-import json
+import redis.asyncio as aioredis
 from datetime import datetime
-import pickle
-from typing import Optional, Generator, Any
+from typing import Optional, Generator, Any, Callable, Iterable, List, Tuple
 import hashlib
+import functools
+import inspect
+import orjson
+import threading
+import time
+import zstandard as zstd
+import xxhash
+from cachetools import TLRUCache
 
 from config.settings import settings
 
@@ -18,6 +29,70 @@ from config.settings import settings
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 查询缓存值格式：1字节版本前缀 + zstd压缩的orjson，前缀不符的旧条目（如pickle）视为未命中
+QUERY_CACHE_FORMAT = b'\x01'
+QUERY_CACHE_ZSTD_LEVEL = 3
+# 批量写查询缓存时每个pipeline累积的命令数
+QUERY_CACHE_PIPELINE_BATCH = 500
+
+# mydumper 每个数据分片的行数 / myloader 每个事务的语句数
+MYSQL_DUMP_ROWS_PER_CHUNK = 50000
+
+# 单文件备份（mysqldump / Neo4j JSONL）的zstd压缩级别
+BACKUP_ZSTD_LEVEL = 3
+# mysqldump 输出每次读入并交给压缩器的字节数
+BACKUP_COPY_CHUNK_SIZE = 1 << 20
+
+# SQL文件恢复时的批量导入会话设置：整个文件一个事务，导入期间跳过唯一性与外键校验
+MYSQL_BULK_LOAD_PROLOGUE = b"SET autocommit=0;\nSET unique_checks=0;\nSET foreign_key_checks=0;\n"
+MYSQL_BULK_LOAD_EPILOGUE = b"\nCOMMIT;\nSET unique_checks=1;\nSET foreign_key_checks=1;\n"
+
+# Neo4j备份时每次从服务端拉取的记录数
+NEO4J_BACKUP_FETCH_SIZE = 10000
+
+# Neo4j恢复时每个UNWIND写事务的记录数
+NEO4J_RESTORE_BATCH_SIZE = 5000
+
+# 旧版 .cql 脚本备份恢复时每次读取的字符数 / 每个事务执行的语句数
+CQL_READ_BLOCK_SIZE = 1 << 20
+CQL_RESTORE_BATCH_SIZE = 500
+
+# Neo4j Parquet备份的列压缩算法
+NEO4J_PARQUET_COMPRESSION = 'zstd'
+
+# 本应用写入Redis的缓存键模式（查询/搜索缓存、统计与子图缓存、语义缓存），重置缓存时只清理这些键
+APP_CACHE_PATTERNS = ("query_cache:*", "db:*", "graph:*", "semcache:*")
+CACHE_RESET_BATCH_SIZE = 500
+
+# 进程内L1缓存失效广播频道，消息为查询缓存键，"*" 表示清空全部
+CACHE_INVALIDATE_CHANNEL = "cache:invalidate"
+
+# zstd压缩/解压器实例非线程安全，按线程各持一份
+_zstd_local = threading.local()
+
+
+@functools.lru_cache(maxsize=4096)
+def _query_cache_key(query: str) -> str:
+    """查询缓存键，热点查询直接复用已算好的键"""
+    if settings.QUERY_CACHE_MD5_KEYS:
+        return f"query_cache:{hashlib.md5(query.encode()).hexdigest()}"
+    return f"query_cache:{xxhash.xxh3_128_hexdigest(query)}"
+
+
+def _encode_query_cache(value: Any) -> bytes:
+    if not hasattr(_zstd_local, 'compressor'):
+        _zstd_local.compressor = zstd.ZstdCompressor(level=QUERY_CACHE_ZSTD_LEVEL)
+    payload = orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return QUERY_CACHE_FORMAT + _zstd_local.compressor.compress(payload)
+
+
+def _decode_query_cache(data: bytes) -> Optional[Any]:
+    if data[:1] != QUERY_CACHE_FORMAT:
+        return None
+    if not hasattr(_zstd_local, 'decompressor'):
+        _zstd_local.decompressor = zstd.ZstdDecompressor()
+    return orjson.loads(_zstd_local.decompressor.decompress(data[1:]))
+
 
 class DatabaseManager:
     """数据库管理器，负责连接管理和持久化"""
@@ -25,8 +100,23 @@ class DatabaseManager:
     def __init__(self):
         self._mysql_engine = None
         self._mysql_session_factory = None
+        self._mysql_async_engine = None
+        self._mysql_async_session_factory = None
         self._neo4j_driver = None
+        self._neo4j_async_driver = None
+        self._redis_pool = None
         self._redis_client = None
+        self._redis_async_client = None
+        self._invalidation_thread = None
+        # 进程内L1缓存，位于Redis之前，热点查询命中时无需网络往返与解码；
+        # 条目存 (结果, 有效秒数)，有效期不超过写入时的ttl或Redis中的剩余时间，且不超过 L1_CACHE_TTL
+        self._l1_cache = TLRUCache(maxsize=settings.L1_CACHE_SIZE, ttu=lambda _key, entry, now: now + entry[1])
+        self._l1_lock = threading.RLock()
+        self._cache_stats = {"hits": 0, "misses": 0}
+        self._query_cache_stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+        # 最近一次健康探测的 (时间, 结果)
+        self._health_cache = (0.0, None)
+        self._health_lock = asyncio.Lock()
         self._backup_path = "./data/backups"
 
     def init_mysql(self):
@@ -35,17 +125,39 @@ class DatabaseManager:
             self._mysql_engine = create_engine(
                 f"mysql+pymysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}"
                 f"@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}",
-                pool_size=20,
-                max_overflow=30,
-                pool_pre_ping=True,
-                pool_recycle=3600,
+                pool_size=settings.MYSQL_POOL_SIZE,
+                max_overflow=settings.MYSQL_MAX_OVERFLOW,
+                pool_pre_ping=settings.MYSQL_PRE_PING,
+                pool_recycle=settings.MYSQL_POOL_RECYCLE,
+                pool_timeout=settings.MYSQL_POOL_TIMEOUT,
                 echo=settings.DEBUG
             )
 
+            _install_idle_ping(self._mysql_engine.pool)
+
             self._mysql_session_factory = scoped_session(
                 sessionmaker(autocommit=False, autoflush=False, bind=self._mysql_engine)
             )
 
+            # 异步引擎，供FastAPI请求处理路径使用，避免阻塞事件循环
+            self._mysql_async_engine = create_async_engine(
+                f"mysql+aiomysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}"
+                f"@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}",
+                pool_size=settings.MYSQL_POOL_SIZE,
+                max_overflow=settings.MYSQL_MAX_OVERFLOW,
+                pool_pre_ping=settings.MYSQL_PRE_PING,
+                pool_recycle=settings.MYSQL_POOL_RECYCLE,
+                pool_timeout=settings.MYSQL_POOL_TIMEOUT,
+                echo=settings.DEBUG
+            )
+            _install_idle_ping(self._mysql_async_engine.sync_engine.pool)
+
+            self._mysql_async_session_factory = async_sessionmaker(
+                bind=self._mysql_async_engine,
+                autoflush=False,
+                expire_on_commit=False
+            )
+
             logger.info("MySQL连接池初始化成功")
 
             # 创建必要的表
@@ -66,6 +178,15 @@ class DatabaseManager:
                 connection_acquisition_timeout=60
             )
 
+            # 异步驱动，供FastAPI请求处理路径使用，连接池在请求间复用
+            self._neo4j_async_driver = AsyncGraphDatabase.driver(
+                settings.NEO4J_URI,
+                auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+                max_connection_lifetime=3600,
+                max_connection_pool_size=50,
+                connection_acquisition_timeout=30
+            )
+
             # 测试连接
             with self._neo4j_driver.session() as session:
                 session.run("RETURN 1")
@@ -85,48 +206,92 @@ class DatabaseManager:
     def init_redis(self):
         """初始化Redis连接（用于缓存和会话管理）"""
         try:
-            self._redis_client = redis.Redis(
-                host='localhost',
-                port=6379,
-                db=0,
-                decode_responses=True,
+            # 同步/异步客户端各自使用阻塞式连接池：连接数有上限，池满时等待而不是新建连接；
+            # 空闲连接定期健康检查，避免使用已被服务端/中间设备断开的socket
+            pool_config = dict(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                password=settings.REDIS_PASSWORD,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                timeout=5,
                 socket_connect_timeout=5,
-                socket_timeout=5
+                socket_timeout=5,
+                socket_keepalive=True,
+                health_check_interval=30
             )
 
+            # 缓存值为orjson/zstd二进制，不做字符串解码
+            self._redis_pool = redis.BlockingConnectionPool(**pool_config)
+            self._redis_client = redis.Redis(connection_pool=self._redis_pool)
+
             # 测试连接
             self._redis_client.ping()
             logger.info("Redis连接成功")
 
+            # 异步客户端，供请求处理路径上的缓存读写使用，避免阻塞事件循环
+            self._redis_async_client = aioredis.Redis(
+                connection_pool=aioredis.BlockingConnectionPool(**pool_config)
+            )
+
+            # 订阅失效广播，保持多个worker进程的L1缓存一致
+            pubsub = self._redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{CACHE_INVALIDATE_CHANNEL: self._on_cache_invalidate})
+            self._invalidation_thread = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
         except redis.ConnectionError as e:
             logger.warning(f"Redis连接失败，将使用内存缓存: {e}")
             self._redis_client = None
+            self._redis_async_client = None
 
     def _create_mysql_tables(self):
         """创建MySQL表结构"""
-        from sqlalchemy import MetaData
+        from sqlalchemy import inspect
 
-        metadata = MetaData()
-
-        # 反射现有表结构
-        metadata.reflect(bind=self._mysql_engine)
+        # 只检查目标表是否存在，不反射整个库的表结构
+        inspector = inspect(self._mysql_engine)
 
         # 如果表不存在，则创建
-        if 'textbook_knowledge' not in metadata.tables:
+        if not inspector.has_table('textbook_knowledge'):
             from database.mysql_models import Base
             Base.metadata.create_all(bind=self._mysql_engine)
             logger.info("MySQL表创建完成")
+        else:
+            self._create_mysql_indexes(inspector)
+
+    def _create_mysql_indexes(self, inspector):
+        """为已存在的表补建模型中声明但尚未创建的索引"""
+        from database.mysql_models import Base
+
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=self._mysql_engine)
+                    logger.info(f"MySQL索引创建完成: {table.name}.{index.name}")
 
     def _create_neo4j_indexes(self):
         """创建Neo4j索引和约束"""
         with self._neo4j_driver.session() as session:
-            # 创建约束确保实体唯一性
-            session.run("CREATE CONSTRAINT IF NOT EXISTS FOR (n:Memory) REQUIRE n.entity IS UNIQUE")
+            # 创建约束确保实体唯一性，同时为 entity 提供索引查找
+            session.run("""
+            CREATE CONSTRAINT memory_entity IF NOT EXISTS
+            FOR (n:Memory) REQUIRE n.entity IS UNIQUE
+            """)
+
+            # 创建全文索引（全文索引只能覆盖字符串属性，properties 为map无法索引）
+            session.run("""
+            CREATE FULLTEXT INDEX memory_search_index IF NOT EXISTS
+            FOR (n:Memory) ON EACH [n.entity, n.type]
+            """)
 
-            # 创建全文索引
+            # 记忆类型属性索引，按类型筛选记忆时使用
             session.run("""
-            CREATE FULLTEXT INDEX memory_search_index IF NOT EXISTS 
-            FOR (n:Memory) ON EACH [n.entity, n.properties]
+            CREATE INDEX memory_type_idx IF NOT EXISTS
+            FOR (n:Memory) ON (n.type)
             """)
 
             # 创建关系类型索引
@@ -144,20 +309,39 @@ class DatabaseManager:
         try:
             yield session
             session.commit()
-        except Exception as e:
+        except BaseException as e:
+            # 含 KeyboardInterrupt 等，确保不会留下未结束的事务（idle in transaction）
             session.rollback()
             logger.error(f"MySQL会话错误: {e}")
             raise
         finally:
             session.close()
 
+    @asynccontextmanager
+    async def async_session(self):
+        """获取MySQL异步会话上下文管理器"""
+        if not self._mysql_async_session_factory:
+            raise Exception("MySQL未初始化")
+
+        session = self._mysql_async_session_factory()
+        try:
+            yield session
+            await session.commit()
+        except BaseException as e:
+            # 含请求被取消时的 CancelledError，确保不会留下未结束的事务
+            await session.rollback()
+            logger.error(f"MySQL异步会话错误: {e}")
+            raise
+        finally:
+            await session.close()
+
     @contextmanager
-    def neo4j_session(self):
-        """获取Neo4j会话上下文管理器"""
+    def neo4j_session(self, **session_config):
+        """获取Neo4j会话上下文管理器，session_config 透传给 driver.session()"""
         if not self._neo4j_driver:
             raise Exception("Neo4j未初始化")
 
-        session = self._neo4j_driver.session()
+        session = self._neo4j_driver.session(**session_config)
         try:
             yield session
         except Exception as e:
@@ -166,119 +350,350 @@ class DatabaseManager:
         finally:
             session.close()
 
-    def backup_mysql(self, backup_file: str = None):
-        """备份MySQL数据"""
+    @asynccontextmanager
+    async def async_neo4j_session(self, **session_config):
+        """获取Neo4j异步会话上下文管理器，用于需要多条语句/显式事务的场景"""
+        if not self._neo4j_async_driver:
+            raise Exception("Neo4j未初始化")
+
+        session = self._neo4j_async_driver.session(**session_config)
+        try:
+            yield session
+        except Exception as e:
+            logger.error(f"Neo4j异步会话错误: {e}")
+            raise
+        finally:
+            await session.close()
+
+    async def warmup_mysql_pool(self):
+        """预先建立异步连接池中的MySQL连接，首批请求无需承担TCP握手与认证开销"""
+        if not self._mysql_async_engine:
+            return
+
+        async def _ping():
+            async with self._mysql_async_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        try:
+            # 并发持有 pool_size 个连接，迫使连接池一次性建满
+            await asyncio.gather(*(_ping() for _ in range(settings.MYSQL_POOL_SIZE)))
+            logger.info(f"MySQL连接池预热完成: {settings.MYSQL_POOL_SIZE} 个连接")
+        except Exception as e:
+            logger.warning(f"MySQL连接池预热失败: {e}")
+
+    async def neo4j_query(self, query: str, **params) -> list:
+        """通过异步驱动执行单条Cypher并返回全部记录"""
+        if not self._neo4j_async_driver:
+            raise Exception("Neo4j未初始化")
+
+        records, _, _ = await self._neo4j_async_driver.execute_query(query, params)
+        return records
+
+    async def check_health(self) -> dict:
+        """并发探测MySQL/Neo4j/Redis，总耗时取决于最慢的一项而非三者之和
+
+        每项返回 {"status": "connected", "version": ...}、{"status": "error", "error": ...}
+        或 {"status": "not_configured"}。
+        """
+        mysql, neo4j, redis_ = await asyncio.gather(
+            self._probe_mysql(), self._probe_neo4j(), self._probe_redis()
+        )
+        return {"mysql": mysql, "neo4j": neo4j, "redis": redis_}
+
+    async def cached_health(self, ttl: float = settings.HEALTH_CACHE_TTL) -> dict:
+        """短时缓存的 check_health 结果；过期时加锁只由一个请求重新探测，其余请求复用其结果"""
+        checked_at, result = self._health_cache
+        if result is not None and time.monotonic() - checked_at < ttl:
+            return result
+
+        async with self._health_lock:
+            checked_at, result = self._health_cache
+            if result is None or time.monotonic() - checked_at >= ttl:
+                result = await self.check_health()
+                self._health_cache = (time.monotonic(), result)
+        return result
+
+    async def _probe_mysql(self) -> dict:
+        try:
+            if not self._mysql_async_engine:
+                raise Exception("MySQL未初始化")
+            async with self._mysql_async_engine.connect() as conn:
+                version = (await conn.execute(text("SELECT VERSION()"))).scalar()
+            return {"status": "connected", "version": str(version) if version else "unknown"}
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+
+    async def _probe_neo4j(self) -> dict:
+        try:
+            records = await self.neo4j_query(
+                "CALL dbms.components() YIELD versions RETURN versions[0] as version"
+            )
+            return {"status": "connected", "version": records[0]["version"] if records else "unknown"}
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+
+    async def _probe_redis(self) -> dict:
+        if not self._redis_async_client:
+            return {"status": "not_configured"}
+        try:
+            info = await self._redis_async_client.info("server")
+            return {"status": "connected", "version": info.get("redis_version", "unknown")}
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+
+    @contextmanager
+    def _mysql_defaults_file(self):
+        """将MySQL凭据写入仅属主可读的临时选项文件，避免密码出现在进程参数（ps）中"""
+        import os
+        import tempfile
+
+        password = settings.MYSQL_PASSWORD.replace('\\', '\\\\').replace('"', '\\"')
+        fd, path = tempfile.mkstemp(suffix='.cnf')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for group in ('client', 'mydumper', 'myloader'):
+                    f.write(
+                        f"[{group}]\n"
+                        f"host={settings.MYSQL_HOST}\n"
+                        f"port={settings.MYSQL_PORT}\n"
+                        f"user={settings.MYSQL_USER}\n"
+                        f"password=\"{password}\"\n"
+                    )
+            yield path
+        finally:
+            os.remove(path)
+
+    async def backup_mysql(self, backup_file: str = None):
+        """备份MySQL数据，安装了 mydumper 时多线程导出到目录，否则使用 mysqldump 导出为 .sql.zst
+
+        导出子进程异步等待，不占用事件循环；mysqldump 的输出经管道读入，在线程中由 zstandard 多线程压缩，
+        压缩与导出在不同核上并行，磁盘只写压缩后的数据，不依赖外部 zstd 命令。
+        """
         import os
+        import shutil
         import subprocess
 
+        use_mydumper = shutil.which('mydumper') is not None
+
         if not backup_file:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"{self._backup_path}/mysql_backup_{timestamp}.sql"
+            suffix = "" if use_mydumper else ".sql.zst"
+            backup_file = f"{self._backup_path}/mysql_backup_{timestamp}{suffix}"
 
         os.makedirs(os.path.dirname(backup_file), exist_ok=True)
 
         try:
-            command = [
-                'mysqldump',
-                f'-u{settings.MYSQL_USER}',
-                f'-p{settings.MYSQL_PASSWORD}',
-                f'-h{settings.MYSQL_HOST}',
-                f'-P{settings.MYSQL_PORT}',
-                settings.MYSQL_DATABASE,
-                '--skip-comments',
-                '--compact'
-            ]
-
-            with open(backup_file, 'w') as f:
-                subprocess.run(command, stdout=f, check=True)
+            with self._mysql_defaults_file() as defaults_file:
+                if use_mydumper:
+                    command = [
+                        'mydumper',
+                        f'--defaults-file={defaults_file}',
+                        f'--database={settings.MYSQL_DATABASE}',
+                        f'--outputdir={backup_file}',
+                        f'--rows={MYSQL_DUMP_ROWS_PER_CHUNK}',
+                        f'--threads={os.cpu_count() or 4}',
+                        '--compress',
+                        '--trx-consistency-only'
+                    ]
+                    process = await asyncio.create_subprocess_exec(*command)
+                    if await process.wait() != 0:
+                        raise subprocess.CalledProcessError(process.returncode, command)
+                else:
+                    dump_command = [
+                        'mysqldump',
+                        f'--defaults-extra-file={defaults_file}',
+                        settings.MYSQL_DATABASE,
+                        '--skip-comments',
+                        '--compact'
+                    ]
+                    await asyncio.to_thread(_dump_to_backup, dump_command, backup_file)
 
             logger.info(f"MySQL备份完成: {backup_file}")
             return backup_file
 
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, OSError) as e:
             logger.error(f"MySQL备份失败: {e}")
             return None
 
     def backup_neo4j(self, backup_file: str = None):
-        """备份Neo4j数据"""
+        """备份Neo4j数据，每行一条JSON记录（JSONL），节点在前、关系在后
+
+        文件名以 .zst 结尾（默认）时边导出边由 zstd 后台线程压缩。
+        """
         import os
-        import subprocess
 
         if not backup_file:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"{self._backup_path}/neo4j_backup_{timestamp}.cql"
+            backup_file = f"{self._backup_path}/neo4j_backup_{timestamp}.jsonl.zst"
 
         os.makedirs(os.path.dirname(backup_file), exist_ok=True)
 
         try:
-            with self.neo4j_session() as session:
-                # 导出节点
+            with self.neo4j_session(fetch_size=NEO4J_BACKUP_FETCH_SIZE) as session, \
+                    _open_backup(backup_file, 'wb') as f:
+                # 导出节点：逐条消费结果流并写出，不在内存中物化整张图，也无需服务端排序
                 nodes_query = """
                 MATCH (n)
                 RETURN labels(n) as labels, properties(n) as properties
-                ORDER BY id(n)
                 """
 
-                # 导出关系
+                # 导出关系：端点只记录唯一键 entity，恢复时走 Memory.entity 唯一约束索引
                 relations_query = """
-                MATCH (a)-[r]->(b)
-                RETURN labels(a) as start_labels, 
-                       properties(a) as start_props,
-                       type(r) as rel_type,
-                       properties(r) as rel_props,
-                       labels(b) as end_labels,
-                       properties(b) as end_props
-                ORDER BY id(r)
+                MATCH (a:Memory)-[r]->(b:Memory)
+                RETURN a.entity as a_entity, b.entity as b_entity,
+                       type(r) as rel_type, properties(r) as rel_props
                 """
 
-                nodes = list(session.run(nodes_query))
-                relations = list(session.run(relations_query))
-
-                with open(backup_file, 'w') as f:
-                    # 写入节点
-                    for node in nodes:
-                        labels = ':'.join(node['labels'])
-                        props = json.dumps(dict(node['properties']), ensure_ascii=False)
-                        f.write(f"CREATE (n:{labels} {props});\n")
-
-                    # 写入关系
-                    for rel in relations:
-                        start_labels = ':'.join(rel['start_labels'])
-                        start_props = json.dumps(dict(rel['start_props']), ensure_ascii=False)
-                        end_labels = ':'.join(rel['end_labels'])
-                        end_props = json.dumps(dict(rel['end_props']), ensure_ascii=False)
-                        rel_type = rel['rel_type']
-                        rel_props = json.dumps(dict(rel['rel_props']), ensure_ascii=False)
-
-                        f.write(
-                            f"MATCH (a:{start_labels} {start_props}), "
-                            f"(b:{end_labels} {end_props}) "
-                            f"CREATE (a)-[:{rel_type} {rel_props}]->(b);\n"
-                        )
-
-                logger.info(f"Neo4j备份完成: {backup_file}")
-                return backup_file
+                # 写入节点
+                for node in session.run(nodes_query):
+                    f.write(_dump_backup_row({
+                        "kind": "node",
+                        "labels": node['labels'],
+                        "props": node['properties']
+                    }))
+
+                # 写入关系
+                for rel in session.run(relations_query):
+                    f.write(_dump_backup_row({
+                        "kind": "rel",
+                        "a_entity": rel['a_entity'],
+                        "b_entity": rel['b_entity'],
+                        "type": rel['rel_type'],
+                        "props": rel['rel_props']
+                    }))
+
+            logger.info(f"Neo4j备份完成: {backup_file}")
+            return backup_file
 
         except Exception as e:
             logger.error(f"Neo4j备份失败: {e}")
             return None
 
-    def restore_mysql(self, backup_file: str):
-        """恢复MySQL数据"""
-        import subprocess
+    def backup_neo4j_parquet(self, backup_dir: str = None):
+        """备份Neo4j数据为Parquet目录：nodes.parquet 与 rels.parquet，列式zstd压缩
+
+        各节点/关系的属性集合不固定，属性整体按JSON字节串存为一列；
+        entity/type 单独成列，便于不解析属性直接按列检查备份内容。
+        """
+        import os
+        import pyarrow as pa
+
+        if not backup_dir:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            backup_dir = f"{self._backup_path}/neo4j_backup_{timestamp}"
+
+        os.makedirs(backup_dir, exist_ok=True)
+
+        node_schema = pa.schema([
+            ('labels', pa.list_(pa.string())),
+            ('entity', pa.string()),
+            ('type', pa.string()),
+            ('props', pa.binary())
+        ])
+        rel_schema = pa.schema([
+            ('a_entity', pa.string()),
+            ('b_entity', pa.string()),
+            ('type', pa.string()),
+            ('props', pa.binary())
+        ])
 
         try:
-            command = [
-                'mysql',
-                f'-u{settings.MYSQL_USER}',
-                f'-p{settings.MYSQL_PASSWORD}',
-                f'-h{settings.MYSQL_HOST}',
-                f'-P{settings.MYSQL_PORT}',
-                settings.MYSQL_DATABASE
-            ]
+            with self.neo4j_session(fetch_size=NEO4J_BACKUP_FETCH_SIZE) as session:
+                nodes = session.run("""
+                MATCH (n)
+                RETURN labels(n) as labels, n.entity as entity, n.type as type,
+                       properties(n) as properties
+                """)
+                self._write_parquet(f"{backup_dir}/nodes.parquet", node_schema, (
+                    (node['labels'], node['entity'], node['type'],
+                     orjson.dumps(node['properties'], default=_encode_backup_value))
+                    for node in nodes
+                ))
+
+                rels = session.run("""
+                MATCH (a:Memory)-[r]->(b:Memory)
+                RETURN a.entity as a_entity, b.entity as b_entity,
+                       type(r) as rel_type, properties(r) as rel_props
+                """)
+                self._write_parquet(f"{backup_dir}/rels.parquet", rel_schema, (
+                    (rel['a_entity'], rel['b_entity'], rel['rel_type'],
+                     orjson.dumps(rel['rel_props'], default=_encode_backup_value))
+                    for rel in rels
+                ))
+
+            logger.info(f"Neo4j备份完成: {backup_dir}")
+            return backup_dir
 
-            with open(backup_file, 'r') as f:
-                subprocess.run(command, stdin=f, check=True)
+        except Exception as e:
+            logger.error(f"Neo4j备份失败: {e}")
+            return None
+
+    @staticmethod
+    def _write_parquet(path: str, schema, rows: Iterable[tuple]):
+        """按 NEO4J_BACKUP_FETCH_SIZE 行攒成一个RecordBatch写入，内存只保留一批"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        def to_batch(columns):
+            return pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            )
+
+        columns = [[] for _ in schema]
+        with pq.ParquetWriter(path, schema, compression=NEO4J_PARQUET_COMPRESSION) as writer:
+            for row in rows:
+                for column, value in zip(columns, row):
+                    column.append(value)
+                if len(columns[0]) >= NEO4J_BACKUP_FETCH_SIZE:
+                    writer.write_batch(to_batch(columns))
+                    columns = [[] for _ in schema]
+
+            if columns[0]:
+                writer.write_batch(to_batch(columns))
+
+    def restore_mysql(self, backup_file: str, bulk_load: bool = True):
+        """恢复MySQL数据，目录形式的备份使用 myloader 多线程导入
+
+        bulk_load 为真时，SQL文件在单个事务中导入并临时关闭唯一性/外键检查；
+        备份文件自身依赖分段事务时传 False。.zst 文件边解压边导入。
+        """
+        import os
+        import shutil
+        import subprocess
+
+        try:
+            with self._mysql_defaults_file() as defaults_file:
+                if os.path.isdir(backup_file):
+                    command = [
+                        'myloader',
+                        f'--defaults-file={defaults_file}',
+                        f'--database={settings.MYSQL_DATABASE}',
+                        f'--directory={backup_file}',
+                        f'--queries-per-transaction={MYSQL_DUMP_ROWS_PER_CHUNK}',
+                        f'--threads={os.cpu_count() or 4}',
+                        '--overwrite-tables'
+                    ]
+                    subprocess.run(command, check=True)
+                else:
+                    command = [
+                        'mysql',
+                        f'--defaults-extra-file={defaults_file}',
+                        settings.MYSQL_DATABASE
+                    ]
+                    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+                    try:
+                        if bulk_load:
+                            process.stdin.write(MYSQL_BULK_LOAD_PROLOGUE)
+                        with _open_backup(backup_file, 'rb') as f:
+                            shutil.copyfileobj(f, process.stdin, length=1 << 20)
+                        if bulk_load:
+                            process.stdin.write(MYSQL_BULK_LOAD_EPILOGUE)
+                    finally:
+                        process.stdin.close()
+
+                    if process.wait() != 0:
+                        raise subprocess.CalledProcessError(process.returncode, command)
 
             logger.info(f"MySQL恢复完成: {backup_file}")
             return True
@@ -288,24 +703,48 @@ class DatabaseManager:
             return False
 
     def restore_neo4j(self, backup_file: str):
-        """恢复Neo4j数据"""
+        """恢复Neo4j数据：节点按标签分组、关系按端点entity，UNWIND批量写入，每批一个写事务
+
+        backup_file 为目录时按 backup_neo4j_parquet 的Parquet备份读取，.cql 为旧版Cypher脚本，
+        其余按JSONL读取。
+        """
         try:
             # 先清空现有数据
             with self.neo4j_session() as session:
                 session.run("MATCH (n) DETACH DELETE n")
 
-            # 执行备份文件
-            with self.neo4j_session() as session:
-                with open(backup_file, 'r') as f:
-                    cql_statements = f.read().split(';')
+            if backup_file.endswith('.cql'):
+                self._restore_cql(backup_file)
+                logger.info(f"Neo4j恢复完成: {backup_file}")
+                return True
 
-                    for statement in cql_statements:
-                        statement = statement.strip()
-                        if statement:
-                            try:
-                                session.run(statement)
-                            except Exception as e:
-                                logger.warning(f"执行CQL语句失败: {statement[:50]}... - {e}")
+            node_batches = defaultdict(list)
+            rel_batch = []
+
+            with self.neo4j_session() as session:
+                for row in self._iter_neo4j_backup(backup_file):
+                    if row["kind"] == "node":
+                        key = tuple(row["labels"])
+                        batch = node_batches[key]
+                        batch.append(_decode_backup_props(row["props"]))
+                        if len(batch) >= NEO4J_RESTORE_BATCH_SIZE:
+                            self._restore_node_batch(session, key, node_batches.pop(key))
+                        continue
+
+                    # 备份中节点全部位于关系之前，遇到首条关系时先写完剩余节点
+                    for key in list(node_batches):
+                        self._restore_node_batch(session, key, node_batches.pop(key))
+
+                    row["props"] = _decode_backup_props(row["props"])
+                    rel_batch.append(row)
+                    if len(rel_batch) >= NEO4J_RESTORE_BATCH_SIZE:
+                        self._restore_rel_batch(session, rel_batch)
+                        rel_batch = []
+
+                for key in list(node_batches):
+                    self._restore_node_batch(session, key, node_batches.pop(key))
+                if rel_batch:
+                    self._restore_rel_batch(session, rel_batch)
 
             logger.info(f"Neo4j恢复完成: {backup_file}")
             return True
@@ -314,35 +753,406 @@ class DatabaseManager:
             logger.error(f"Neo4j恢复失败: {e}")
             return False
 
+    def _restore_cql(self, backup_file: str):
+        """流式执行旧版Cypher脚本备份，每 CQL_RESTORE_BATCH_SIZE 条语句一个显式事务"""
+        def run_batch(statements):
+            with session.begin_transaction() as tx:
+                for statement in statements:
+                    tx.run(statement).consume()
+                tx.commit()
+
+        with self.neo4j_session() as session, open(backup_file, 'r', encoding='utf-8') as f:
+            batch = []
+            for statement in _iter_cql_statements(f):
+                batch.append(statement)
+                if len(batch) >= CQL_RESTORE_BATCH_SIZE:
+                    run_batch(batch)
+                    batch = []
+            if batch:
+                run_batch(batch)
+
+    @staticmethod
+    def _iter_neo4j_backup(backup_file: str):
+        """逐条产出备份记录（JSONL行格式），Parquet备份按批读取后转换"""
+        import os
+
+        if not os.path.isdir(backup_file):
+            with _open_backup(backup_file, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        yield orjson.loads(line)
+            return
+
+        import pyarrow.parquet as pq
+
+        nodes = pq.ParquetFile(f"{backup_file}/nodes.parquet")
+        for batch in nodes.iter_batches(batch_size=NEO4J_RESTORE_BATCH_SIZE,
+                                        columns=['labels', 'props']):
+            columns = batch.to_pydict()
+            for row_labels, row_props in zip(columns['labels'], columns['props']):
+                yield {"kind": "node", "labels": row_labels, "props": orjson.loads(row_props)}
+
+        rels = pq.ParquetFile(f"{backup_file}/rels.parquet")
+        for batch in rels.iter_batches(batch_size=NEO4J_RESTORE_BATCH_SIZE):
+            columns = batch.to_pydict()
+            for a_entity, b_entity, rel_type, rel_props in zip(
+                    columns['a_entity'], columns['b_entity'], columns['type'], columns['props']):
+                yield {
+                    "kind": "rel",
+                    "a_entity": a_entity,
+                    "b_entity": b_entity,
+                    "type": rel_type,
+                    "props": orjson.loads(rel_props)
+                }
+
+    @staticmethod
+    def _restore_node_batch(session, labels: Tuple[str, ...], rows: List[dict]):
+        """在一个写事务内批量创建同一标签组合的节点"""
+        query = f"UNWIND $rows AS props CREATE (n{_cypher_labels(labels)}) SET n = props"
+        session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+
+    @staticmethod
+    def _restore_rel_batch(session, rows: List[dict]):
+        """在一个写事务内批量创建关系，端点按 Memory.entity 唯一索引查找"""
+        query = """
+        UNWIND $rows AS r
+        MATCH (a:Memory {entity: r.a_entity})
+        MATCH (b:Memory {entity: r.b_entity})
+        CALL apoc.create.relationship(a, r.type, r.props, b) YIELD rel
+        RETURN count(rel)
+        """
+        session.execute_write(lambda tx: tx.run(query, rows=rows).consume())
+
     def cache_query_result(self, query: str, result: Any, ttl: int = 3600):
         """缓存查询结果"""
         if not self._redis_client:
             return
 
-        cache_key = f"query_cache:{hashlib.md5(query.encode()).hexdigest()}"
+        cache_key = _query_cache_key(query)
+        self._set_l1_result(cache_key, result, ttl)
+
         try:
             self._redis_client.setex(
                 cache_key,
                 ttl,
-                pickle.dumps(result)
+                _encode_query_cache(result)
             )
         except Exception as e:
             logger.warning(f"缓存查询结果失败: {e}")
 
+    async def cache_query_result_async(self, query: str, result: Any, ttl: int = 3600):
+        """异步缓存查询结果，同时写入L1与Redis"""
+        if not self._redis_async_client:
+            return
+
+        cache_key = _query_cache_key(query)
+        self._set_l1_result(cache_key, result, ttl)
+
+        try:
+            await self._redis_async_client.setex(cache_key, ttl, _encode_query_cache(result))
+        except Exception as e:
+            logger.warning(f"缓存查询结果失败: {e}")
+
     def get_cached_result(self, query: str) -> Optional[Any]:
         """获取缓存的查询结果"""
         if not self._redis_client:
             return None
 
-        cache_key = f"query_cache:{hashlib.md5(query.encode()).hexdigest()}"
+        cache_key = _query_cache_key(query)
+        result = self._get_l1_result(cache_key)
+        if result is not None:
+            return result
+
         try:
-            cached = self._redis_client.get(cache_key)
-            if cached:
-                return pickle.loads(cached)
+            pipe = self._redis_client.pipeline(transaction=False)
+            pipe.get(cache_key)
+            pipe.pttl(cache_key)
+            cached, pttl = pipe.execute()
         except Exception as e:
             logger.warning(f"获取缓存失败: {e}")
+            cached, pttl = None, -2
 
-        return None
+        return self._fill_l1_result(cache_key, cached, pttl)
+
+    async def get_cached_result_async(self, query: str) -> Optional[Any]:
+        """异步获取缓存的查询结果：先查进程内L1，未命中再查Redis并回填L1"""
+        if not self._redis_async_client:
+            return None
+
+        cache_key = _query_cache_key(query)
+        result = self._get_l1_result(cache_key)
+        if result is not None:
+            return result
+
+        try:
+            async with self._redis_async_client.pipeline(transaction=False) as pipe:
+                pipe.get(cache_key)
+                pipe.pttl(cache_key)
+                cached, pttl = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"获取缓存失败: {e}")
+            cached, pttl = None, -2
+
+        return self._fill_l1_result(cache_key, cached, pttl)
+
+    def _set_l1_result(self, cache_key: str, result: Any, ttl: float):
+        """写入L1，有效期取 ttl 与 L1_CACHE_TTL 中较短者"""
+        with self._l1_lock:
+            self._l1_cache[cache_key] = (result, min(ttl, settings.L1_CACHE_TTL))
+
+    def _backfill_l1_result(self, cache_key: str, result: Any, pttl: int):
+        """Redis命中后回填L1，有效期不超过该键在Redis中的剩余时间（pttl 毫秒，-1 表示未设置过期）"""
+        if pttl == -1:
+            self._set_l1_result(cache_key, result, settings.L1_CACHE_TTL)
+        elif pttl > 0:
+            self._set_l1_result(cache_key, result, pttl / 1000)
+
+    def _get_l1_result(self, cache_key: str) -> Optional[Any]:
+        with self._l1_lock:
+            entry = self._l1_cache.get(cache_key)
+        if entry is None:
+            return None
+        self._query_cache_stats["l1_hits"] += 1
+        return entry[0]
+
+    def _fill_l1_result(self, cache_key: str, cached: Optional[bytes], pttl: int) -> Optional[Any]:
+        """解码Redis中取回的值并回填L1，同时记录L2命中/未命中"""
+        result = _decode_query_cache(cached) if cached else None
+        if result is None:
+            self._query_cache_stats["misses"] += 1
+            return None
+
+        self._query_cache_stats["l2_hits"] += 1
+        self._backfill_l1_result(cache_key, result, pttl)
+        return result
+
+    def get_cached_results(self, queries: List[str]) -> List[Optional[Any]]:
+        """批量获取查询缓存，L1未命中的键通过一次MGET取回，结果与 queries 一一对应"""
+        cache_keys = [_query_cache_key(query) for query in queries]
+        with self._l1_lock:
+            entries = [self._l1_cache.get(key) for key in cache_keys]
+        results = [entry[0] if entry is not None else None for entry in entries]
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing or not self._redis_client:
+            return results
+
+        try:
+            pipe = self._redis_client.pipeline(transaction=False)
+            pipe.mget([cache_keys[i] for i in missing])
+            for i in missing:
+                pipe.pttl(cache_keys[i])
+            cached_values, *pttls = pipe.execute()
+        except Exception as e:
+            logger.warning(f"批量获取缓存失败: {e}")
+            return results
+
+        for i, cached, pttl in zip(missing, cached_values, pttls):
+            if cached:
+                results[i] = _decode_query_cache(cached)
+                if results[i] is not None:
+                    self._backfill_l1_result(cache_keys[i], results[i], pttl)
+
+        return results
+
+    def cache_query_results(self, pairs: Iterable[Tuple[str, Any]], ttl: int = 3600):
+        """批量缓存查询结果，通过非事务pipeline每 QUERY_CACHE_PIPELINE_BATCH 条提交一次"""
+        if not self._redis_client:
+            return
+
+        try:
+            pipe = self._redis_client.pipeline(transaction=False)
+            for i, (query, result) in enumerate(pairs, 1):
+                cache_key = _query_cache_key(query)
+                self._set_l1_result(cache_key, result, ttl)
+                pipe.setex(cache_key, ttl, _encode_query_cache(result))
+                if i % QUERY_CACHE_PIPELINE_BATCH == 0:
+                    pipe.execute()
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"批量缓存查询结果失败: {e}")
+
+    def invalidate_query(self, query: str):
+        """使查询缓存失效：清除本进程L1与Redis条目，并通知其他进程清除L1"""
+        cache_key = _query_cache_key(query)
+        with self._l1_lock:
+            self._l1_cache.pop(cache_key, None)
+
+        if not self._redis_client:
+            return
+
+        try:
+            self._redis_client.unlink(cache_key)
+            self._redis_client.publish(CACHE_INVALIDATE_CHANNEL, cache_key)
+        except Exception as e:
+            logger.warning(f"查询缓存失效失败: {e}")
+
+    def clear_local_cache(self):
+        """清空全部进程的L1缓存"""
+        with self._l1_lock:
+            self._l1_cache.clear()
+
+        if not self._redis_client:
+            return
+
+        try:
+            self._redis_client.publish(CACHE_INVALIDATE_CHANNEL, "*")
+        except Exception as e:
+            logger.warning(f"广播缓存清空失败: {e}")
+
+    def _on_cache_invalidate(self, message: dict):
+        """处理失效广播（订阅线程中执行）"""
+        cache_key = message["data"].decode()
+        with self._l1_lock:
+            if cache_key == "*":
+                self._l1_cache.clear()
+            else:
+                self._l1_cache.pop(cache_key, None)
+
+    def get_cached_value(self, key: str) -> Optional[Any]:
+        """按键读取缓存值（orjson反序列化）"""
+        if not self._redis_client:
+            return None
+
+        try:
+            cached = self._redis_client.get(key)
+        except Exception as e:
+            logger.warning(f"读取缓存失败: {e}")
+            return None
+
+        if cached is None:
+            self._cache_stats["misses"] += 1
+            return None
+
+        self._cache_stats["hits"] += 1
+        return orjson.loads(cached)
+
+    def cache_value(self, key: str, value: Any, ttl: int):
+        """按键写入缓存值（orjson序列化）"""
+        if not self._redis_client:
+            return
+
+        try:
+            self._redis_client.setex(key, ttl, orjson.dumps(value))
+        except Exception as e:
+            logger.warning(f"写入缓存失败: {e}")
+
+    def invalidate_cache(self, *keys: str):
+        """删除缓存键，含 * 的键按模式 SCAN 后 UNLINK"""
+        if not self._redis_client:
+            return
+
+        try:
+            exact_keys = [key for key in keys if '*' not in key]
+            if exact_keys:
+                self._redis_client.unlink(*exact_keys)
+
+            for pattern in (key for key in keys if '*' in key):
+                matched = list(self._redis_client.scan_iter(match=pattern, count=500))
+                if matched:
+                    self._redis_client.unlink(*matched)
+        except Exception as e:
+            logger.warning(f"清除缓存失败: {e}")
+
+    async def get_cached_value_async(self, key: str) -> Optional[Any]:
+        """按键读取缓存值（异步客户端）"""
+        if not self._redis_async_client:
+            return None
+
+        try:
+            cached = await self._redis_async_client.get(key)
+        except Exception as e:
+            logger.warning(f"读取缓存失败: {e}")
+            return None
+
+        if cached is None:
+            self._cache_stats["misses"] += 1
+            return None
+
+        self._cache_stats["hits"] += 1
+        return orjson.loads(cached)
+
+    async def cache_value_async(self, key: str, value: Any, ttl: int):
+        """按键写入缓存值（异步客户端）"""
+        if not self._redis_async_client:
+            return
+
+        try:
+            await self._redis_async_client.setex(key, ttl, orjson.dumps(value))
+        except Exception as e:
+            logger.warning(f"写入缓存失败: {e}")
+
+    async def invalidate_cache_async(self, *keys: str):
+        """删除缓存键（异步客户端），含 * 的键按模式 SCAN 后 UNLINK"""
+        if not self._redis_async_client:
+            return
+
+        try:
+            exact_keys = [key for key in keys if '*' not in key]
+            if exact_keys:
+                await self._redis_async_client.unlink(*exact_keys)
+
+            for pattern in (key for key in keys if '*' in key):
+                matched = [
+                    key async for key in
+                    self._redis_async_client.scan_iter(match=pattern, count=500)
+                ]
+                if matched:
+                    await self._redis_async_client.unlink(*matched)
+        except Exception as e:
+            logger.warning(f"清除缓存失败: {e}")
+
+    async def reset_cache_async(self) -> int:
+        """清空本应用的缓存：按键模式 SCAN 后分批 UNLINK，不影响同一Redis上的其他数据，返回删除的键数"""
+        if not self._redis_async_client:
+            return 0
+
+        deleted = 0
+        for pattern in APP_CACHE_PATTERNS:
+            batch = []
+            async for key in self._redis_async_client.scan_iter(
+                    match=pattern, count=CACHE_RESET_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= CACHE_RESET_BATCH_SIZE:
+                    deleted += await self._redis_async_client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += await self._redis_async_client.unlink(*batch)
+
+        self.clear_local_cache()
+        return deleted
+
+    def get_cache_stats(self) -> dict:
+        """获取缓存命中统计"""
+        hits = self._cache_stats["hits"]
+        misses = self._cache_stats["misses"]
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "query_cache": dict(self._query_cache_stats)
+        }
+
+    async def close_async(self):
+        """关闭异步引擎/驱动后再关闭其余连接"""
+        try:
+            if self._mysql_async_engine:
+                await self._mysql_async_engine.dispose()
+                logger.info("MySQL异步连接池已关闭")
+
+            if self._neo4j_async_driver:
+                await self._neo4j_async_driver.close()
+                logger.info("Neo4j异步连接已关闭")
+
+            if self._redis_async_client:
+                await self._redis_async_client.close()
+                await self._redis_async_client.connection_pool.disconnect()
+                logger.info("Redis异步连接已关闭")
+        except Exception as e:
+            logger.error(f"关闭异步连接时出错: {e}")
+
+        self.close()
 
     def close(self):
         """关闭所有数据库连接"""
@@ -355,13 +1165,201 @@ class DatabaseManager:
                 self._neo4j_driver.close()
                 logger.info("Neo4j连接已关闭")
 
+            if self._invalidation_thread:
+                self._invalidation_thread.stop()
+
             if self._redis_client:
                 self._redis_client.close()
+                self._redis_pool.disconnect()
                 logger.info("Redis连接已关闭")
 
         except Exception as e:
             logger.error(f"关闭数据库连接时出错: {e}")
 
 
+def _install_idle_ping(pool):
+    """按需探活：未开启 pool_pre_ping 时，仅对空闲超过 MYSQL_PING_IDLE_SECONDS 的连接在检出时ping
+
+    活跃连接检出不额外付出往返；ping失败抛出 DisconnectionError，由连接池丢弃该连接并重新获取。
+    """
+    if settings.MYSQL_PRE_PING:
+        return
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < settings.MYSQL_PING_IDLE_SECONDS:
+            return
+        try:
+            dbapi_connection.ping(False)
+        except Exception as e:
+            raise DisconnectionError() from e
+
+
+# Neo4j时间类型在备份中编码为 {标记: ISO字符串}，恢复时按标记还原为原类型
+# （Neo4j属性值不能是map，备份属性中出现的对象只可能是这些标记）
+_TEMPORAL_TAGS = {
+    neo4j_time.DateTime: "$dt",
+    neo4j_time.Date: "$date",
+    neo4j_time.Time: "$time",
+    neo4j_time.Duration: "$duration",
+}
+_TEMPORAL_TYPES = {tag: cls for cls, tag in _TEMPORAL_TAGS.items()}
+
+
+def _encode_backup_value(value: Any) -> Any:
+    """orjson 的 default：Neo4j时间类型编码为标记对象，其余非JSON原生值按字符串导出"""
+    tag = _TEMPORAL_TAGS.get(type(value))
+    if tag is not None:
+        return {tag: value.iso_format()}
+    return str(value)
+
+
+def _decode_backup_value(value: Any) -> Any:
+    if isinstance(value, dict) and len(value) == 1:
+        (tag, iso), = value.items()
+        cls = _TEMPORAL_TYPES.get(tag)
+        if cls is not None:
+            return cls.from_iso_format(iso)
+    if isinstance(value, list):
+        return [_decode_backup_value(item) for item in value]
+    return value
+
+
+def _decode_backup_props(props: dict) -> dict:
+    """将备份中的属性还原为写入Neo4j的参数，时间类型标记还原为对应的驱动类型"""
+    return {key: _decode_backup_value(value) for key, value in props.items()}
+
+
+def _dump_backup_row(row: dict) -> bytes:
+    """序列化一行备份记录，Neo4j时间类型编码为带类型标记的ISO字符串"""
+    return orjson.dumps(row, default=_encode_backup_value, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def _cypher_labels(labels) -> str:
+    """拼接带反引号转义的标签，如 :`Memory`"""
+    return ''.join(f":`{label}`" for label in labels)
+
+
+@contextmanager
+def _open_backup(path: str, mode: str):
+    """打开单文件备份，.zst 结尾的文件透明地流式压缩/解压（压缩使用全部核心的后台线程）"""
+    import io
+
+    with open(path, mode) as raw:
+        if not path.endswith('.zst'):
+            yield raw
+        elif 'w' in mode:
+            compressor = zstd.ZstdCompressor(level=BACKUP_ZSTD_LEVEL, threads=-1)
+            with compressor.stream_writer(raw, closefd=False) as writer:
+                yield writer
+        else:
+            with zstd.ZstdDecompressor().stream_reader(raw, closefd=False) as reader:
+                yield io.BufferedReader(reader, buffer_size=1 << 20)
+
+
+def _dump_to_backup(command: List[str], path: str):
+    """运行导出命令并将其标准输出写入备份文件（.zst 结尾时流式压缩），在线程中执行
+
+    写入失败时终止导出进程，任何情况下都等待其退出，不留下僵尸进程。
+    """
+    import shutil
+    import subprocess
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        with _open_backup(path, 'wb') as out:
+            shutil.copyfileobj(process.stdout, out, BACKUP_COPY_CHUNK_SIZE)
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+def _iter_cql_statements(fp, block_size: int = CQL_READ_BLOCK_SIZE):
+    """按块读取Cypher脚本并逐条产出语句
+
+    只在字符串与反引号标识符之外的分号处断句，引号内的分号及转义引号不会截断语句；
+    内存中只保留当前未结束的语句。
+    """
+    pending = []
+    quote = None
+    escaped = False
+
+    while True:
+        block = fp.read(block_size)
+        if not block:
+            break
+
+        start = 0
+        for i, ch in enumerate(block):
+            if quote:
+                if escaped:
+                    escaped = False
+                elif ch == '\\' and quote != '`':
+                    escaped = True
+                elif ch == quote:
+                    quote = None
+            elif ch in '\'"`':
+                quote = ch
+            elif ch == ';':
+                pending.append(block[start:i])
+                statement = ''.join(pending).strip()
+                if statement:
+                    yield statement
+                pending = []
+                start = i + 1
+        pending.append(block[start:])
+
+    statement = ''.join(pending).strip()
+    if statement:
+        yield statement
+
+
+def redis_cached(ttl: int, key_fn: Callable[..., str]):
+    """Redis旁路缓存装饰器：命中直接返回，未命中执行原函数后写回缓存
+
+    key_fn 接收与被装饰函数相同的参数，返回缓存键。
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = key_fn(*args, **kwargs)
+                cached = await db_manager.get_cached_value_async(key)
+                if cached is not None:
+                    return cached
+
+                result = await func(*args, **kwargs)
+                await db_manager.cache_value_async(key, result, ttl)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_fn(*args, **kwargs)
+            cached = db_manager.get_cached_value(key)
+            if cached is not None:
+                return cached
+
+            result = func(*args, **kwargs)
+            db_manager.cache_value(key, result, ttl)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
 # 全局数据库管理器实例
 db_manager = DatabaseManager()
\ No newline at end of file
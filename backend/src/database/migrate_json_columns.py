@@ -0,0 +1,51 @@
+# backend/src/database/migrate_json_columns.py
+"""一次性迁移：还原历史上被 json.dumps 双重编码的JSON列
+
+旧版数据访问层先把列表/字典 json.dumps 成字符串再写入 JSON 列，
+导致列中存的是 JSON 字符串而不是原生 JSON 值。现在读写都直接使用原生值，
+需要先执行本脚本修复存量数据。
+
+用法（在 backend/src 目录下执行）：
+    python -m database.migrate_json_columns
+"""
+import logging
+from typing import Dict
+
+from sqlalchemy import text
+
+from database.db_manager import db_manager
+
+logger = logging.getLogger(__name__)
+
+# 需要修复的表及其JSON列
+JSON_COLUMNS = {
+    "textbook_knowledge": ["tags"],
+    "qa_pairs": ["tags"],
+    "conversation_history": ["context", "memory_used"],
+}
+
+
+def migrate_json_columns() -> Dict[str, int]:
+    """将值类型为 STRING 的JSON列重新解析为原生JSON，返回各列修复的行数"""
+    stats = {}
+
+    with db_manager.mysql_session() as session:
+        for table, columns in JSON_COLUMNS.items():
+            for column in columns:
+                result = session.execute(text(
+                    f"UPDATE {table} "
+                    f"SET {column} = CAST(JSON_UNQUOTE({column}) AS JSON) "
+                    f"WHERE JSON_TYPE({column}) = 'STRING'"
+                ))
+                stats[f"{table}.{column}"] = result.rowcount
+
+    return stats
+
+
+if __name__ == "__main__":
+    db_manager.init_mysql()
+    try:
+        for column, count in migrate_json_columns().items():
+            logger.info(f"{column}: 修复 {count} 行")
+    finally:
+        db_manager.close()
@@ -1,5 +1,5 @@
 # backend/src/database/mysql_models.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -21,6 +21,16 @@ class TextbookKnowledge(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # ngram分词的全文索引，支持中文检索
+        Index('ft_title_content', 'title', 'content',
+              mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+        # 按教材标题查找（数据合成按标题加载教材内容）
+        Index('ft_title', 'title', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+        # 按更新时间倒序的键集分页
+        Index('ix_knowledge_updated', 'updated_at', 'id'),
+    )
+
 
 class QAPair(Base):
     """问答对"""
@@ -35,6 +45,13 @@ class QAPair(Base):
     tags = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index('ft_question_answer', 'question', 'answer',
+              mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+        # 按学科/难度筛选并按创建时间排序
+        Index('ix_qa_subj_diff', 'subject', 'difficulty', 'created_at'),
+    )
+
 
 class ConversationHistory(Base):
     """对话历史"""
@@ -49,11 +66,22 @@ class ConversationHistory(Base):
     memory_used = Column(JSON)  # 使用的记忆
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # 用户对话历史按时间倒序的键集分页
+        Index('ix_conv_user_created', 'user_id', 'created_at', 'id'),
+        # 按时间范围批量清理旧数据
+        Index('ix_conv_created', 'created_at'),
+    )
+
 
 # 创建数据库连接
 engine = create_engine(
     f"mysql+pymysql://{settings.MYSQL_USER}:{settings.MYSQL_PASSWORD}"
-    f"@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}"
+    f"@{settings.MYSQL_HOST}:{settings.MYSQL_PORT}/{settings.MYSQL_DATABASE}",
+    pool_size=settings.MYSQL_POOL_SIZE,
+    max_overflow=settings.MYSQL_MAX_OVERFLOW,
+    pool_pre_ping=settings.MYSQL_PRE_PING,
+    pool_recycle=settings.MYSQL_POOL_RECYCLE
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
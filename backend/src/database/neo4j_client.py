@@ -1,69 +1,125 @@
 # backend/src/database/neo4j_client.py
-from neo4j import GraphDatabase
-from config.settings import settings
+from contextlib import contextmanager
+
+from database.db_manager import db_manager
+
+# 未传属性时共用的空字典，避免每次调用新建（只作为参数发送，不得修改）；
+# 驱动的 packstream 只接受 dict，不能换成 MappingProxyType
+_EMPTY_PROPS = {}
+
+# 查询语句定义为模块级常量，每次调用只传递同一个字符串对象
+
+# 仅以 entity 作为MERGE键，直接命中唯一约束索引；
+# 带上 type 的组合MERGE在同名实体类型不同时会尝试重复创建并违反约束
+_Q_CREATE_NODES = """
+UNWIND $rows AS row
+MERGE (n:Memory {entity: row.entity})
+ON CREATE SET n.type = row.type
+SET n += row.properties
+RETURN n
+"""
+
+_Q_CREATE_RELS = """
+UNWIND $rows AS row
+MATCH (a:Memory {entity: row.entity1})
+MATCH (b:Memory {entity: row.entity2})
+MERGE (a)-[r:RELATION {type: row.relation_type}]->(b)
+SET r += row.properties
+RETURN r
+"""
+
+_Q_GET_RELATED_ALL = """
+MATCH (n:Memory {entity: $entity})-[r:RELATION]->(m:Memory)
+RETURN elementId(m) as node_id, m.entity as entity, m.type as type,
+       m.properties as properties,
+       r.type as relation_type, r.properties as relation_properties
+LIMIT $limit
+"""
+
+_Q_GET_RELATED_TYPED = """
+MATCH (n:Memory {entity: $entity})-[r:RELATION {type: $relation_type}]->(m:Memory)
+RETURN elementId(m) as node_id, m.entity as entity, m.type as type,
+       m.properties as properties,
+       r.type as relation_type, r.properties as relation_properties
+LIMIT $limit
+"""
+
+_Q_SEARCH = """
+CALL db.index.fulltext.queryNodes('memory_search_index', $search_text)
+YIELD node, score
+RETURN node.entity as entity, node.type as type,
+       node.properties as properties, score
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+# 客户端会话每批拉取的记录数
+SESSION_FETCH_SIZE = 1000
 
 
 class Neo4jClient:
     """Neo4j图数据库客户端"""
 
-    def __init__(self):
-        self.driver = GraphDatabase.driver(
-            settings.NEO4J_URI,
-            auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-        )
+    def __init__(self, driver=None):
+        # 默认复用 DatabaseManager 的驱动及其连接池，不再单独建立连接
+        self.driver = driver or db_manager._neo4j_driver
+        if self.driver is None:
+            raise Exception("Neo4j未初始化")
 
     def close(self):
-        self.driver.close()
+        """驱动由 DatabaseManager 持有并负责关闭，这里无需处理"""
+
+    @contextmanager
+    def session(self):
+        """获取Neo4j会话上下文管理器"""
+        with self.driver.session(fetch_size=SESSION_FETCH_SIZE) as session:
+            yield session
 
     def create_memory_node(self, session, entity, entity_type, properties=None):
         """创建记忆节点"""
-        query = """
-        MERGE (n:Memory {entity: $entity, type: $entity_type})
-        SET n += $properties
-        RETURN n
-        """
-        return session.run(query,
-                           entity=entity,
-                           entity_type=entity_type,
-                           properties=properties or {})
+        return self.create_memory_nodes(session, [{
+            "entity": entity,
+            "type": entity_type,
+            "properties": properties if properties is not None else _EMPTY_PROPS
+        }])
+
+    def create_memory_nodes(self, session, rows):
+        """批量创建记忆节点，rows 为 {entity, type, properties} 列表，一条UNWIND语句写入"""
+        return session.run(_Q_CREATE_NODES, parameters={"rows": rows})
 
     def create_relationship(self, session, entity1, entity2, relation_type, properties=None):
         """创建关系"""
-        query = """
-        MATCH (a:Memory {entity: $entity1})
-        MATCH (b:Memory {entity: $entity2})
-        MERGE (a)-[r:RELATION {type: $relation_type}]->(b)
-        SET r += $properties
-        RETURN r
-        """
-        return session.run(query,
-                           entity1=entity1,
-                           entity2=entity2,
-                           relation_type=relation_type,
-                           properties=properties or {})
+        return self.create_relationships(session, [{
+            "entity1": entity1,
+            "entity2": entity2,
+            "relation_type": relation_type,
+            "properties": properties if properties is not None else _EMPTY_PROPS
+        }])
+
+    def create_relationships(self, session, rows):
+        """批量创建关系，rows 为 {entity1, entity2, relation_type, properties} 列表"""
+        return session.run(_Q_CREATE_RELS, parameters={"rows": rows})
 
     def get_related_memories(self, session, entity, relation_type=None, limit=10):
-        """获取相关记忆"""
-        query = """
-        MATCH (n:Memory {entity: $entity})-[r]->(m:Memory)
-        WHERE $relation_type IS NULL OR r.type = $relation_type
-        RETURN m.entity as entity, m.type as type, m.properties as properties,
-               r.type as relation_type, r.properties as relation_properties
-        LIMIT $limit
+        """获取相关记忆
+
+        按是否过滤关系类型选用两条独立查询：`$relation_type IS NULL OR ...` 形式的条件
+        无法走 rel_type_index，只能遍历节点全部关系后过滤。
         """
-        return session.run(query,
-                           entity=entity,
-                           relation_type=relation_type,
-                           limit=limit)
+        if relation_type is None:
+            return session.run(_Q_GET_RELATED_ALL,
+                               parameters={"entity": entity, "limit": limit})
+
+        return session.run(_Q_GET_RELATED_TYPED,
+                           parameters={"entity": entity,
+                                       "relation_type": relation_type,
+                                       "limit": limit})
 
     def search_similar_memories(self, session, search_text, limit=5):
         """搜索相似记忆"""
-        query = """
-        CALL db.index.fulltext.queryNodes('memoryIndex', $search_text) 
-        YIELD node, score
-        RETURN node.entity as entity, node.type as type, 
-               node.properties as properties, score
-        ORDER BY score DESC
-        LIMIT $limit
-        """
-        return session.run(query, search_text=search_text, limit=limit)
\ No newline at end of file
+        return session.run(_Q_SEARCH,
+                           parameters={"search_text": search_text, "limit": limit})
+
+    async def asearch_similar_memories(self, search_text, limit=5):
+        """搜索相似记忆（异步驱动）"""
+        return await db_manager.neo4j_query(_Q_SEARCH, search_text=search_text, limit=limit)
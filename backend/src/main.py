@@ -1,23 +1,38 @@
 # backend/src/main.py
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+import anyio
+import psutil
 import uvicorn
+import orjson
+import asyncio
 import logging
+import os
+import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import traceback
 
 from config.settings import settings
 from database.db_manager import db_manager, DatabaseManager
-from database.data_access import data_access, DataAccessLayer
+from database.data_access import data_access, DataAccessLayer, next_page_cursor
 from services.rag_agent import RAGAgent
-from services.data_synthesizer import DataSynthesizer
-from services.llm_service import LLMService
-from services.retriever_service import RetrieverService
+from services.semantic_cache import SemanticCache
+from services.conversation_writer import conversation_writer
+from api.dependencies import (
+    get_llm_service, get_rag_agent, get_semantic_cache, is_initialized,
+    rag_agent_dependency, semantic_cache_dependency
+)
+from services.task_queue import task_queue
+from api.responses import JSON_DUMPS_OPTIONS, ServiceError, json_response, make_etag, cached_json_response, utcnow_iso
+from models.data_models import KnowledgeBase, QAPairModel, ConversationRecord
 
 # 配置日志
 logging.basicConfig(
@@ -30,46 +45,79 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 全局组件实例
-rag_agent = None
-data_synthesizer = None
-llm_service = None
-retriever_service = None
+# 监控指标：复用同一个进程对象，CPU占用率按相邻两次采样之间的增量计算
+_process = psutil.Process()
+_PROCESS_NAME = _process.name()
+
+# 运行期间不变的系统信息，启动时采集一次
+_STATIC_SYSTEM_INFO = {
+    "platform": platform.platform(),
+    "python_version": platform.python_version(),
+    "cpu_count": psutil.cpu_count(),
+    "memory_total": psutil.virtual_memory().total
+}
+
+# 搜索接口结果缓存时间（秒），知识/问答写入后最多延迟该时间可见
+SEARCH_CACHE_TTL = 60
+
+# 最近一次LLM健康探测的 [时间, 结果]
+_llm_health_cache = [0.0, None]
+_llm_health_lock = asyncio.Lock()
+
+# 正在计算中的 /query 请求，按 (问题, 用户ID) 合并，相同键的并发请求共享同一个任务
+_inflight_queries: Dict[Tuple[str, Optional[str]], asyncio.Task] = {}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    global rag_agent, data_synthesizer, llm_service, retriever_service
-
     # 启动时初始化
     logger.info("正在启动RAG智能体系统...")
 
     try:
+        # 扩大阻塞调用线程池：/query 等接口把耗时数秒的同步LLM/检索调用放到线程中执行，
+        # 默认线程数（CPU核数+4）很快会被占满
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=settings.THREAD_POOL_SIZE)
+        )
+        anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREAD_POOL_SIZE
+
+        # 首次调用 cpu_percent 只建立基准（返回0.0），之后的调用才有意义
+        _process.cpu_percent(None)
+
         # 初始化数据库连接
         logger.info("正在初始化数据库连接...")
         db_manager.init_mysql()
         db_manager.init_neo4j()
         db_manager.init_redis()
+        await task_queue.init()
+
+        # 预热连接池与Cypher查询计划，避免首批请求承担冷启动开销
+        await db_manager.warmup_mysql_pool()
+        await data_access.warmup()
+
+        # 对话记录由后台任务攒批写入
+        conversation_writer.start()
 
         # 创建备份目录
-        import os
         os.makedirs("./data/backups", exist_ok=True)
         logger.info("数据库连接初始化完成")
 
-        # 初始化服务组件
+        # 初始化服务组件：预先调用各工厂函数，请求处理时直接取到已创建的实例
         logger.info("正在初始化服务组件...")
-        llm_service = LLMService()
-        retriever_service = RetrieverService()
-        rag_agent = RAGAgent()
-        data_synthesizer = DataSynthesizer()
+        llm_service = get_llm_service()
+        # 记忆更新由智能体的后台任务从队列中逐个处理
+        get_rag_agent().start_memory_worker()
+
+        # 语义缓存索引从Redis中未过期的条目重建
+        await get_semantic_cache().load()
 
         # 测试LLM连接
         logger.info("正在测试LLM服务连接...")
-        test_response = llm_service.chat_completion([
+        test_response = await asyncio.to_thread(llm_service.chat_completion, [
             {"role": "system", "content": "You are a helpful assistant."},
             {"role": "user", "content": "Hello"}
-        ])
+        ], no_cache=True)
         if test_response:
             logger.info("LLM服务连接成功")
         else:
@@ -86,7 +134,13 @@ async def lifespan(app: FastAPI):
     finally:
         # 关闭时清理
         logger.info("正在关闭RAG智能体系统...")
-        db_manager.close()
+        await conversation_writer.stop()
+        if is_initialized(get_rag_agent):
+            await get_rag_agent().stop_memory_worker()
+        if is_initialized(get_llm_service):
+            await get_llm_service().aclose()
+        await task_queue.close()
+        await db_manager.close_async()
         logger.info("系统已关闭")
 
 
@@ -97,9 +151,13 @@ app = FastAPI(
     description="基于检索增强生成的智能教学系统",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
+# 压缩较大的JSON响应（检索上下文、搜索结果、监控指标等），小响应不压缩以免得不偿失
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -111,7 +169,18 @@ app.add_middleware(
 
 
 # 数据模型
+# 接口模型统一配置：忽略多余字段、不做赋值校验与空白裁剪，走 pydantic-core 的最短路径
+API_MODEL_CONFIG = ConfigDict(
+    extra="ignore",
+    validate_assignment=False,
+    str_strip_whitespace=False,
+    arbitrary_types_allowed=False
+)
+
+
 class QueryRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     question: str
     user_id: Optional[str] = None
     session_id: Optional[str] = None
@@ -119,6 +188,8 @@ class QueryRequest(BaseModel):
 
 
 class QueryResponse(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     response: str
     retrieval_context: dict
     sub_questions: List[str]
@@ -127,6 +198,8 @@ class QueryResponse(BaseModel):
 
 
 class SynthesisRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     textbook_title: str
     num_agents: int = 3
     difficulty_levels: Optional[List[str]] = ["easy", "medium", "hard"]
@@ -134,6 +207,8 @@ class SynthesisRequest(BaseModel):
 
 
 class SynthesisResponse(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     status: str
     qa_pairs_generated: int
     qa_pairs: List[Dict[str, Any]]
@@ -141,6 +216,8 @@ class SynthesisResponse(BaseModel):
 
 
 class AlgorithmDemoRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     algorithm_name: str
     input_data: Dict[str, Any]
     step_by_step: bool = False
@@ -148,6 +225,8 @@ class AlgorithmDemoRequest(BaseModel):
 
 
 class AlgorithmDemoResponse(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     status: str
     algorithm: str
     steps: List[Dict[str, Any]]
@@ -156,6 +235,8 @@ class AlgorithmDemoResponse(BaseModel):
 
 
 class KnowledgeCreateRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     title: str
     content: str
     chapter: Optional[str] = None
@@ -164,6 +245,8 @@ class KnowledgeCreateRequest(BaseModel):
 
 
 class QACreateRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     question: str
     answer: str
     source: str = "manual"
@@ -173,12 +256,16 @@ class QACreateRequest(BaseModel):
 
 
 class MemoryNodeCreateRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     entity: str
     node_type: str
     properties: Optional[Dict[str, Any]] = {}
 
 
 class MemoryRelationCreateRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     subject: str
     relation: str
     object: str
@@ -186,11 +273,15 @@ class MemoryRelationCreateRequest(BaseModel):
 
 
 class BackupRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     backup_type: str = "all"  # all, mysql, neo4j
     description: Optional[str] = None
 
 
 class CleanupRequest(BaseModel):
+    model_config = API_MODEL_CONFIG
+
     days: int = 30
     confirm: bool = False
 
@@ -200,13 +291,28 @@ class CleanupRequest(BaseModel):
 async def global_exception_handler(request: Request, exc: Exception):
     """全局异常处理器"""
     logger.error(f"全局异常: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "status": "error",
             "message": "服务器内部错误",
             "detail": str(exc) if settings.DEBUG else "Internal server error",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utcnow_iso(),
+            "path": request.url.path
+        }
+    )
+
+
+@app.exception_handler(ServiceError)
+async def service_exception_handler(request: Request, exc: ServiceError):
+    """业务异常处理器，接口直接抛出 ServiceError，无需各自捕获再转换为HTTPException"""
+    logger.error(f"业务异常 {exc.status_code}: {exc.detail}")
+    return ORJSONResponse(
+        status_code=exc.status_code,
+        content={
+            "status": "error",
+            "message": exc.detail,
+            "timestamp": utcnow_iso(),
             "path": request.url.path
         }
     )
@@ -216,98 +322,144 @@ async def global_exception_handler(request: Request, exc: Exception):
 async def http_exception_handler(request: Request, exc: HTTPException):
     """HTTP异常处理器"""
     logger.warning(f"HTTP异常 {exc.status_code}: {exc.detail}")
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "status": "error",
             "message": exc.detail,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utcnow_iso(),
             "path": request.url.path
         }
     )
 
 
 # 中间件 - 请求日志
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """请求日志中间件"""
-    start_time = datetime.utcnow()
+class LogMiddleware:
+    """请求日志中间件，纯ASGI实现，不经过 BaseHTTPMiddleware 的任务组与请求/响应包装"""
 
-    # 记录请求
-    logger.info(f"请求开始: {request.method} {request.url.path}")
+    def __init__(self, app):
+        self.app = app
 
-    try:
-        response = await call_next(request)
-        process_time = (datetime.utcnow() - start_time).total_seconds() * 1000
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method, path = scope["method"], scope["path"]
+        status_code = None
+        start_time = time.perf_counter()
+
+        # 记录请求
+        logger.info(f"请求开始: {method} {path}")
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            process_time = (time.perf_counter() - start_time) * 1000
+            logger.error(
+                f"请求异常: {method} {path} "
+                f"- 异常: {exc} - 耗时: {process_time:.2f}ms"
+            )
+            raise
 
         # 记录响应
+        process_time = (time.perf_counter() - start_time) * 1000
         logger.info(
-            f"请求完成: {request.method} {request.url.path} "
-            f"- 状态码: {response.status_code} - 耗时: {process_time:.2f}ms"
+            f"请求完成: {method} {path} "
+            f"- 状态码: {status_code} - 耗时: {process_time:.2f}ms"
         )
 
-        return response
 
-    except Exception as exc:
-        process_time = (datetime.utcnow() - start_time).total_seconds() * 1000
-        logger.error(
-            f"请求异常: {request.method} {request.url.path} "
-            f"- 异常: {exc} - 耗时: {process_time:.2f}ms"
-        )
-        raise
+app.add_middleware(LogMiddleware)
 
 
 # 基础路由
+# 根路由内容固定，启动时序列化一次，请求时只拼接时间戳
+_ROOT_BODY = orjson.dumps({
+    "message": "欢迎使用RAG智能体系统",
+    "version": "1.0.0",
+    "status": "running",
+    "endpoints": {
+        "文档": "/docs",
+        "健康检查": "/health",
+        "系统状态": "/status",
+        "RAG问答": "/query",
+        "数据合成": "/synthesize",
+        "算法演示": "/demo/algorithm",
+        "数据库管理": "/api/database"
+    }
+})[:-1]
+
+
 @app.get("/")
 async def root():
     """根路由"""
-    return {
-        "message": "欢迎使用RAG智能体系统",
-        "version": "1.0.0",
-        "status": "running",
-        "timestamp": datetime.utcnow().isoformat(),
-        "endpoints": {
-            "文档": "/docs",
-            "健康检查": "/health",
-            "系统状态": "/status",
-            "RAG问答": "/query",
-            "数据合成": "/synthesize",
-            "算法演示": "/demo/algorithm",
-            "数据库管理": "/api/database"
-        }
-    }
+    return Response(
+        content=_ROOT_BODY + b',"timestamp":' + orjson.dumps(utcnow_iso()) + b'}',
+        media_type="application/json"
+    )
+
+
+async def _probe_llm() -> Dict[str, Any]:
+    """探测LLM服务，同步HTTP调用放到线程中执行"""
+    if not is_initialized(get_llm_service):
+        return {"status": "not_initialized"}
+
+    response = await asyncio.to_thread(get_llm_service().chat_completion, [
+        {"role": "system", "content": "ping"},
+        {"role": "user", "content": "pong"}
+    ], max_tokens=5, no_cache=True)
+    if not response:
+        return {"status": "disconnected", "response": "no_response"}
+    return {"status": "connected", "response": response[:50]}
+
+
+async def _cached_probe_llm() -> Dict[str, Any]:
+    """短时缓存的LLM探测结果，避免每次健康检查都发起一次真实的LLM调用"""
+    checked_at, result = _llm_health_cache
+    if result is not None and time.monotonic() - checked_at < settings.HEALTH_CACHE_TTL:
+        return result
+
+    async with _llm_health_lock:
+        checked_at, result = _llm_health_cache
+        if result is None or time.monotonic() - checked_at >= settings.HEALTH_CACHE_TTL:
+            result = await _probe_llm()
+            _llm_health_cache[:] = [time.monotonic(), result]
+    return result
+
+
+def _service_status(check: Dict[str, Any]) -> str:
+    """探测结果映射为 connected/disconnected/not_configured"""
+    if check["status"] in ("connected", "not_configured"):
+        return check["status"]
+    return "disconnected"
 
 
 @app.get("/health")
 async def health_check():
-    """健康检查端点"""
+    """健康检查端点，各服务并发探测"""
     try:
-        # 检查MySQL
-        with db_manager.mysql_session() as session:
-            session.execute("SELECT 1")
-
-        # 检查Neo4j
-        with db_manager.neo4j_session() as session:
-            session.run("RETURN 1")
+        checks, llm = await asyncio.gather(db_manager.cached_health(), _cached_probe_llm())
 
-        # 检查Redis
-        redis_status = "connected" if db_manager._redis_client else "not_configured"
-
-        # 检查LLM服务
-        llm_status = "connected" if llm_service and llm_service.chat_completion([
-            {"role": "system", "content": "test"},
-            {"role": "user", "content": "test"}
-        ], max_tokens=10) else "disconnected"
+        for name in ("mysql", "neo4j"):
+            if checks[name]["status"] != "connected":
+                raise Exception(checks[name]["error"])
 
         return {
             "status": "healthy",
             "services": {
                 "mysql": "connected",
                 "neo4j": "connected",
-                "redis": redis_status,
-                "llm": llm_status
+                "redis": _service_status(checks["redis"]),
+                "llm": _service_status(llm)
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
     except Exception as e:
@@ -315,7 +467,7 @@ async def health_check():
         return {
             "status": "unhealthy",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
 
@@ -323,37 +475,20 @@ async def health_check():
 async def system_status():
     """系统状态检查"""
     try:
-        # 获取数据库统计
-        stats = data_access.get_database_stats()
+        # 数据库统计与服务探测并发进行
+        stats, checks = await asyncio.gather(
+            data_access.get_database_stats(), db_manager.cached_health()
+        )
 
         # 获取服务状态
         services = {
-            "mysql": "connected",
-            "neo4j": "connected",
-            "redis": "connected" if db_manager._redis_client else "not_configured",
-            "rag_agent": "initialized" if rag_agent else "not_initialized",
-            "llm_service": "initialized" if llm_service else "not_initialized"
+            "mysql": _service_status(checks["mysql"]),
+            "neo4j": _service_status(checks["neo4j"]),
+            "redis": _service_status(checks["redis"]),
+            "rag_agent": "initialized" if is_initialized(get_rag_agent) else "not_initialized",
+            "llm_service": "initialized" if is_initialized(get_llm_service) else "not_initialized"
         }
 
-        # 检查每个服务的实际状态
-        try:
-            with db_manager.mysql_session() as session:
-                session.execute("SELECT 1")
-        except:
-            services["mysql"] = "disconnected"
-
-        try:
-            with db_manager.neo4j_session() as session:
-                session.run("RETURN 1")
-        except:
-            services["neo4j"] = "disconnected"
-
-        if db_manager._redis_client:
-            try:
-                db_manager._redis_client.ping()
-            except:
-                services["redis"] = "disconnected"
-
         return {
             "status": "running",
             "services": services,
@@ -363,7 +498,7 @@ async def system_status():
                 "api_version": "1.0.0",
                 "startup_time": "已启动"
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
     except Exception as e:
@@ -371,127 +506,207 @@ async def system_status():
         return {
             "status": "error",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
 
+async def _process_query_once(agent: RAGAgent, question: str, user_id: Optional[str]) -> Dict[str, Any]:
+    """单飞合并：同一用户的同一问题同一时刻只执行一次RAG流程，其余并发请求等待同一结果
+
+    提示词含用户ID与用户记忆，只合并同一用户的请求。RAG流程在独立任务中执行，
+    各请求只等待其结果：某个客户端断开时只取消它自己的等待，不影响其他请求。
+    """
+    key = (question, user_id)
+    task = _inflight_queries.get(key)
+    if task is None:
+        task = asyncio.create_task(agent.process_query(question, user_id))
+        _inflight_queries[key] = task
+        task.add_done_callback(lambda t: _finish_inflight_query(key, t))
+    return await asyncio.shield(task)
+
+
+def _finish_inflight_query(key: Tuple[str, Optional[str]], task: asyncio.Task):
+    _inflight_queries.pop(key, None)
+    # 所有等待者都已断开时由这里取走异常，避免 "exception was never retrieved" 警告
+    if not task.cancelled():
+        task.exception()
+
+
 # RAG智能体路由
-@app.post("/query", response_model=QueryResponse)
-async def query_rag_agent(request: QueryRequest):
+@app.post("/query", responses={200: {"model": QueryResponse}})
+async def query_rag_agent(
+        request: QueryRequest,
+        agent: RAGAgent = Depends(rag_agent_dependency),
+        semantic_cache: SemanticCache = Depends(semantic_cache_dependency)
+):
     """RAG智能体问答接口"""
-    if not rag_agent:
-        raise HTTPException(status_code=503, detail="RAG智能体未初始化")
-
     try:
-        # 检查缓存
+        # 检查缓存：先按问题原文查（进程内L1 → Redis L2），命中时无需编码向量；
+        # 再查语义缓存，措辞不同但语义相同的问题也能命中
         cached_result = None
-        if request.use_cache and db_manager._redis_client:
-            cached_result = db_manager.get_cached_result(request.question)
+        embedding = None
+        if request.use_cache:
+            cached_result = await db_manager.get_cached_result_async(request.question)
+
+            if cached_result is None:
+                embedding = await semantic_cache.embed(request.question)
+                cached_result = await semantic_cache.lookup(embedding)
+                if cached_result:
+                    await db_manager.cache_query_result_async(request.question, cached_result)
 
         if cached_result:
             logger.info(f"使用缓存结果: {request.question[:50]}...")
-            return QueryResponse(**cached_result)
+            return json_response(cached_result)
 
         # 处理查询
         logger.info(f"处理查询: {request.question[:100]}...")
-        result = rag_agent.process_query(request.question, request.user_id)
-
-        # 保存对话记录
-        conversation_record = {
-            "user_id": request.user_id or "anonymous",
-            "session_id": request.session_id,
-            "query": request.question,
-            "response": result["response"],
-            "context": result["retrieval_context"],
-            "memory_used": result["retrieval_context"].get("memory", [])
-        }
-
-        conversation_id = data_access.create_conversation(conversation_record)
-
-        # 缓存结果
-        if request.use_cache and db_manager._redis_client:
-            db_manager.cache_query_result(request.question, result)
+        result = await _process_query_once(agent, request.question, request.user_id)
+
+        # 保存对话记录：交给后台批量写入，不等待数据库，响应中不再返回自增ID
+        conversation_writer.submit(ConversationRecord(
+            user_id=request.user_id or "anonymous",
+            session_id=request.session_id,
+            query=request.question,
+            response=result["response"],
+            context=result["retrieval_context"],
+            memory_used=result["retrieval_context"].get("memory", []),
+            created_at=datetime.utcnow()
+        ))
 
         response_data = {
             "response": result["response"],
             "retrieval_context": result["retrieval_context"],
             "sub_questions": result["retrieval_context"].get("sub_questions", []),
-            "conversation_id": conversation_id,
-            "timestamp": datetime.utcnow().isoformat()
+            "conversation_id": None,
+            "timestamp": utcnow_iso()
         }
 
+        # 缓存结果
+        if request.use_cache:
+            await db_manager.cache_query_result_async(request.question, response_data)
+            if embedding is not None:
+                await semantic_cache.store(request.question, embedding, response_data)
+
         logger.info(f"查询处理完成: {request.question[:50]}...")
-        return QueryResponse(**response_data)
+        # 响应数据由本接口自行构建，字段与类型已确定，直接序列化，不再经响应模型校验
+        return json_response(response_data)
 
     except Exception as e:
         logger.error(f"查询处理失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"处理查询失败: {str(e)}")
 
 
-@app.post("/synthesize", response_model=SynthesisResponse)
-async def synthesize_data(request: SynthesisRequest, background_tasks: BackgroundTasks):
-    """数据合成接口"""
-    if not data_synthesizer:
-        raise HTTPException(status_code=503, detail="数据合成器未初始化")
+@app.post("/synthesize", responses={200: {"model": SynthesisResponse}})
+async def synthesize_data(request: SynthesisRequest):
+    """数据合成接口，合成任务投递到后台worker执行，通过 /synthesize/{synthesis_id} 查询进度"""
+    if not task_queue.available:
+        raise HTTPException(status_code=503, detail="任务队列未初始化")
 
     try:
         logger.info(f"开始数据合成: {request.textbook_title}")
-
-        def synthesize_task():
-            """后台合成任务"""
-            try:
-                qa_pairs = data_synthesizer.synthesize_qa_pairs(
-                    request.textbook_title,
-                    request.num_agents
-                )
-                logger.info(f"数据合成完成: 生成 {len(qa_pairs)} 个问答对")
-            except Exception as e:
-                logger.error(f"数据合成任务失败: {e}")
-
-        # 在后台执行合成任务
-        background_tasks.add_task(synthesize_task)
+        job_id = await task_queue.enqueue(
+            "synthesize_qa_task", request.textbook_title, request.num_agents
+        )
 
         # 立即返回响应，不等待任务完成
-        return SynthesisResponse(
-            status="started",
-            qa_pairs_generated=0,
-            qa_pairs=[],
-            synthesis_id=f"synth_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
-        )
+        return json_response({
+            "status": "queued",
+            "qa_pairs_generated": 0,
+            "qa_pairs": [],
+            "synthesis_id": job_id
+        })
 
     except Exception as e:
         logger.error(f"数据合成启动失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"数据合成失败: {str(e)}")
 
 
-@app.post("/demo/algorithm", response_model=AlgorithmDemoResponse)
+@app.get("/synthesize/{synthesis_id}")
+async def get_synthesis_status(synthesis_id: str):
+    """查询数据合成任务状态，完成后附带生成的问答对"""
+    try:
+        job_info = await task_queue.get_status(synthesis_id)
+
+        return {
+            "status": "success",
+            "data": job_info,
+            "timestamp": utcnow_iso()
+        }
+
+    except Exception as e:
+        logger.error(f"查询数据合成任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"查询数据合成任务失败: {str(e)}")
+
+
+# 内置算法的演示步骤与结果为固定内容
+_DEMO_PRESETS = {
+    "kmp": (
+        [
+            {"step": 1, "description": "构建模式串的部分匹配表",
+             "data": {"pattern": "ABCDABD", "next": [0, 0, 0, 0, 1, 2, 0]}},
+            {"step": 2, "description": "初始化主串和模式串指针", "data": {"text_index": 0, "pattern_index": 0}},
+            {"step": 3, "description": "开始匹配过程", "data": {"match_count": 0}},
+            {"step": 4, "description": "根据部分匹配表调整模式串位置", "data": {"adjustment": 2}},
+            {"step": 5, "description": "找到匹配位置", "data": {"position": 15}}
+        ],
+        {"match_position": 15, "comparisons": 28}
+    ),
+    "dp": (
+        [
+            {"step": 1, "description": "初始化动态规划表", "data": {"dp_table": [[0] * 5 for _ in range(5)]}},
+            {"step": 2, "description": "填充基础情况", "data": {"base_cases": "已填充"}},
+            {"step": 3, "description": "递推计算最优解", "data": {"iteration": 1}},
+            {"step": 4, "description": "完成表格填充", "data": {"completed": True}},
+            {"step": 5, "description": "回溯构建最优解", "data": {"solution_path": [1, 3, 5]}}
+        ],
+        {"optimal_value": 42, "solution": [1, 3, 5]}
+    )
+}
+
+
+def _demo_payload(algorithm_name: str, steps: List[Dict[str, Any]], result: Any,
+                  visualization_type: Optional[str], step_by_step: bool) -> Dict[str, Any]:
+    """构建算法演示响应"""
+    return {
+        "status": "success",
+        "algorithm": algorithm_name,
+        "steps": steps,
+        "result": result,
+        "visualization_data": {
+            "type": visualization_type,
+            "algorithm": algorithm_name,
+            "steps": steps,
+            "current_step": 0 if step_by_step else len(steps)
+        }
+    }
+
+
+# 内置算法在默认可视化类型下的完整响应，启动时序列化一次，按 (算法, 是否分步) 直接返回
+_DEMO_CACHE = {
+    (name, step_by_step): orjson.dumps(
+        _demo_payload(name, steps, result, "static", step_by_step), option=JSON_DUMPS_OPTIONS
+    )
+    for name, (steps, result) in _DEMO_PRESETS.items()
+    for step_by_step in (False, True)
+}
+
+
+@app.post("/demo/algorithm", responses={200: {"model": AlgorithmDemoResponse}})
 async def algorithm_demo(request: AlgorithmDemoRequest):
     """算法演示接口"""
     try:
         logger.info(f"算法演示请求: {request.algorithm_name}")
 
+        if request.visualization_type == "static":
+            cached = _DEMO_CACHE.get((request.algorithm_name, request.step_by_step))
+            if cached is not None:
+                return Response(content=cached, media_type="application/json")
+
         # 这里可以根据不同的算法名称实现不同的演示逻辑
         # 目前实现一个通用的模拟演示
 
-        if request.algorithm_name == "kmp":
-            steps = [
-                {"step": 1, "description": "构建模式串的部分匹配表",
-                 "data": {"pattern": "ABCDABD", "next": [0, 0, 0, 0, 1, 2, 0]}},
-                {"step": 2, "description": "初始化主串和模式串指针", "data": {"text_index": 0, "pattern_index": 0}},
-                {"step": 3, "description": "开始匹配过程", "data": {"match_count": 0}},
-                {"step": 4, "description": "根据部分匹配表调整模式串位置", "data": {"adjustment": 2}},
-                {"step": 5, "description": "找到匹配位置", "data": {"position": 15}}
-            ]
-            result = {"match_position": 15, "comparisons": 28}
-        elif request.algorithm_name == "dp":
-            steps = [
-                {"step": 1, "description": "初始化动态规划表", "data": {"dp_table": [[0] * 5 for _ in range(5)]}},
-                {"step": 2, "description": "填充基础情况", "data": {"base_cases": "已填充"}},
-                {"step": 3, "description": "递推计算最优解", "data": {"iteration": 1}},
-                {"step": 4, "description": "完成表格填充", "data": {"completed": True}},
-                {"step": 5, "description": "回溯构建最优解", "data": {"solution_path": [1, 3, 5]}}
-            ]
-            result = {"optimal_value": 42, "solution": [1, 3, 5]}
+        if request.algorithm_name in _DEMO_PRESETS:
+            steps, result = _DEMO_PRESETS[request.algorithm_name]
         else:
             steps = [
                 {"step": 1, "description": "算法初始化", "data": {"status": "initialized"}},
@@ -501,20 +716,10 @@ async def algorithm_demo(request: AlgorithmDemoRequest):
             ]
             result = {"message": "算法演示完成", "input": request.input_data}
 
-        visualization_data = {
-            "type": request.visualization_type,
-            "algorithm": request.algorithm_name,
-            "steps": steps,
-            "current_step": 0 if request.step_by_step else len(steps)
-        }
-
-        return AlgorithmDemoResponse(
-            status="success",
-            algorithm=request.algorithm_name,
-            steps=steps,
-            result=result,
-            visualization_data=visualization_data
-        )
+        return json_response(_demo_payload(
+            request.algorithm_name, steps, result,
+            request.visualization_type, request.step_by_step
+        ))
 
     except Exception as e:
         logger.error(f"算法演示失败: {e}", exc_info=True)
@@ -526,121 +731,131 @@ async def algorithm_demo(request: AlgorithmDemoRequest):
 async def get_database_stats():
     """获取数据库统计信息"""
     try:
-        stats = data_access.get_database_stats()
-        return {
+        stats = await data_access.get_database_stats()
+        return json_response({
             "status": "success",
             "data": stats,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": utcnow_iso()
+        })
     except Exception as e:
         logger.error(f"获取数据库统计失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
 
+@app.get("/api/database/cache/stats")
+async def get_cache_stats():
+    """获取缓存命中统计"""
+    return {
+        "status": "success",
+        "data": db_manager.get_cache_stats(),
+        "timestamp": utcnow_iso()
+    }
+
+
 @app.post("/api/database/knowledge")
 async def create_knowledge_item(request: KnowledgeCreateRequest):
     """创建知识条目"""
-    try:
-        from models.data_models import KnowledgeBase
+    knowledge = KnowledgeBase(
+        title=request.title,
+        content=request.content,
+        chapter=request.chapter,
+        section=request.section,
+        tags=request.tags
+    )
+
+    knowledge_id = await data_access.create_knowledge(knowledge)
+
+    return {
+        "status": "success",
+        "message": "知识条目创建成功",
+        "knowledge_id": knowledge_id,
+        "timestamp": utcnow_iso()
+    }
+
 
-        knowledge = KnowledgeBase(
+@app.post("/api/database/knowledge/bulk")
+async def create_knowledge_items_bulk(request_items: List[KnowledgeCreateRequest]):
+    """批量创建知识条目"""
+    items = [
+        KnowledgeBase(
             title=request.title,
             content=request.content,
             chapter=request.chapter,
             section=request.section,
             tags=request.tags
         )
+        for request in request_items
+    ]
 
-        knowledge_id = data_access.create_knowledge(knowledge)
-
-        return {
-            "status": "success",
-            "message": "知识条目创建成功",
-            "knowledge_id": knowledge_id,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+    created = await data_access.create_knowledge_bulk(items)
 
-    except Exception as e:
-        logger.error(f"创建知识条目失败: {e}")
-        raise HTTPException(status_code=500, detail=f"创建知识条目失败: {str(e)}")
+    return {
+        "status": "success",
+        "message": "知识条目批量创建成功",
+        "created": created,
+        "timestamp": utcnow_iso()
+    }
 
 
 @app.post("/api/database/qa")
 async def create_qa_item(request: QACreateRequest):
     """创建问答对"""
-    try:
-        from models.data_models import QAPairModel
-
-        qa_pair = QAPairModel(
-            question=request.question,
-            answer=request.answer,
-            source=request.source,
-            difficulty=request.difficulty,
-            subject=request.subject,
-            tags=request.tags
-        )
-
-        qa_id = data_access.create_qa_pair(qa_pair)
+    qa_pair = QAPairModel(
+        question=request.question,
+        answer=request.answer,
+        source=request.source,
+        difficulty=request.difficulty,
+        subject=request.subject,
+        tags=request.tags
+    )
 
-        return {
-            "status": "success",
-            "message": "问答对创建成功",
-            "qa_id": qa_id,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+    qa_id = await data_access.create_qa_pair(qa_pair)
 
-    except Exception as e:
-        logger.error(f"创建问答对失败: {e}")
-        raise HTTPException(status_code=500, detail=f"创建问答对失败: {str(e)}")
+    return {
+        "status": "success",
+        "message": "问答对创建成功",
+        "qa_id": qa_id,
+        "timestamp": utcnow_iso()
+    }
 
 
 @app.post("/api/database/memory/node")
 async def create_memory_node_item(request: MemoryNodeCreateRequest):
     """创建记忆节点"""
-    try:
-        success = data_access.create_memory_node(
-            request.entity,
-            request.node_type,
-            request.properties
-        )
-
-        if success:
-            return {
-                "status": "success",
-                "message": "记忆节点创建成功",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        else:
-            raise HTTPException(status_code=500, detail="记忆节点创建失败")
+    success = await data_access.create_memory_node(
+        request.entity,
+        request.node_type,
+        request.properties
+    )
 
-    except Exception as e:
-        logger.error(f"创建记忆节点失败: {e}")
-        raise HTTPException(status_code=500, detail=f"创建记忆节点失败: {str(e)}")
+    if success:
+        return {
+            "status": "success",
+            "message": "记忆节点创建成功",
+            "timestamp": utcnow_iso()
+        }
+    else:
+        raise ServiceError("记忆节点创建失败")
 
 
 @app.post("/api/database/memory/relation")
 async def create_memory_relation_item(request: MemoryRelationCreateRequest):
     """创建记忆关系"""
-    try:
-        success = data_access.create_memory_relation(
-            request.subject,
-            request.relation,
-            request.object,
-            request.properties
-        )
-
-        if success:
-            return {
-                "status": "success",
-                "message": "记忆关系创建成功",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        else:
-            raise HTTPException(status_code=500, detail="记忆关系创建失败")
+    success = await data_access.create_memory_relation(
+        request.subject,
+        request.relation,
+        request.object,
+        request.properties
+    )
 
-    except Exception as e:
-        logger.error(f"创建记忆关系失败: {e}")
-        raise HTTPException(status_code=500, detail=f"创建记忆关系失败: {str(e)}")
+    if success:
+        return {
+            "status": "success",
+            "message": "记忆关系创建成功",
+            "timestamp": utcnow_iso()
+        }
+    else:
+        raise ServiceError("记忆关系创建失败")
 
 
 @app.get("/api/database/memory/search")
@@ -651,13 +866,13 @@ async def search_memory_items(
 ):
     """搜索记忆"""
     try:
-        results = data_access.search_memories(query, limit)
+        results = await data_access.search_memories(query, limit)
 
         return {
             "status": "success",
             "data": results,
             "total": len(results),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
     except Exception as e:
@@ -668,17 +883,18 @@ async def search_memory_items(
 @app.get("/api/database/memory/graph/{entity}")
 async def get_memory_graph(
         entity: str,
+        request: Request,
         depth: int = 2
 ):
-    """获取记忆图"""
+    """获取记忆图，以子图内容摘要作为ETag支持条件请求"""
     try:
-        graph = data_access.get_memory_subgraph(entity, depth)
+        graph = await data_access.get_memory_subgraph(entity, depth)
 
-        return {
+        return cached_json_response(request, {
             "status": "success",
             "data": graph,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+            "timestamp": utcnow_iso()
+        }, make_etag(orjson.dumps(graph)))
 
     except Exception as e:
         logger.error(f"获取记忆图失败: {e}")
@@ -686,36 +902,24 @@ async def get_memory_graph(
 
 
 @app.post("/api/database/backup")
-async def backup_database(
-        request: BackupRequest,
-        background_tasks: BackgroundTasks
-):
-    """备份数据库"""
+async def backup_database(request: BackupRequest):
+    """备份数据库（投递到后台任务队列，由独立worker执行）"""
     try:
-        def do_backup():
-            try:
-                if request.backup_type in ["all", "mysql"]:
-                    backup_file = db_manager.backup_mysql()
-                    if backup_file:
-                        logger.info(f"MySQL备份完成: {backup_file}")
+        job_ids = {}
+        if request.backup_type in ["all", "mysql"]:
+            job_ids["mysql"] = await task_queue.enqueue("backup_mysql_task")
 
-                if request.backup_type in ["all", "neo4j"]:
-                    backup_file = db_manager.backup_neo4j()
-                    if backup_file:
-                        logger.info(f"Neo4j备份完成: {backup_file}")
+        if request.backup_type in ["all", "neo4j"]:
+            job_ids["neo4j"] = await task_queue.enqueue("backup_neo4j_task")
 
-                if request.description:
-                    logger.info(f"备份描述: {request.description}")
-
-            except Exception as e:
-                logger.error(f"备份任务执行失败: {e}")
-
-        background_tasks.add_task(do_backup)
+        if request.description:
+            logger.info(f"备份描述: {request.description}")
 
         return {
             "status": "success",
-            "message": f"{request.backup_type}备份任务已启动",
-            "timestamp": datetime.utcnow().isoformat()
+            "message": f"{request.backup_type}备份任务已提交",
+            "job_ids": job_ids,
+            "timestamp": utcnow_iso()
         }
 
     except Exception as e:
@@ -723,6 +927,23 @@ async def backup_database(
         raise HTTPException(status_code=500, detail=f"启动备份失败: {str(e)}")
 
 
+@app.get("/api/database/backup/status/{job_id}")
+async def get_backup_status(job_id: str):
+    """查询备份任务状态"""
+    try:
+        job_info = await task_queue.get_status(job_id)
+
+        return {
+            "status": "success",
+            "data": job_info,
+            "timestamp": utcnow_iso()
+        }
+
+    except Exception as e:
+        logger.error(f"查询备份任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"查询备份任务失败: {str(e)}")
+
+
 @app.post("/api/database/cleanup")
 async def cleanup_old_data(request: CleanupRequest):
     """清理旧数据"""
@@ -733,13 +954,13 @@ async def cleanup_old_data(request: CleanupRequest):
         )
 
     try:
-        stats = data_access.cleanup_old_data(request.days)
+        stats = await data_access.cleanup_old_data(request.days)
 
         return {
             "status": "success",
             "message": f"清理了 {request.days} 天前的数据",
             "stats": stats,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
     except Exception as e:
@@ -749,32 +970,20 @@ async def cleanup_old_data(request: CleanupRequest):
 
 @app.get("/api/database/health")
 async def database_health_check():
-    """数据库健康检查"""
+    """数据库健康检查，各数据库并发探测，结果短时缓存"""
     try:
-        # 检查MySQL连接
-        mysql_status = "healthy"
-        try:
-            with db_manager.mysql_session() as session:
-                session.execute("SELECT 1")
-        except Exception as e:
-            mysql_status = f"error: {str(e)}"
+        checks = await db_manager.cached_health()
 
-        # 检查Neo4j连接
-        neo4j_status = "healthy"
-        try:
-            with db_manager.neo4j_session() as session:
-                session.run("RETURN 1")
-        except Exception as e:
-            neo4j_status = f"error: {str(e)}"
-
-        # 检查Redis连接
-        redis_status = "not_configured"
-        if db_manager._redis_client:
-            try:
-                db_manager._redis_client.ping()
-                redis_status = "healthy"
-            except Exception as e:
-                redis_status = f"error: {str(e)}"
+        def health_status(check):
+            if check["status"] == "connected":
+                return "healthy"
+            if check["status"] == "not_configured":
+                return "not_configured"
+            return f"error: {check['error']}"
+
+        mysql_status = health_status(checks["mysql"])
+        neo4j_status = health_status(checks["neo4j"])
+        redis_status = health_status(checks["redis"])
 
         return {
             "status": "healthy" if mysql_status == "healthy" and neo4j_status == "healthy" else "unhealthy",
@@ -783,7 +992,7 @@ async def database_health_check():
                 "neo4j": neo4j_status,
                 "redis": redis_status
             },
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
     except Exception as e:
@@ -791,37 +1000,103 @@ async def database_health_check():
         return {
             "status": "error",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
 
+def _search_pagination(page: int, limit: int, total: int,
+                       next_cursor: Optional[Dict[str, Any]] = None,
+                       with_cursor: bool = False) -> Dict[str, Any]:
+    """构建搜索接口的分页信息"""
+    pagination = {
+        "page": page,
+        "limit": limit,
+        "total": total,
+        "has_more": total == limit
+    }
+    if with_cursor:
+        pagination["next_cursor"] = next_cursor
+    return pagination
+
+
+async def _stream_search_page(first, items, page: int, limit: int, cache_key: str,
+                              cursor_field: Optional[str] = None) -> AsyncIterator[bytes]:
+    """将搜索结果逐条序列化为与非流式响应相同结构的JSON字节流，结束后将本页写入搜索缓存
+
+    first 为调用方预取的首条结果，查询本身的失败在开始发送响应前就已抛出。
+    """
+    yield b'{"status":"success","data":['
+    data = []
+    last = None
+    item = first
+    while item is not None:
+        row = item.model_dump()
+        yield (b',' if data else b'') + orjson.dumps(row, option=JSON_DUMPS_OPTIONS)
+        data.append(row)
+        last = item
+        item = await anext(items, None)
+
+    next_cursor = next_page_cursor(last, len(data), limit, cursor_field) if cursor_field else None
+    pagination = _search_pagination(page, limit, len(data), next_cursor, cursor_field is not None)
+    yield (b'],"pagination":' + orjson.dumps(pagination, option=JSON_DUMPS_OPTIONS)
+           + b',"timestamp":' + orjson.dumps(utcnow_iso()) + b'}')
+
+    await db_manager.cache_query_result_async(
+        cache_key, {"data": data, "next_cursor": next_cursor}, ttl=SEARCH_CACHE_TTL
+    )
+
+
+async def _stream_conversation_page(first, items, page: int, limit: int) -> AsyncIterator[bytes]:
+    """将对话历史逐条序列化为与 _stream_search_page 相同结构的JSON字节流（对话历史不走搜索缓存）
+
+    first 为调用方预取的首条结果，查询本身的失败在开始发送响应前就已抛出。
+    """
+    yield b'{"status":"success","data":['
+    total = 0
+    last = None
+    item = first
+    while item is not None:
+        yield (b',' if total else b'') + orjson.dumps(item.model_dump(), option=JSON_DUMPS_OPTIONS)
+        total += 1
+        last = item
+        item = await anext(items, None)
+
+    next_cursor = next_page_cursor(last, total, limit, "created_at")
+    pagination = _search_pagination(page, limit, total, next_cursor, with_cursor=True)
+    yield (b'],"pagination":' + orjson.dumps(pagination, option=JSON_DUMPS_OPTIONS)
+           + b',"timestamp":' + orjson.dumps(utcnow_iso()) + b'}')
+
+
 # 知识库查询路由
 @app.get("/api/knowledge/search")
 async def search_knowledge(
         q: Optional[str] = None,
         page: int = 1,
-        limit: int = 20
+        limit: int = 20,
+        before: Optional[datetime] = None,
+        before_id: Optional[int] = None
 ):
-    """搜索知识库"""
-    try:
-        offset = (page - 1) * limit
-        results = data_access.search_knowledge(q, limit, offset)
+    """搜索知识库，传入 next_cursor 中的 before/before_id 时按键集翻页；未命中缓存时边查边流式输出"""
+    cache_key = f"search:knowledge:{q}:{page}:{limit}:{before}:{before_id}"
+    cached = await db_manager.get_cached_result_async(cache_key)
 
-        return {
+    if cached is not None:
+        return json_response({
             "status": "success",
-            "data": [item.dict() for item in results],
-            "pagination": {
-                "page": page,
-                "limit": limit,
-                "total": len(results),
-                "has_more": len(results) == limit
-            },
-            "timestamp": datetime.utcnow().isoformat()
-        }
-
-    except Exception as e:
-        logger.error(f"搜索知识库失败: {e}")
-        raise HTTPException(status_code=500, detail=f"搜索知识库失败: {str(e)}")
+            "data": cached["data"],
+            "pagination": _search_pagination(
+                page, limit, len(cached["data"]), cached["next_cursor"], with_cursor=True
+            ),
+            "timestamp": utcnow_iso()
+        })
+
+    offset = (page - 1) * limit
+    items = data_access.iter_knowledge(q, limit, offset, before, before_id)
+    first = await anext(items, None)
+    return StreamingResponse(
+        _stream_search_page(first, items, page, limit, cache_key, "updated_at"),
+        media_type="application/json"
+    )
 
 
 @app.get("/api/qa/search")
@@ -832,54 +1107,43 @@ async def search_qa_pairs(
         page: int = 1,
         limit: int = 20
 ):
-    """搜索问答对"""
-    try:
-        offset = (page - 1) * limit
-        results = data_access.search_qa_pairs(q, difficulty, subject, limit, offset)
+    """搜索问答对，未命中缓存时边查边流式输出"""
+    cache_key = f"search:qa:{q}:{difficulty}:{subject}:{page}:{limit}"
+    cached = await db_manager.get_cached_result_async(cache_key)
 
-        return {
+    if cached is not None:
+        return json_response({
             "status": "success",
-            "data": [item.dict() for item in results],
-            "pagination": {
-                "page": page,
-                "limit": limit,
-                "total": len(results),
-                "has_more": len(results) == limit
-            },
-            "timestamp": datetime.utcnow().isoformat()
-        }
-
-    except Exception as e:
-        logger.error(f"搜索问答对失败: {e}")
-        raise HTTPException(status_code=500, detail=f"搜索问答对失败: {str(e)}")
+            "data": cached["data"],
+            "pagination": _search_pagination(page, limit, len(cached["data"])),
+            "timestamp": utcnow_iso()
+        })
+
+    offset = (page - 1) * limit
+    items = data_access.iter_qa_pairs(q, difficulty, subject, limit, offset)
+    first = await anext(items, None)
+    return StreamingResponse(
+        _stream_search_page(first, items, page, limit, cache_key),
+        media_type="application/json"
+    )
 
 
 @app.get("/api/conversation/user/{user_id}")
 async def get_user_conversations(
         user_id: str,
         page: int = 1,
-        limit: int = 50
+        limit: int = 50,
+        before: Optional[datetime] = None,
+        before_id: Optional[int] = None
 ):
-    """获取用户对话历史"""
-    try:
-        offset = (page - 1) * limit
-        conversations = data_access.get_user_conversations(user_id, limit, offset)
-
-        return {
-            "status": "success",
-            "data": [conv.dict() for conv in conversations],
-            "pagination": {
-                "page": page,
-                "limit": limit,
-                "total": len(conversations),
-                "has_more": len(conversations) == limit
-            },
-            "timestamp": datetime.utcnow().isoformat()
-        }
-
-    except Exception as e:
-        logger.error(f"获取用户对话历史失败: {e}")
-        raise HTTPException(status_code=500, detail=f"获取用户对话历史失败: {str(e)}")
+    """获取用户对话历史，传入 next_cursor 中的 before/before_id 时按键集翻页；边查边流式输出"""
+    offset = (page - 1) * limit
+    items = data_access.iter_user_conversations(user_id, limit, offset, before, before_id)
+    first = await anext(items, None)
+    return StreamingResponse(
+        _stream_conversation_page(first, items, page, limit),
+        media_type="application/json"
+    )
 
 
 # 系统管理路由
@@ -887,64 +1151,14 @@ async def get_user_conversations(
 async def admin_startup_check():
     """管理员启动检查"""
     try:
-        # 检查所有服务
-        checks = {}
-
-        # MySQL检查
-        try:
-            with db_manager.mysql_session() as session:
-                result = session.execute("SELECT VERSION()").fetchone()
-                checks["mysql"] = {
-                    "status": "connected",
-                    "version": str(result[0]) if result else "unknown"
-                }
-        except Exception as e:
-            checks["mysql"] = {"status": "error", "error": str(e)}
-
-        # Neo4j检查
-        try:
-            with db_manager.neo4j_session() as session:
-                result = session.run("CALL dbms.components() YIELD versions RETURN versions[0] as version").single()
-                checks["neo4j"] = {
-                    "status": "connected",
-                    "version": result["version"] if result else "unknown"
-                }
-        except Exception as e:
-            checks["neo4j"] = {"status": "error", "error": str(e)}
-
-        # Redis检查
-        if db_manager._redis_client:
-            try:
-                info = db_manager._redis_client.info()
-                checks["redis"] = {
-                    "status": "connected",
-                    "version": info.get("redis_version", "unknown")
-                }
-            except Exception as e:
-                checks["redis"] = {"status": "error", "error": str(e)}
-        else:
-            checks["redis"] = {"status": "not_configured"}
-
-        # LLM服务检查
-        if llm_service:
-            try:
-                response = llm_service.chat_completion([
-                    {"role": "system", "content": "ping"},
-                    {"role": "user", "content": "pong"}
-                ], max_tokens=5)
-                checks["llm"] = {
-                    "status": "connected",
-                    "response": response[:50] if response else "no_response"
-                }
-            except Exception as e:
-                checks["llm"] = {"status": "error", "error": str(e)}
-        else:
-            checks["llm"] = {"status": "not_initialized"}
+        # 并发检查所有服务
+        checks, llm = await asyncio.gather(db_manager.check_health(), _probe_llm())
+        checks["llm"] = llm
 
         return {
             "status": "completed",
             "checks": checks,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
     except Exception as e:
@@ -952,26 +1166,27 @@ async def admin_startup_check():
         return {
             "status": "error",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
 
 @app.post("/api/admin/reset-cache")
 async def admin_reset_cache():
-    """重置缓存"""
+    """重置缓存，只清理本应用的缓存键"""
     try:
-        if db_manager._redis_client:
-            db_manager._redis_client.flushall()
+        if db_manager._redis_async_client:
+            deleted = await db_manager.reset_cache_async()
             return {
                 "status": "success",
                 "message": "缓存已清空",
-                "timestamp": datetime.utcnow().isoformat()
+                "deleted_keys": deleted,
+                "timestamp": utcnow_iso()
             }
         else:
             return {
                 "status": "success",
                 "message": "缓存未配置，无需清空",
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": utcnow_iso()
             }
     except Exception as e:
         logger.error(f"重置缓存失败: {e}")
@@ -979,43 +1194,44 @@ async def admin_reset_cache():
 
 
 # 监控端点
+def _sample_metrics() -> Dict[str, Any]:
+    """采集随时间变化的系统/进程指标，涉及文件系统与/proc读取，在线程中执行"""
+    memory = psutil.virtual_memory()
+    with _process.oneshot():
+        process_info = {
+            "pid": _process.pid,
+            "name": _PROCESS_NAME,
+            "cpu_percent": _process.cpu_percent(None),
+            "memory_percent": _process.memory_percent(),
+            "threads": _process.num_threads(),
+            "connections": len(_process.connections())
+        }
+
+    return {
+        "system": {
+            **_STATIC_SYSTEM_INFO,
+            "memory_available": memory.available,
+            "disk_usage": psutil.disk_usage('/').percent
+        },
+        "process": process_info
+    }
+
+
 @app.get("/api/monitor/metrics")
 async def get_metrics():
     """获取系统监控指标"""
     try:
-        import psutil
-        import platform
-
-        # 系统信息
-        system_info = {
-            "platform": platform.platform(),
-            "python_version": platform.python_version(),
-            "cpu_count": psutil.cpu_count(),
-            "memory_total": psutil.virtual_memory().total,
-            "memory_available": psutil.virtual_memory().available,
-            "disk_usage": psutil.disk_usage('/').percent
-        }
-
-        # 进程信息
-        process = psutil.Process()
-        process_info = {
-            "pid": process.pid,
-            "name": process.name(),
-            "cpu_percent": process.cpu_percent(),
-            "memory_percent": process.memory_percent(),
-            "threads": process.num_threads(),
-            "connections": len(process.connections())
-        }
-
-        # 数据库连接统计
-        db_stats = data_access.get_database_stats()
+        # 系统/进程指标与数据库连接统计并发获取
+        metrics, db_stats = await asyncio.gather(
+            asyncio.to_thread(_sample_metrics), data_access.get_database_stats()
+        )
 
         return {
             "status": "success",
-            "system": system_info,
-            "process": process_info,
+            "system": metrics["system"],
+            "process": metrics["process"],
             "database": db_stats,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
     except Exception as e:
@@ -1023,7 +1239,7 @@ async def get_metrics():
         return {
             "status": "error",
             "error": str(e),
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": utcnow_iso()
         }
 
 
@@ -1031,13 +1247,18 @@ async def get_metrics():
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 if __name__ == "__main__":
-    # 启动应用
+    # 启动应用：uvloop事件循环 + httptools解析器，非调试模式按CPU核数启动多worker。
+    # 也可用 gunicorn 部署：gunicorn main:app -k uvicorn.workers.UvicornWorker -w $(nproc)
     uvicorn.run(
         "main:app",
-        host=settings.HOST if hasattr(settings, 'HOST') else "0.0.0.0",
+        host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        workers=1 if settings.DEBUG else (settings.WORKERS or os.cpu_count() or 2),
+        loop="uvloop",
+        http="httptools",
+        limit_concurrency=settings.LIMIT_CONCURRENCY,
+        timeout_keep_alive=30,
         log_level="info",
-        access_log=True,
-        workers=1  # 开发环境使用单worker
-    )
\ No newline at end of file
+        access_log=False  # 请求日志由 LogMiddleware 记录
+    )
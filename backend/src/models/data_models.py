@@ -1,5 +1,5 @@
 # backend/src/models/data_models.py
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, TypeAdapter, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -97,4 +97,10 @@ class SearchResponse(BaseModel):
     results: List[Dict[str, Any]]
     total: int
     search_type: str
-    query_time: float
\ No newline at end of file
+    query_time: float
+
+
+# 列表序列化适配器：模块加载时一次性构建序列化器，列表接口直接复用
+knowledge_list_adapter = TypeAdapter(List[KnowledgeBase])
+qa_pair_list_adapter = TypeAdapter(List[QAPairModel])
+conversation_list_adapter = TypeAdapter(List[ConversationRecord])
@@ -0,0 +1,84 @@
+# backend/src/services/conversation_writer.py
+import asyncio
+import logging
+from typing import Optional
+
+from config.settings import settings
+from database.data_access import data_access
+from models.data_models import ConversationRecord
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationWriter:
+    """对话记录批量写入器
+
+    请求处理只把记录放入内存队列即返回，后台任务攒够一批（或等待超时）后一次性写入MySQL。
+    """
+
+    def __init__(self,
+                 batch_size: int = settings.CONVERSATION_BATCH_SIZE,
+                 flush_interval: float = settings.CONVERSATION_FLUSH_INTERVAL,
+                 max_pending: int = settings.CONVERSATION_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动后台写入任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台写入任务，队列中剩余的记录写完后返回"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def submit(self, record: ConversationRecord) -> bool:
+        """提交一条对话记录，队列已满时丢弃并返回 False"""
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"对话记录队列已满，丢弃记录: user_id={record.user_id}")
+            return False
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            record = await self._queue.get()
+            if record is None:
+                break
+
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        try:
+            await data_access.create_conversations_bulk(batch)
+        except Exception as e:
+            logger.error(f"批量写入对话记录失败（{len(batch)} 条）: {e}")
+
+
+# 全局对话记录写入器实例
+conversation_writer = ConversationWriter()
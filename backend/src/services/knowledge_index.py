@@ -0,0 +1,374 @@
+# backend/src/services/knowledge_index.py
+import logging
+import os
+import time
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import faiss
+import numpy as np
+import torch
+from numba import njit, prange
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.util import batch_to_device
+from sqlalchemy import select
+
+from config.settings import settings
+from database.db_manager import db_manager
+from database.mysql_models import TextbookKnowledge
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+EMBEDDING_DIM = 384
+
+# 每批从MySQL读取并编码的知识条数
+INDEX_BATCH_SIZE = 64
+
+# 检索进程检查索引文件是否被worker更新的最小间隔（秒）
+INDEX_REFRESH_INTERVAL = 5.0
+
+# HNSW图每个节点的邻居数，以及建图/查询时的候选队列长度（efSearch 不随索引文件保存，加载后需重新设置）
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# 查询文本分词结果的缓存条数（子问题、语义缓存的问题与提示词等短文本重复率高）
+TOKENIZE_CACHE_SIZE = 8192
+
+# 查询编码器启动时自检用的文本：短文本、长短不一需补齐的批次、首尾带空白的文本
+QUERY_ENCODER_PROBES = (
+    ["光合作用"],
+    ["DNA", "有丝分裂分为前期、中期、后期和末期", "What is photosynthesis?"],
+    ["  细胞膜的主要成分\n", "\tMitochondria produce ATP  "],
+)
+# 自检允许与 SentenceTransformer.encode 结果的最大逐元素误差
+QUERY_ENCODER_TOLERANCE = 1e-5
+
+# 知识向量按维度标量量化为int8存储（每条 384 字节，FP32 的 1/4）。各维的量化区间取自实际向量
+# （归一化后各维多集中在 ±0.1 以内，按 [-1, 1] 均匀量化会浪费大部分码值），训练后随索引保存，增量写入无需重新训练
+SQ_QUANTIZER_TYPE = faiss.ScalarQuantizer.QT_8bit
+# 索引达到该条数后才训练量化区间并转为int8存储，此前以FP32的HNSW索引提供检索
+# （量化区间训练后不再更新，用过少的向量训练会使各维区间退化，之后写入的向量编码几乎相同）
+SQ_TRAIN_SIZE = 4096
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model() -> SentenceTransformer:
+    """进程内共用的向量模型，检索、语义缓存与索引构建共享同一份权重"""
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+
+class QueryEncoder:
+    """查询文本编码器：分词结果按文本缓存，重复出现的文本编码时只做前向计算
+
+    缓存的是未截断的分词结果，可同时用于判断文本是否超出模型最大输入长度；
+    超长文本仍交给 SentenceTransformer.encode 截断后编码。
+    构造时用几组文本与 SentenceTransformer.encode 对比，结果不一致（模型结构或库版本不兼容）时整体退回 encode。
+    """
+
+    def __init__(self, model: SentenceTransformer, cache_size: int = TOKENIZE_CACHE_SIZE):
+        self.model = model
+        self.model.eval()
+        self._tokenize = lru_cache(maxsize=cache_size)(self._tokenize_uncached)
+        self._fast_path = self._verify()
+
+    def _model_encode(self, texts: List[str]) -> np.ndarray:
+        return np.ascontiguousarray(self.model.encode(
+            texts, batch_size=len(texts), convert_to_numpy=True, normalize_embeddings=True
+        ), dtype=np.float32)
+
+    def _verify(self) -> bool:
+        """确认缓存分词后的前向计算与 SentenceTransformer.encode 的结果一致"""
+        try:
+            for texts in QUERY_ENCODER_PROBES:
+                diff = np.abs(self._forward(texts) - self._model_encode(texts)).max()
+                if diff > QUERY_ENCODER_TOLERANCE:
+                    logger.warning(f"查询编码结果与模型encode不一致(误差 {diff:.2e})，改用模型encode")
+                    return False
+        except Exception as e:
+            logger.warning(f"查询编码器自检失败，改用模型encode: {e}")
+            return False
+        return True
+
+    def _tokenize_uncached(self, text: str) -> Tuple[Tuple[str, Tuple[int, ...]], ...]:
+        # 以元组保存，避免缓存内容被修改
+        encoding = self.model.tokenizer(text)
+        return tuple((name, tuple(values)) for name, values in encoding.items())
+
+    def _features(self, text: str) -> Dict[str, List[int]]:
+        # 与 encode 内部一致：分词前去掉首尾空白；补齐（pad）时会拼接列表，这里返回列表副本
+        return {name: list(values) for name, values in self._tokenize(text.strip())}
+
+    def token_count(self, text: str) -> int:
+        """文本分词后的token数（含特殊token，不截断）"""
+        return len(self._features(text)["input_ids"])
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """批量编码为归一化向量（float32，n x dim），一次前向计算完成整批"""
+        if not self._fast_path:
+            return self._model_encode(texts)
+        return self._forward(texts)
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        features = [self._features(text) for text in texts]
+        if any(len(f["input_ids"]) > self.model.max_seq_length for f in features):
+            return self._model_encode(texts)
+
+        batch = batch_to_device(self.model.tokenizer.pad(features, return_tensors="pt"), self.model.device)
+        with torch.no_grad():
+            embeddings = self.model.forward(batch)["sentence_embedding"]
+            embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+        return np.ascontiguousarray(embeddings.cpu().numpy(), dtype=np.float32)
+
+
+@lru_cache(maxsize=None)
+def get_query_encoder(model: SentenceTransformer) -> QueryEncoder:
+    """每个向量模型共用一个查询编码器，检索与各语义缓存共享分词缓存"""
+    return QueryEncoder(model)
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def l2norm(x):
+    """按行原地L2归一化，归一化后内积即余弦相似度"""
+    for i in prange(x.shape[0]):
+        norm = 0.0
+        for j in range(x.shape[1]):
+            norm += x[i, j] * x[i, j]
+        if norm > 0.0:
+            inv = 1.0 / np.sqrt(norm)
+            for j in range(x.shape[1]):
+                x[i, j] *= inv
+    return x
+
+
+def new_hnsw_index(dim: int = EMBEDDING_DIM) -> faiss.IndexHNSWFlat:
+    """HNSW近似最近邻索引，内积度量，向量需先归一化（内积即余弦相似度）"""
+    index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def new_sq_hnsw_index(dim: int = EMBEDDING_DIM) -> faiss.IndexHNSWSQ:
+    """int8标量量化存储的HNSW索引，内积度量；写入向量前需先用实际向量训练量化区间"""
+    index = faiss.IndexHNSWSQ(dim, SQ_QUANTIZER_TYPE, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def _is_sq_index(index: faiss.Index) -> bool:
+    """是否为按维度int8量化的HNSW索引（当前知识索引格式）"""
+    if not isinstance(index, faiss.IndexHNSWSQ):
+        return False
+    return faiss.downcast_index(index.storage).sq.qtype == SQ_QUANTIZER_TYPE
+
+
+def tune_loaded_index(index: faiss.Index) -> bool:
+    """为从文件加载的索引设置查询参数，返回其是否为HNSW索引（IDMap包装时检查内层索引）"""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if not isinstance(inner, faiss.IndexHNSW):
+        return False
+    inner.hnsw.efSearch = HNSW_EF_SEARCH
+    return True
+
+
+class KnowledgeIndex:
+    """知识库向量索引，向量按知识ID映射，由后台worker增量维护并原子落盘"""
+
+    def __init__(self, index_path: str = settings.FAISS_INDEX_PATH):
+        self.index_path = index_path
+        self._index = None
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+
+    @property
+    def index(self):
+        if self._index is None:
+            if os.path.exists(self.index_path):
+                self._load()
+            else:
+                self._index = faiss.IndexIDMap2(new_hnsw_index())
+        return self._index
+
+    @property
+    def model(self) -> SentenceTransformer:
+        return get_embedding_model()
+
+    def _load(self):
+        self._loaded_mtime = os.stat(self.index_path).st_mtime_ns
+        self._index = faiss.read_index(self.index_path)
+        tune_loaded_index(self._index)
+        logger.info(f"加载知识向量索引: {self.index_path}, 共 {self._index.ntotal} 条")
+
+    def _migrate_to_hnsw(self) -> bool:
+        """旧版索引转为HNSW索引，条数达到 SQ_TRAIN_SIZE 时转为按维度int8量化存储
+
+        FP32索引（IndexFlatIP / IndexHNSWFlat）沿用已存的向量与ID，无需重新编码；
+        按[-1, 1]均匀量化的索引存的向量精度已损失，清空后由 sync_from_db 从MySQL重新编码全部知识。
+        """
+        inner = faiss.downcast_index(self.index.index)
+        if _is_sq_index(inner):
+            return False
+
+        if isinstance(inner, faiss.IndexHNSWSQ):
+            self._index = faiss.IndexIDMap2(new_hnsw_index())
+            logger.info("知识向量索引量化方式已变更，将重新编码全部知识")
+            return True
+
+        if isinstance(inner, faiss.IndexHNSWFlat):
+            return self._quantize_if_ready()
+
+        self._rebuild(quantize=inner.ntotal >= SQ_TRAIN_SIZE)
+        logger.info(f"知识向量索引已转换为HNSW索引, 共 {self.index.ntotal} 条")
+        return True
+
+    def _rebuild(self, quantize: bool):
+        """用当前索引中的向量与ID重建索引；quantize 时以全部向量训练int8量化区间"""
+        inner = faiss.downcast_index(self.index.index)
+        vectors = inner.reconstruct_n(0, inner.ntotal)
+        ids = faiss.vector_to_array(self.index.id_map)
+
+        index = faiss.IndexIDMap2(new_sq_hnsw_index() if quantize else new_hnsw_index())
+        if quantize:
+            index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        self._index = index
+
+    def _quantize_if_ready(self) -> bool:
+        """FP32索引条数达到 SQ_TRAIN_SIZE 后，用已有的全部向量训练量化区间并转为int8存储"""
+        inner = faiss.downcast_index(self.index.index)
+        if _is_sq_index(inner) or inner.ntotal < SQ_TRAIN_SIZE:
+            return False
+
+        self._rebuild(quantize=True)
+        logger.info(f"知识向量索引已转换为int8量化的HNSW索引, 共 {self.index.ntotal} 条")
+        return True
+
+    def refresh(self):
+        """索引文件被worker替换后重新加载（只读方使用，按修改时间判断，限制检查频率）"""
+        now = time.monotonic()
+        if now - self._checked_at < INDEX_REFRESH_INTERVAL:
+            return
+        self._checked_at = now
+
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._loaded_mtime:
+            self._load()
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """按内积（归一化向量即余弦相似度）检索，返回 (相似度, 知识ID)，不足k条时ID为-1"""
+        self.refresh()
+        return self.index.search(vectors, k)
+
+    def similarity(self, vector: np.ndarray, ids: List[int]) -> List[float]:
+        """查询向量与指定知识向量的余弦相似度，未索引的ID记为0"""
+        index = self.index
+        scores = []
+        for knowledge_id in ids:
+            try:
+                scores.append(float(np.dot(index.reconstruct(knowledge_id), vector)))
+            except RuntimeError:
+                scores.append(0.0)
+        return scores
+
+    def max_indexed_id(self) -> int:
+        """已索引的最大知识ID"""
+        if self.index.ntotal == 0:
+            return 0
+        return int(faiss.vector_to_array(self.index.id_map).max())
+
+    def add(self, ids: List[int], texts: List[str]):
+        """批量编码文本并按知识ID写入索引"""
+        vectors = np.ascontiguousarray(
+            self.model.encode(texts, batch_size=INDEX_BATCH_SIZE, convert_to_numpy=True),
+            dtype=np.float32
+        )
+        vectors = l2norm(vectors)
+        self.index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+        self._quantize_if_ready()
+
+    def remove(self, ids: List[int]) -> int:
+        """从索引中删除指定知识ID的向量，返回删除条数
+
+        HNSW图不支持 remove_ids，这里用保留下来的向量重建图；int8索引沿用已训练的量化区间，
+        重建前后向量编码不变。
+        """
+        index = self.index
+        if index.ntotal == 0:
+            return 0
+
+        id_map = faiss.vector_to_array(index.id_map)
+        keep = ~np.isin(id_map, np.asarray(ids, dtype=np.int64))
+        removed = int(len(id_map) - keep.sum())
+        if not removed:
+            return 0
+
+        inner = faiss.downcast_index(index.index)
+        vectors = inner.reconstruct_n(0, inner.ntotal)
+        rebuilt = faiss.clone_index(inner)
+        rebuilt.reset()
+        self._index = faiss.IndexIDMap2(rebuilt)
+        self._index.add_with_ids(vectors[keep], id_map[keep])
+        return removed
+
+    def reindex(self, knowledge_id: int) -> bool:
+        """知识被修改或删除后更新其向量：先删除旧向量，记录仍存在则重新编码写入
+
+        尚未索引的新记录（ID大于已索引最大ID）留给 sync_from_db 按顺序写入，
+        避免越过中间未索引的记录。返回索引是否有变化。
+        """
+        migrated = self._migrate_to_hnsw()
+        last_id = self.max_indexed_id()
+        changed = self.remove([knowledge_id]) > 0
+
+        if knowledge_id <= last_id:
+            with db_manager.mysql_session() as session:
+                content = session.execute(
+                    select(TextbookKnowledge.content)
+                    .where(TextbookKnowledge.id == knowledge_id)
+                ).scalar_one_or_none()
+            if content is not None:
+                self.add([knowledge_id], [content])
+                changed = True
+
+        if changed or migrated:
+            self.save()
+        return changed
+
+    def save(self):
+        """先写临时文件再替换，避免读取方加载到写了一半的索引"""
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        faiss.write_index(self.index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+
+    def sync_from_db(self) -> int:
+        """将ID大于已索引最大ID的知识记录增量写入索引，返回新索引条数"""
+        migrated = self._migrate_to_hnsw()
+        last_id = self.max_indexed_id()
+        indexed = 0
+
+        while True:
+            with db_manager.mysql_session() as session:
+                rows = session.execute(
+                    select(TextbookKnowledge.id, TextbookKnowledge.content)
+                    .where(TextbookKnowledge.id > last_id)
+                    .order_by(TextbookKnowledge.id)
+                    .limit(INDEX_BATCH_SIZE)
+                ).all()
+
+            if not rows:
+                break
+
+            self.add([row.id for row in rows], [row.content for row in rows])
+            last_id = rows[-1].id
+            indexed += len(rows)
+
+        if indexed or migrated:
+            self.save()
+        return indexed
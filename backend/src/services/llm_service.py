@@ -1,14 +1,56 @@
 # backend/src/services/llm_service.py
 import requests
-import json
-from typing import List, Dict, Any
+import logging
+import re
+import threading
+from functools import cached_property
+from typing import List, Dict, Any, Optional
+
+import aiohttp
+import orjson
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from config.settings import settings
 
+# 单次LLM请求超时（秒）
+LLM_REQUEST_TIMEOUT = 30
+# 到LLM服务的连接池大小（同步调用来自线程池，异步调用共用一个连接器）
+LLM_POOL_SIZE = 32
+# 建立连接失败时的重试次数（POST 请求本身不重试，避免重复计费）
+LLM_CONNECT_RETRIES = 3
+
+# 从LLM回复中截取JSON主体（兼容 ```json 代码块包裹或前后附带说明文字）
+_JSON_RE = re.compile(r'(\[.*\]|\{.*\})', re.DOTALL)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_json_response(response: Optional[str]) -> Any:
+    """解析LLM返回的JSON内容，解析失败时记录日志并返回 None"""
+    if not response:
+        return None
+    match = _JSON_RE.search(response)
+    if match is None:
+        logger.warning(f"LLM回复中未找到JSON: {response[:200]!r}")
+        return None
+    try:
+        return orjson.loads(match.group(1))
+    except orjson.JSONDecodeError as e:
+        logger.warning(f"LLM回复JSON解析失败: {e}; 内容: {response[:200]!r}")
+        return None
+
 
 class LLMService:
     """大语言模型服务"""
 
-    def __init__(self):
+    def __init__(self, prompt_cache=None):
+        # 可选的提示词语义缓存（services.semantic_cache.PromptCache）
+        self.prompt_cache = prompt_cache
+        # 子问题分解结果缓存：(问题, 上下文) -> 子问题列表，同一问题在各检索路径间只分解一次
+        self._sub_question_cache = TTLCache(maxsize=settings.LLM_CACHE_SIZE, ttl=settings.LLM_CACHE_TTL)
+        self._sub_question_lock = threading.Lock()
         self.api_key = settings.DEEPSEEK_API_KEY
         self.api_url = settings.DEEPSEEK_API_URL
         self.headers = {
@@ -16,31 +58,111 @@ class LLMService:
             "Content-Type": "application/json"
         }
 
-    def chat_completion(self, messages: List[Dict], temperature=0.7, max_tokens=2000):
-        """调用DeepSeek API"""
-        payload = {
+    @cached_property
+    def _session(self) -> requests.Session:
+        """同步调用共用的HTTP会话，保持长连接，避免每次请求重新进行TCP/TLS握手"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=LLM_POOL_SIZE,
+            max_retries=Retry(total=LLM_CONNECT_RETRIES, read=0, status=0, backoff_factor=0.3)
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _build_payload(self, messages: List[Dict], temperature: float, max_tokens: int) -> Dict[str, Any]:
+        return {
             "model": "deepseek-chat",
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens
         }
 
+    def chat_completion(self, messages: List[Dict], temperature=0.7, max_tokens=2000,
+                        no_cache: bool = False, namespace: Optional[str] = None,
+                        template: Optional[str] = None, semantic_text: Optional[str] = None):
+        """调用DeepSeek API
+
+        配置了提示词缓存时，相同的提示词直接返回缓存的回答；
+        no_cache=True 跳过缓存（如连通性探测），namespace 隔离不同用户的缓存条目。
+        传入 semantic_text（提示词中随输入变化的部分）时，还按其向量相似度匹配同一 template 下的近似请求。
+        """
+        cache_key = None
+        if self.prompt_cache is not None and not no_cache:
+            cached, cache_key = self.prompt_cache.get(
+                messages, (namespace, template, temperature, max_tokens), semantic_text
+            )
+            if cached is not None:
+                return cached
+
+        response = self._request_completion(messages, temperature, max_tokens)
+        if response and cache_key is not None:
+            self.prompt_cache.put(cache_key, response)
+        return response
+
+    def _request_completion(self, messages: List[Dict], temperature, max_tokens):
+        payload = self._build_payload(messages, temperature, max_tokens)
+
         try:
-            response = requests.post(
+            response = self._session.post(
                 self.api_url,
-                headers=self.headers,
                 json=payload,
-                timeout=30
+                timeout=LLM_REQUEST_TIMEOUT
             )
             response.raise_for_status()
             result = response.json()
             return result["choices"][0]["message"]["content"]
         except Exception as e:
-            print(f"LLM API Error: {e}")
+            logger.error(f"LLM API调用失败: {e}")
             return None
 
+    @cached_property
+    def _async_session(self) -> aiohttp.ClientSession:
+        """异步调用共用的HTTP会话（首次使用时在当前事件循环中创建，复用连接池）"""
+        return aiohttp.ClientSession(
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=LLM_REQUEST_TIMEOUT),
+            connector=aiohttp.TCPConnector(limit=LLM_POOL_SIZE, limit_per_host=LLM_POOL_SIZE)
+        )
+
+    async def achat_completion(self, messages: List[Dict], temperature=0.7, max_tokens=2000):
+        """异步调用DeepSeek API，多个请求可在同一事件循环中并发进行"""
+        payload = self._build_payload(messages, temperature, max_tokens)
+
+        try:
+            async with self._async_session.post(self.api_url, json=payload) as response:
+                response.raise_for_status()
+                result = await response.json()
+            return result["choices"][0]["message"]["content"]
+        except Exception as e:
+            logger.error(f"LLM API调用失败: {e}")
+            return None
+
+    async def aclose(self):
+        """关闭HTTP会话"""
+        session = self.__dict__.pop("_async_session", None)
+        if session is not None:
+            await session.close()
+        sync_session = self.__dict__.pop("_session", None)
+        if sync_session is not None:
+            sync_session.close()
+
     def generate_sub_questions(self, question: str, context: str = None) -> List[str]:
-        """生成子问题"""
+        """生成子问题，相同问题在缓存有效期内直接返回上次的分解结果"""
+        cache_key = (question, context)
+        with self._sub_question_lock:
+            cached = self._sub_question_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
+        sub_questions = self._decompose_question(question, context)
+        with self._sub_question_lock:
+            self._sub_question_cache[cache_key] = tuple(sub_questions)
+        return sub_questions
+
+    def _decompose_question(self, question: str, context: str = None) -> List[str]:
         prompt = f"""
         根据以下主问题，生成3-5个相关的子问题：
         主问题：{question}
@@ -54,16 +176,18 @@ class LLMService:
             {"role": "user", "content": prompt}
         ]
 
-        response = self.chat_completion(messages)
-        try:
-            return json.loads(response)
-        except:
-            # 如果JSON解析失败，尝试提取问题
-            questions = []
-            for line in response.split('\n'):
-                if '?' in line and len(line.strip()) > 10:
-                    questions.append(line.strip().strip('"').strip("'"))
-            return questions or [question]
+        semantic_text = f"{question}\n{context}" if context else question
+        response = self.chat_completion(messages, template="decompose_question", semantic_text=semantic_text)
+        parsed = parse_json_response(response)
+        if isinstance(parsed, list):
+            return parsed
+
+        # 如果JSON解析失败，尝试提取问题
+        questions = []
+        for line in (response or "").split('\n'):
+            if '?' in line and len(line.strip()) > 10:
+                questions.append(line.strip().strip('"').strip("'"))
+        return questions or [question]
 
     def extract_entities_relations(self, text: str) -> Dict[str, Any]:
         """提取实体和关系"""
@@ -90,8 +214,8 @@ class LLMService:
             {"role": "user", "content": prompt}
         ]
 
-        response = self.chat_completion(messages)
-        try:
-            return json.loads(response)
-        except:
-            return {"entities": [], "relations": []}
\ No newline at end of file
+        response = self.chat_completion(messages, template="extract_entities_relations", semantic_text=text)
+        parsed = parse_json_response(response)
+        if isinstance(parsed, dict):
+            return parsed
+        return {"entities": [], "relations": []}
\ No newline at end of file
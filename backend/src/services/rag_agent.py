@@ -1,40 +1,88 @@
 # backend/src/services/rag_agent.py
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
 import yaml
+from config.settings import settings
 from services.llm_service import LLMService
 from services.retriever_service import RetrieverService
 from database.neo4j_client import Neo4jClient
 
+try:
+    # 优先使用libyaml实现的C版本序列化器，未编译libyaml时回退到纯Python版本
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+
+logger = logging.getLogger(__name__)
+
 
 class RAGAgent:
     """RAG智能体"""
 
-    def __init__(self):
-        self.llm_service = LLMService()
-        self.retriever = RetrieverService()
-        self.neo4j_client = Neo4jClient()
+    # 上下文与回答提示词模板，调用时按字段 format 填充
+    _CONTEXT_TEMPLATE = """
+        # 模型记忆
+        {memory_yaml}
 
-    def process_query(self, query: str, user_id: str = None) -> Dict[str, Any]:
-        """处理用户查询"""
-        # 1. 检索阶段
-        retrieval_results = self.retriever.retrieve(query)
+        # 检索到的知识
+        {knowledge_text}
 
-        # 2. 格式化记忆为YAML
-        memory_yaml = self._format_memory_to_yaml(retrieval_results["memory"])
+        # 当前状态
+        用户ID: {user_id}
+        当前查询: {current_query}
+        """
 
-        # 3. 组合知识
-        combined_knowledge = self._combine_knowledge(
-            memory_yaml,
-            retrieval_results["knowledge"],
-            {"current_query": query, "user_id": user_id}
-        )
+    _ANSWER_PROMPT = """
+        基于以下上下文信息，回答用户的问题：
 
-        # 4. 推理阶段
-        response = self._generate_response(query, combined_knowledge)
+        上下文：
+        {context}
+
+        用户问题：{query}
+
+        要求：
+        1. 基于上下文提供准确、详细的回答
+        2. 如果上下文信息不足，请说明哪些方面需要更多信息
+        3. 回答要结构清晰，易于理解
+        4. 如果涉及算法，可以提供伪代码或关键步骤
+        """
+
+    def __init__(self,
+                 llm_service: LLMService = None,
+                 retriever: RetrieverService = None,
+                 neo4j_client: Neo4jClient = None):
+        self.llm_service = llm_service or LLMService()
+        self.retriever = retriever or RetrieverService()
+        self.neo4j_client = neo4j_client or Neo4jClient()
+        # 记忆更新队列：请求只入队即返回，由后台任务逐个执行实体抽取与Neo4j写入
+        self._update_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.MEMORY_UPDATE_QUEUE_SIZE)
+        self._update_task: Optional[asyncio.Task] = None
+
+    def start_memory_worker(self):
+        """启动后台记忆更新任务（需在事件循环中调用）"""
+        if self._update_task is None:
+            self._update_task = asyncio.create_task(self._update_worker())
+
+    async def stop_memory_worker(self):
+        """停止后台记忆更新任务，队列中剩余的更新处理完后返回"""
+        if self._update_task is None:
+            return
+        await self._update_queue.put(None)
+        await self._update_task
+        self._update_task = None
+
+    async def process_query(self, query: str, user_id: str = None) -> Dict[str, Any]:
+        """处理用户查询"""
+        # 1. 检索阶段：各子问题的MySQL/Neo4j检索并发执行
+        retrieval_results = await self.retriever.aretrieve(query)
+
+        # 2-4. 组合上下文并生成回答（同步LLM调用，放到线程中执行）
+        response = await asyncio.to_thread(self._answer_query, query, user_id, retrieval_results)
 
-        # 5. 更新阶段
+        # 5. 更新阶段：实体抽取（一次LLM调用）与Neo4j写入不影响本次回答，入队后由后台任务执行
         if user_id:
-            self._update_memory(query, response, retrieval_results, user_id)
+            self._enqueue_memory_update(query, response, retrieval_results, user_id)
 
         return {
             "response": response,
@@ -45,6 +93,39 @@ class RAGAgent:
             }
         }
 
+    def _enqueue_memory_update(self, query: str, response: str, retrieval_results: Dict, user_id: str):
+        self.start_memory_worker()
+        try:
+            self._update_queue.put_nowait((query, response, retrieval_results, user_id))
+        except asyncio.QueueFull:
+            logger.warning(f"记忆更新队列已满，丢弃本次更新: user_id={user_id}")
+
+    async def _update_worker(self):
+        while True:
+            job = await self._update_queue.get()
+            if job is None:
+                break
+            try:
+                # 实体抽取与Neo4j写入均为同步调用，放到线程中执行
+                await asyncio.to_thread(self._update_memory, *job)
+            except Exception as e:
+                logger.error(f"更新记忆失败: user_id={job[3]}, {e}")
+
+    def _answer_query(self, query: str, user_id: str, retrieval_results: Dict[str, Any]) -> str:
+        """基于检索结果组合上下文并生成回答"""
+        # 2. 格式化记忆为YAML
+        memory_yaml = self._format_memory_to_yaml(retrieval_results["memory"])
+
+        # 3. 组合知识
+        combined_knowledge = self._combine_knowledge(
+            memory_yaml,
+            retrieval_results["knowledge"],
+            {"current_query": query, "user_id": user_id}
+        )
+
+        # 4. 推理阶段
+        return self._generate_response(query, combined_knowledge, user_id)
+
     def _format_memory_to_yaml(self, memories: List[Dict]) -> str:
         """将记忆格式化为YAML"""
         memory_data = []
@@ -56,7 +137,7 @@ class RAGAgent:
                 "score": mem.get("score", 0)
             })
 
-        return yaml.dump({"memories": memory_data}, allow_unicode=True)
+        return yaml.dump({"memories": memory_data}, Dumper=YamlDumper, allow_unicode=True)
 
     def _combine_knowledge(self, memory_yaml: str, knowledge: List[Dict], state: Dict) -> str:
         """组合知识"""
@@ -66,66 +147,52 @@ class RAGAgent:
             for item in knowledge
         ])
 
-        combined = f"""
-        # 模型记忆
-        {memory_yaml}
-
-        # 检索到的知识
-        {knowledge_text}
-
-        # 当前状态
-        用户ID: {state.get('user_id', 'anonymous')}
-        当前查询: {state.get('current_query', '')}
-        """
-
-        return combined
+        return self._CONTEXT_TEMPLATE.format(
+            memory_yaml=memory_yaml,
+            knowledge_text=knowledge_text,
+            user_id=state.get('user_id', 'anonymous'),
+            current_query=state.get('current_query', '')
+        )
 
-    def _generate_response(self, query: str, context: str) -> str:
+    def _generate_response(self, query: str, context: str, user_id: str = None) -> str:
         """生成回答"""
-        prompt = f"""
-        基于以下上下文信息，回答用户的问题：
-
-        上下文：
-        {context}
-
-        用户问题：{query}
-
-        要求：
-        1. 基于上下文提供准确、详细的回答
-        2. 如果上下文信息不足，请说明哪些方面需要更多信息
-        3. 回答要结构清晰，易于理解
-        4. 如果涉及算法，可以提供伪代码或关键步骤
-        """
+        prompt = self._ANSWER_PROMPT.format(context=context, query=query)
 
         messages = [
             {"role": "system", "content": "你是一个专业的技术教学助手，擅长解释算法和技术概念。"},
             {"role": "user", "content": prompt}
         ]
 
-        return self.llm_service.chat_completion(messages)
+        # 上下文含用户记忆，缓存按用户隔离
+        return self.llm_service.chat_completion(messages, namespace=user_id)
 
     def _update_memory(self, query: str, response: str, retrieval_results: Dict, user_id: str):
         """更新模型记忆"""
         # 提取实体和关系
         extraction_result = self.llm_service.extract_entities_relations(f"{query}\n{response}")
 
-        # 更新到Neo4j
-        with self.neo4j_client.driver.session() as session:
-            # 添加实体
-            for entity in extraction_result.get("entities", []):
-                self.neo4j_client.create_memory_node(
-                    session,
-                    entity["entity"],
-                    entity["type"],
-                    {"user_id": user_id, "source_query": query}
-                )
-
-            # 添加关系
-            for relation in extraction_result.get("relations", []):
-                self.neo4j_client.create_relationship(
-                    session,
-                    relation["subject"],
-                    relation["object"],
-                    relation["relation"],
-                    {"user_id": user_id, "timestamp": "2026-02-14"}
-                )
\ No newline at end of file
+        # 更新到Neo4j：实体与关系各用一条UNWIND语句批量写入
+        node_props = {"user_id": user_id, "source_query": query}
+        nodes = [
+            {"entity": entity["entity"], "type": entity["type"], "properties": node_props}
+            for entity in extraction_result.get("entities", [])
+        ]
+        relation_props = {"user_id": user_id, "timestamp": "2026-02-14"}
+        relations = [
+            {
+                "entity1": relation["subject"],
+                "entity2": relation["object"],
+                "relation_type": relation["relation"],
+                "properties": relation_props
+            }
+            for relation in extraction_result.get("relations", [])
+        ]
+
+        if not nodes and not relations:
+            return
+
+        with self.neo4j_client.session() as session:
+            if nodes:
+                self.neo4j_client.create_memory_nodes(session, nodes)
+            if relations:
+                self.neo4j_client.create_relationships(session, relations)
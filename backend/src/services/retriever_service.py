@@ -1,76 +1,294 @@
 # backend/src/services/retriever_service.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
+import logging
+import os
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+import xxhash
+from sqlalchemy import select, desc
+from sqlalchemy.dialects.mysql import match
+from config.settings import settings
+from database.db_manager import db_manager
 from database.mysql_models import SessionLocal, TextbookKnowledge, QAPair
 from database.neo4j_client import Neo4jClient
+from services.knowledge_index import (
+    INDEX_BATCH_SIZE, KnowledgeIndex, get_embedding_model, get_query_encoder,
+    new_hnsw_index, tune_loaded_index
+)
 from services.llm_service import LLMService
+from services.semantic_cache import PromptCache
+
+logger = logging.getLogger(__name__)
+
+# 混合检索：向量相似度与全文相关度的权重，以及每路召回的候选数倍数（相对 top_k）
+HYBRID_VECTOR_WEIGHT = 0.6
+HYBRID_FULLTEXT_WEIGHT = 0.4
+HYBRID_CANDIDATE_FACTOR = 2
+
+
+async def _fetch_rows(stmt) -> list:
+    async with db_manager.async_session() as session:
+        return (await session.execute(stmt)).all()
+
+
+def _dedup_key(item: Dict):
+    """检索结果的去重键：知识与问答对按 (类型, 数据库ID)，记忆按实体名"""
+    return (item["type"], item["id"]) if "id" in item else item.get("entity")
 
 
 class RetrieverService:
     """检索服务"""
 
     def __init__(self):
-        self.embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        self.llm_service = LLMService()
+        self.embedding_model = get_embedding_model()
+        # LLM调用复用同一向量模型做提示词语义缓存（子问题生成等短提示词重复率高）
+        self.llm_service = LLMService(prompt_cache=PromptCache(self.embedding_model))
         self.neo4j_client = Neo4jClient()
+        # 知识向量索引由后台worker维护并落盘，这里只读加载
+        self.knowledge_index = KnowledgeIndex()
 
-        # 初始化FAISS索引
+        # 初始化FAISS索引：文本按列存放，索引中的ID即 text_contents 中的行号
         self.text_index = None
-        self.text_data = []
+        self.text_contents = pa.array([], type=pa.string())
+        self._text_digests = set()
+        self.text_index_path = settings.TEXT_INDEX_PATH
         self._init_faiss_index()
 
+    @property
+    def _text_data_path(self) -> str:
+        return f"{self.text_index_path}.texts.arrow"
+
+    def _read_text_contents(self) -> Optional[pa.Array]:
+        """读取落盘的文本列（Arrow IPC文件），兼容旧版JSON列表格式"""
+        if os.path.exists(self._text_data_path):
+            with pa.OSFile(self._text_data_path, 'rb') as source:
+                return pa.ipc.open_file(source).read_all().column("content").combine_chunks()
+
+        legacy_path = f"{self.text_index_path}.texts.json"
+        if os.path.exists(legacy_path):
+            with open(legacy_path, 'rb') as f:
+                return pa.array(orjson.loads(f.read()), type=pa.string())
+        return None
+
     def _init_faiss_index(self):
-        """初始化FAISS索引"""
-        dimension = 384  # 模型维度
-        self.text_index = faiss.IndexFlatL2(dimension)
+        """初始化FAISS索引（ID映射的HNSW，内积度量），存在落盘的索引时直接加载，无需重新编码"""
+        self.text_index = faiss.IndexIDMap2(new_hnsw_index())
+        if not os.path.exists(self.text_index_path):
+            return
+
+        try:
+            text_index = faiss.read_index(self.text_index_path)
+            text_contents = self._read_text_contents()
+        except Exception as e:
+            logger.warning(f"加载文本索引失败，将重新建立: {e}")
+            return
+        if text_contents is None:
+            return
+
+        # 索引与文本分两个文件写入，条数不一致说明上次写入中断
+        if text_index.ntotal != len(text_contents):
+            logger.warning(f"文本索引与文本数据条数不一致（{text_index.ntotal} / {len(text_contents)}），将重新建立")
+            return
+
+        texts = text_contents.to_pylist()
+        self._text_digests = {xxhash.xxh3_128_digest(text) for text in texts}
+        if not (isinstance(text_index, faiss.IndexIDMap2) and tune_loaded_index(text_index)):
+            # 旧版 IndexFlatL2 / 未做ID映射的HNSW索引：按保存的文本重新编码建立
+            logger.info(f"文本索引转换为ID映射的HNSW索引，重新编码 {len(texts)} 条文本")
+            self._add_texts(texts)
+            self._save_text_index()
+            return
+
+        self.text_index = text_index
+        self.text_contents = text_contents
+        logger.info(f"加载文本索引: {self.text_index_path}, 共 {text_index.ntotal} 条")
+
+    def _save_text_index(self):
+        """索引与文本分别先写临时文件再替换，文本列以Arrow IPC格式保存"""
+        os.makedirs(os.path.dirname(self.text_index_path), exist_ok=True)
+        faiss.write_index(self.text_index, f"{self.text_index_path}.tmp")
+        os.replace(f"{self.text_index_path}.tmp", self.text_index_path)
+
+        table = pa.table({"content": self.text_contents})
+        with pa.OSFile(f"{self._text_data_path}.tmp", 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(f"{self._text_data_path}.tmp", self._text_data_path)
 
     def index_texts(self, texts: List[str]):
-        """索引文本"""
-        embeddings = self.embedding_model.encode(texts)
-        if len(self.text_data) == 0:
-            self.text_index.add(embeddings)
-        else:
-            # 增量添加
-            self.text_index.add(embeddings)
-        self.text_data.extend(texts)
+        """索引文本，按内容摘要跳过已索引的文本，新增后落盘"""
+        new_texts = []
+        for text in texts:
+            digest = xxhash.xxh3_128_digest(text)
+            if digest not in self._text_digests:
+                self._text_digests.add(digest)
+                new_texts.append(text)
+        if not new_texts:
+            return
+
+        self._add_texts(new_texts)
+        self._save_text_index()
+
+    def _add_texts(self, texts: List[str]):
+        # 整批一次编码，由模型按 batch_size 分批做前向计算；归一化后内积即余弦相似度
+        embeddings = self.embedding_model.encode(
+            texts, batch_size=INDEX_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True
+        )
+        start = self.text_index.ntotal
+        self.text_index.add_with_ids(embeddings, np.arange(start, start + len(texts), dtype=np.int64))
+        self.text_contents = pa.concat_arrays([self.text_contents, pa.array(texts, type=pa.string())])
+
+    def search_texts(self, query: str, top_k: int = 5) -> List[Dict]:
+        """在已索引的文本中检索，FAISS返回的ID即行号，直接从文本列中批量取出正文"""
+        if self.text_index.ntotal == 0:
+            return []
+
+        scores, ids = self.text_index.search(self._encode_queries([query]), top_k)
+        found = ids[0] >= 0
+        row_ids = ids[0][found]
+        contents = pc.take(self.text_contents, pa.array(row_ids)).to_pylist()
+        return [
+            {"id": int(row_id), "content": content, "score": float(score)}
+            for row_id, content, score in zip(row_ids, contents, scores[0][found])
+        ]
 
     def retrieve_from_knowledge(self, query: str, top_k: int = 5) -> List[Dict]:
-        """从知识库检索"""
-        # 1. 从MySQL检索
+        """从知识库检索（同步版本，供非异步调用方使用；请求处理走 aretrieve_from_knowledge）"""
+        # 1. 从MySQL检索（FULLTEXT索引按相关度取前 top_k 条，只查询用到的列）
+        knowledge_match = match(TextbookKnowledge.title, TextbookKnowledge.content, against=query)
+        qa_match = match(QAPair.question, QAPair.answer, against=query)
+
         db_session = SessionLocal()
         try:
             # 全文搜索
-            knowledge_results = db_session.query(TextbookKnowledge).filter(
-                TextbookKnowledge.content.contains(query)
-            ).limit(top_k).all()
+            knowledge_rows = db_session.execute(
+                select(TextbookKnowledge.id, TextbookKnowledge.content, knowledge_match.label("relevance"))
+                .where(knowledge_match)
+                .order_by(desc("relevance"))
+                .limit(top_k)
+            ).all()
 
             # QA对搜索
-            qa_results = db_session.query(QAPair).filter(
-                QAPair.question.contains(query) | QAPair.answer.contains(query)
-            ).limit(top_k).all()
-
-            results = []
-            for item in knowledge_results + qa_results:
-                results.append({
-                    "type": "textbook" if isinstance(item, TextbookKnowledge) else "qa_pair",
-                    "content": item.content if isinstance(item,
-                                                          TextbookKnowledge) else f"Q: {item.question}\nA: {item.answer}",
-                    "score": 1.0  # 简单匹配分数
-                })
-
-            return results
+            qa_rows = db_session.execute(
+                select(QAPair.id, QAPair.question, QAPair.answer, qa_match.label("relevance"))
+                .where(qa_match)
+                .order_by(desc("relevance"))
+                .limit(top_k)
+            ).all()
         finally:
             db_session.close()
 
-    def retrieve_from_memory(self, query: str, top_k: int = 5) -> List[Dict]:
-        """从模型记忆检索"""
+        # 相关度按各自最大值归一化为 0~1 的分数
+        max_relevance = max((row.relevance for row in knowledge_rows), default=0) or 1.0
+        max_qa_relevance = max((row.relevance for row in qa_rows), default=0) or 1.0
+        results = [
+            {"id": row.id, "type": "textbook", "content": row.content, "score": row.relevance / max_relevance}
+            for row in knowledge_rows
+        ]
+        results.extend(
+            {
+                "id": row.id,
+                "type": "qa_pair",
+                "content": f"Q: {row.question}\nA: {row.answer}",
+                "score": row.relevance / max_qa_relevance
+            }
+            for row in qa_rows
+        )
+        return results
+
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """批量编码查询为归一化向量，一次前向计算完成全部子问题（重复出现的子问题复用分词结果）"""
+        return get_query_encoder(self.embedding_model).encode(queries)
+
+    async def aretrieve_from_knowledge(self, query: str, top_k: int = 5,
+                                       embedding: np.ndarray = None) -> List[Dict]:
+        """从知识库检索（异步）
+
+        教材知识为混合检索：向量索引按余弦相似度、FULLTEXT索引按相关度各取候选，
+        相关度按最大值归一化后与相似度加权合并；问答对走FULLTEXT索引。
+        embedding 为调用方已编码好的查询向量（1 x dim），不传时在此编码。
+        """
+        if embedding is None:
+            embedding = await asyncio.to_thread(self._encode_queries, [query])
+
+        num_candidates = top_k * HYBRID_CANDIDATE_FACTOR
+        knowledge_match = match(TextbookKnowledge.title, TextbookKnowledge.content, against=query)
+        qa_match = match(QAPair.question, QAPair.answer, against=query)
+
+        (scores, ids), fulltext_rows, qa_rows = await asyncio.gather(
+            asyncio.to_thread(self.knowledge_index.search, embedding, num_candidates),
+            _fetch_rows(
+                select(TextbookKnowledge.id, TextbookKnowledge.content,
+                       knowledge_match.label("relevance"))
+                .where(knowledge_match)
+                .order_by(desc("relevance"))
+                .limit(num_candidates)
+            ),
+            _fetch_rows(
+                select(QAPair.id, QAPair.question, QAPair.answer, qa_match.label("relevance"))
+                .where(qa_match)
+                .order_by(desc("relevance"))
+                .limit(top_k)
+            )
+        )
+
+        cosine = {int(i): float(score) for i, score in zip(ids[0], scores[0]) if i >= 0}
+        contents = {row.id: row.content for row in fulltext_rows}
+        relevance = {row.id: row.relevance for row in fulltext_rows}
+
+        # 只被向量检索召回的知识需要补查正文；只被全文检索召回的补算相似度
+        vector_only = [i for i in cosine if i not in contents]
+        fulltext_only = [i for i in contents if i not in cosine]
+        hydrated, extra_cosine = await asyncio.gather(
+            _fetch_rows(
+                select(TextbookKnowledge.id, TextbookKnowledge.content)
+                .where(TextbookKnowledge.id.in_(vector_only))
+            ) if vector_only else asyncio.sleep(0, result=[]),
+            asyncio.to_thread(self.knowledge_index.similarity, embedding[0], fulltext_only)
+        )
+        contents.update((row.id, row.content) for row in hydrated)
+        cosine.update(zip(fulltext_only, extra_cosine))
+
+        max_relevance = max(relevance.values(), default=0) or 1.0
+        knowledge = sorted(
+            (
+                {
+                    "id": knowledge_id,
+                    "type": "textbook",
+                    "content": content,
+                    "score": HYBRID_VECTOR_WEIGHT * cosine.get(knowledge_id, 0.0)
+                             + HYBRID_FULLTEXT_WEIGHT * relevance.get(knowledge_id, 0.0) / max_relevance
+                }
+                for knowledge_id, content in contents.items()
+            ),
+            key=lambda item: item["score"],
+            reverse=True
+        )[:top_k]
+
+        max_qa_relevance = max((row.relevance for row in qa_rows), default=0) or 1.0
+        return knowledge + [
+            {
+                "id": row.id,
+                "type": "qa_pair",
+                "content": f"Q: {row.question}\nA: {row.answer}",
+                "score": row.relevance / max_qa_relevance
+            }
+            for row in qa_rows
+        ]
+
+    def retrieve_from_memory(self, query: str, top_k: int = 5,
+                             sub_questions: Optional[List[str]] = None) -> List[Dict]:
+        """从模型记忆检索，已分解好的候选问题可通过 sub_questions 传入"""
         # 1. 生成候选问题
-        sub_questions = self.llm_service.generate_sub_questions(query)
+        if sub_questions is None:
+            sub_questions = self.llm_service.generate_sub_questions(query)
 
         all_memories = []
-        with self.neo4j_client.driver.session() as session:
+        with self.neo4j_client.session() as session:
             for sub_q in sub_questions:
                 # 从Neo4j检索相关记忆
                 memories = self.neo4j_client.search_similar_memories(session, sub_q, limit=3)
@@ -87,6 +305,34 @@ class RetrieverService:
         all_memories.sort(key=lambda x: x["score"], reverse=True)
         return all_memories[:top_k]
 
+    async def aretrieve_from_memory(self, query: str, top_k: int = 5,
+                                    sub_questions: Optional[List[str]] = None) -> List[Dict]:
+        """从模型记忆检索（异步），各候选问题的Neo4j查询并发执行"""
+        # 1. 生成候选问题（同步LLM调用，放到线程中执行）
+        if sub_questions is None:
+            sub_questions = await asyncio.to_thread(self.llm_service.generate_sub_questions, query)
+
+        results = await asyncio.gather(*[
+            self.neo4j_client.asearch_similar_memories(sub_q, limit=3)
+            for sub_q in sub_questions
+        ])
+
+        all_memories = [
+            {
+                "entity": record["entity"],
+                "type": record["type"],
+                "properties": record["properties"],
+                "score": record["score"],
+                "query": sub_q
+            }
+            for sub_q, memories in zip(sub_questions, results)
+            for record in memories
+        ]
+
+        # 按分数排序并取top_k
+        all_memories.sort(key=lambda x: x["score"], reverse=True)
+        return all_memories[:top_k]
+
     def retrieve(self, query: str, top_k: int = 5) -> Dict[str, Any]:
         """综合检索"""
         # 生成子问题
@@ -101,29 +347,63 @@ class RetrieverService:
             knowledge = self.retrieve_from_knowledge(sub_q, top_k=3)
             knowledge_results.extend(knowledge)
 
-            # 检索记忆
-            memories = self.retrieve_from_memory(sub_q, top_k=3)
+            # 检索记忆（子问题已分解，不再逐个调用LLM二次分解）
+            memories = self.retrieve_from_memory(sub_q, top_k=3, sub_questions=[sub_q])
             memory_results.extend(memories)
 
         # 去重和排序
-        knowledge_results = self._deduplicate_and_sort(knowledge_results)
-        memory_results = self._deduplicate_and_sort(memory_results)
+        knowledge_results = self._deduplicate_and_sort(knowledge_results, top_k)
+        memory_results = self._deduplicate_and_sort(memory_results, top_k)
 
         return {
-            "knowledge": knowledge_results[:top_k],
-            "memory": memory_results[:top_k],
+            "knowledge": knowledge_results,
+            "memory": memory_results,
             "sub_questions": sub_questions
         }
 
-    def _deduplicate_and_sort(self, items: List[Dict]) -> List[Dict]:
-        """去重和排序"""
+    async def aretrieve(self, query: str, top_k: int = 5) -> Dict[str, Any]:
+        """综合检索（异步），各子问题的知识库与记忆检索全部并发执行"""
+        # 生成子问题，并一次性批量编码全部子问题
+        sub_questions = await asyncio.to_thread(self.llm_service.generate_sub_questions, query)
+        embeddings = await asyncio.to_thread(self._encode_queries, sub_questions)
+
+        results = await asyncio.gather(*[
+            asyncio.gather(
+                self.aretrieve_from_knowledge(sub_q, top_k=3, embedding=embeddings[i:i + 1]),
+                self.aretrieve_from_memory(sub_q, top_k=3, sub_questions=[sub_q])
+            )
+            for i, sub_q in enumerate(sub_questions)
+        ])
+
+        knowledge_results = []
+        memory_results = []
+        for knowledge, memories in results:
+            knowledge_results.extend(knowledge)
+            memory_results.extend(memories)
+
+        # 去重和排序
+        knowledge_results = self._deduplicate_and_sort(knowledge_results, top_k)
+        memory_results = self._deduplicate_and_sort(memory_results, top_k)
+
+        return {
+            "knowledge": knowledge_results,
+            "memory": memory_results,
+            "sub_questions": sub_questions
+        }
+
+    def _deduplicate_and_sort(self, items: List[Dict], top_k: Optional[int] = None) -> List[Dict]:
+        """去重和排序：按分数降序遍历，同一条知识/记忆只保留分数最高的一条，取够 top_k 条即停止
+
+        候选通常只有几十条，直接在Python中遍历即可：转换为数组再交给编译内核的开销反而更大
+        """
         seen = set()
         unique_items = []
-        for item in items:
-            key = item.get("content") or item.get("entity")
-            if key not in seen:
-                seen.add(key)
-                unique_items.append(item)
-
-        unique_items.sort(key=lambda x: x.get("score", 0), reverse=True)
+        for item in sorted(items, key=lambda x: x.get("score", 0), reverse=True):
+            key = _dedup_key(item)
+            if key in seen:
+                continue
+            seen.add(key)
+            unique_items.append(item)
+            if len(unique_items) == top_k:
+                break
         return unique_items
\ No newline at end of file
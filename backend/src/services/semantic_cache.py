@@ -0,0 +1,270 @@
+# backend/src/services/semantic_cache.py
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+import orjson
+import xxhash
+
+from config.settings import settings
+from database.db_manager import db_manager
+from services.knowledge_index import get_query_encoder
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_PREFIX = "semcache:vec:"
+# 启动重建索引时每批SCAN/读取的键数
+SEMANTIC_CACHE_LOAD_BATCH = 1000
+# 提示词缓存近似匹配时取的候选条数，相同文本可能存在于不同模板/作用域下，逐个检查作用域
+PROMPT_CACHE_CANDIDATES = 8
+
+
+def _entry_id(question: str) -> int:
+    """以问题文本的64位摘要作为条目ID，映射到FAISS要求的有符号int64范围（-1 表示无结果，避开）"""
+    entry_id = xxhash.xxh3_64_intdigest(question) - (1 << 63)
+    return entry_id if entry_id != -1 else 0
+
+
+class SemanticCache:
+    """问答语义缓存，按问题向量的余弦相似度命中，措辞不同的同义问题也能复用已生成的回答
+
+    条目存为Redis哈希 semcache:vec:<id>（向量 + 响应JSON，带过期时间），ID取自问题文本的摘要，
+    同一问题再次写入时覆盖原条目；进程内的内积索引在启动时从Redis重建，命中后再到Redis取响应。
+    """
+
+    def __init__(self, embedding_model,
+                 threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+                 ttl: int = settings.SEMANTIC_CACHE_TTL):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.ttl = ttl
+        self._index = faiss.IndexIDMap2(
+            faiss.IndexFlatIP(embedding_model.get_sentence_embedding_dimension())
+        )
+        # (过期时间, 条目ID)，按写入顺序即按过期顺序；条目被覆盖后旧记录以 _expires_at 为准跳过
+        self._expiry = deque()
+        self._expires_at = {}
+        self._lock = threading.Lock()
+
+    @property
+    def _redis(self):
+        return db_manager._redis_async_client
+
+    async def load(self) -> int:
+        """从Redis重建进程内索引，返回载入的条目数"""
+        if not self._redis:
+            return 0
+
+        loaded = 0
+        keys = [key async for key in self._redis.scan_iter(
+            match=f"{SEMANTIC_CACHE_PREFIX}*", count=SEMANTIC_CACHE_LOAD_BATCH
+        )]
+
+        for start in range(0, len(keys), SEMANTIC_CACHE_LOAD_BATCH):
+            batch = keys[start:start + SEMANTIC_CACHE_LOAD_BATCH]
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in batch:
+                    pipe.hget(key, "emb")
+                    pipe.ttl(key)
+                values = await pipe.execute()
+
+            now = time.monotonic()
+            ids, vectors = [], []
+            for key, vector, remaining in zip(batch, values[::2], values[1::2]):
+                if vector is None or remaining <= 0:
+                    continue
+                entry_id = int(key.rsplit(b":", 1)[1])
+                ids.append(entry_id)
+                vectors.append(np.frombuffer(vector, dtype=np.float32))
+                self._expiry.append((now + remaining, entry_id))
+                self._expires_at[entry_id] = now + remaining
+
+            if ids:
+                with self._lock:
+                    self._index.add_with_ids(np.vstack(vectors), np.asarray(ids, dtype=np.int64))
+                loaded += len(ids)
+
+        self._expiry = deque(sorted(self._expiry))
+        logger.info(f"语义缓存索引重建完成，共 {loaded} 条")
+        return loaded
+
+    def _encode(self, text: str) -> np.ndarray:
+        return get_query_encoder(self.embedding_model).encode([text])
+
+    async def embed(self, text: str) -> np.ndarray:
+        """编码问题为归一化向量（1 x dim），编码在线程中执行，不阻塞事件循环"""
+        return await asyncio.to_thread(self._encode, text)
+
+    async def lookup(self, embedding: np.ndarray) -> Optional[Any]:
+        """查找最相似的已缓存问题，相似度达到阈值时返回其响应"""
+        if not self._redis:
+            return None
+
+        with self._lock:
+            if self._index.ntotal == 0:
+                return None
+            scores, ids = self._index.search(embedding, 1)
+
+        score, entry_id = float(scores[0][0]), int(ids[0][0])
+        if entry_id < 0 or score < self.threshold:
+            return None
+
+        try:
+            payload = await self._redis.hget(f"{SEMANTIC_CACHE_PREFIX}{entry_id}", "resp")
+        except Exception as e:
+            logger.warning(f"读取语义缓存失败: {e}")
+            return None
+
+        if payload is None:
+            # 条目已在Redis过期，从索引中移除
+            with self._lock:
+                self._index.remove_ids(np.asarray([entry_id], dtype=np.int64))
+                self._expires_at.pop(entry_id, None)
+            return None
+
+        logger.debug(f"语义缓存命中: id={entry_id}, score={score:.4f}")
+        return orjson.loads(payload)
+
+    async def store(self, question: str, embedding: np.ndarray, response: Any):
+        """写入缓存条目，并顺带从索引中清理已过期的条目"""
+        if not self._redis:
+            return
+
+        entry_id = _entry_id(question)
+        key = f"{SEMANTIC_CACHE_PREFIX}{entry_id}"
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={
+                    "emb": embedding.tobytes(),
+                    "resp": orjson.dumps(response, default=str)
+                })
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"写入语义缓存失败: {e}")
+            return
+
+        now = time.monotonic()
+        ids = np.asarray([entry_id], dtype=np.int64)
+        with self._lock:
+            if entry_id in self._expires_at:
+                self._index.remove_ids(ids)
+            self._index.add_with_ids(embedding, ids)
+            self._expiry.append((now + self.ttl, entry_id))
+            self._expires_at[entry_id] = now + self.ttl
+
+            expired = []
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, expired_id = self._expiry.popleft()
+                if self._expires_at.get(expired_id) == expires_at:
+                    del self._expires_at[expired_id]
+                    expired.append(expired_id)
+            if expired:
+                self._index.remove_ids(np.asarray(expired, dtype=np.int64))
+
+
+class PromptCache:
+    """LLM调用的进程内语义缓存，相同或近似的提示词直接复用之前的回答
+
+    先按提示词全文摘要精确匹配；调用方给出提示词中随输入变化的部分（semantic_text）时，
+    再按该部分的余弦相似度近似匹配。不对整段提示词做向量匹配：固定模板占了大部分token，
+    不同问题的提示词向量也会非常接近而被误判为相同。semantic_text 超出向量模型输入窗口时同样只做精确匹配。
+    命中还要求作用域一致（调用方命名空间 + 模板 + 采样参数），条目按TTL过期、按LRU淘汰。
+    """
+
+    def __init__(self, embedding_model,
+                 threshold: float = settings.LLM_CACHE_THRESHOLD,
+                 ttl: int = settings.LLM_CACHE_TTL,
+                 max_entries: int = settings.LLM_CACHE_SIZE):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._index = faiss.IndexIDMap2(
+            faiss.IndexFlatIP(embedding_model.get_sentence_embedding_dimension())
+        )
+        # 条目ID -> (摘要, 作用域, 回答, 过期时间, 是否在向量索引中)，按最近使用排序
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._digests: Dict[bytes, int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, messages: List[Dict], scope: Tuple,
+            semantic_text: Optional[str] = None) -> Tuple[Optional[str], tuple]:
+        """查找缓存的回答，返回 (回答或None, 未命中时传给 put 的键)"""
+        text = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        digest = xxhash.xxh3_128_digest(f"{scope}\x00{text}")
+
+        with self._lock:
+            entry_id = self._digests.get(digest)
+            if entry_id is not None:
+                response = self._touch(entry_id, scope)
+                if response is not None:
+                    return response, None
+
+        embedding = None
+        if semantic_text is not None and self._fits(semantic_text):
+            embedding = self._encode(semantic_text)
+        if embedding is not None:
+            with self._lock:
+                if self._index.ntotal:
+                    scores, ids = self._index.search(embedding, PROMPT_CACHE_CANDIDATES)
+                    for score, entry_id in zip(scores[0], ids[0]):
+                        if entry_id < 0 or score < self.threshold:
+                            break
+                        response = self._touch(int(entry_id), scope)
+                        if response is not None:
+                            return response, None
+
+        return None, (digest, scope, embedding)
+
+    def put(self, key: tuple, response: str):
+        """写入 get 未命中时返回的键对应的回答"""
+        digest, scope, embedding = key
+        with self._lock:
+            if digest in self._digests:
+                self._evict(self._digests[digest])
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (digest, scope, response, time.monotonic() + self.ttl, embedding is not None)
+            self._digests[digest] = entry_id
+            if embedding is not None:
+                self._index.add_with_ids(embedding, np.asarray([entry_id], dtype=np.int64))
+
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def _touch(self, entry_id: int, scope: Tuple) -> Optional[str]:
+        """取出未过期且作用域一致的条目并标记为最近使用（需持有锁）"""
+        entry = self._entries.get(entry_id)
+        if entry is None or entry[1] != scope:
+            return None
+        if entry[3] <= time.monotonic():
+            self._evict(entry_id)
+            return None
+        self._entries.move_to_end(entry_id)
+        return entry[2]
+
+    def _evict(self, entry_id: int):
+        """移除条目（需持有锁）"""
+        digest, _, _, _, indexed = self._entries.pop(entry_id)
+        self._digests.pop(digest, None)
+        if indexed:
+            self._index.remove_ids(np.asarray([entry_id], dtype=np.int64))
+
+    def _fits(self, text: str) -> bool:
+        """文本编码后是否不超过向量模型的最大输入长度"""
+        max_length = getattr(self.embedding_model, "max_seq_length", None)
+        if not max_length:
+            return False
+        return get_query_encoder(self.embedding_model).token_count(text) <= max_length
+
+    def _encode(self, text: str) -> np.ndarray:
+        # 分词结果已在 _fits 中缓存，这里只做前向计算
+        return get_query_encoder(self.embedding_model).encode([text])
@@ -0,0 +1,75 @@
+# backend/src/services/task_queue.py
+import logging
+from typing import Any, Dict, Optional
+
+from arq import create_pool
+from arq.connections import ArqRedis, RedisSettings
+from arq.jobs import Job, JobStatus
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# API进程与worker进程共用的Redis连接配置
+redis_settings = RedisSettings(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    database=settings.REDIS_DB,
+    password=settings.REDIS_PASSWORD
+)
+
+
+class TaskQueue:
+    """任务队列客户端，负责向 arq worker 投递耗时任务并查询任务状态"""
+
+    def __init__(self):
+        self._pool: Optional[ArqRedis] = None
+
+    async def init(self):
+        """初始化任务队列连接"""
+        try:
+            self._pool = await create_pool(redis_settings)
+            logger.info("任务队列连接成功")
+        except Exception as e:
+            logger.warning(f"任务队列连接失败，后台任务将不可用: {e}")
+            self._pool = None
+
+    @property
+    def available(self) -> bool:
+        return self._pool is not None
+
+    async def enqueue(self, function: str, *args: Any) -> str:
+        """投递任务，返回任务ID"""
+        if not self._pool:
+            raise Exception("任务队列未初始化")
+
+        job = await self._pool.enqueue_job(function, *args)
+        return job.job_id
+
+    async def get_status(self, job_id: str) -> Dict[str, Any]:
+        """查询任务状态，已完成的任务附带执行结果"""
+        if not self._pool:
+            raise Exception("任务队列未初始化")
+
+        job = Job(job_id, self._pool)
+        status = await job.status()
+        info = {"job_id": job_id, "status": status.value}
+
+        if status == JobStatus.complete:
+            result_info = await job.result_info()
+            if result_info:
+                info["success"] = result_info.success
+                info["result"] = result_info.result if result_info.success else str(result_info.result)
+                info["finished_at"] = result_info.finish_time
+
+        return info
+
+    async def close(self):
+        """关闭任务队列连接"""
+        if self._pool:
+            await self._pool.close()
+            logger.info("任务队列连接已关闭")
+
+
+# 全局任务队列实例
+task_queue = TaskQueue()
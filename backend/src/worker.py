@@ -0,0 +1,89 @@
+# backend/src/worker.py
+"""arq 后台任务 worker
+
+启动方式（在 backend/src 目录下执行）：
+    arq worker.WorkerSettings
+"""
+import asyncio
+import logging
+
+from config.settings import settings
+from database.db_manager import db_manager
+from services.data_synthesizer import DataSynthesizer
+from services.knowledge_index import KnowledgeIndex
+from services.task_queue import redis_settings
+
+logger = logging.getLogger(__name__)
+
+# 索引文件只允许一个写入方，同一worker内的索引任务串行执行
+_index_lock = asyncio.Lock()
+
+
+async def startup(ctx):
+    """worker启动时初始化数据库连接"""
+    db_manager.init_mysql()
+    db_manager.init_neo4j()
+    ctx['knowledge_index'] = KnowledgeIndex()
+    ctx['data_synthesizer'] = DataSynthesizer()
+    logger.info("后台任务worker启动完成")
+
+
+async def shutdown(ctx):
+    """worker关闭时释放数据库连接与LLM会话"""
+    await ctx['data_synthesizer'].llm_service.aclose()
+    await db_manager.close_async()
+
+
+async def backup_mysql_task(ctx):
+    """MySQL备份任务"""
+    backup_file = await db_manager.backup_mysql()
+    if not backup_file:
+        raise Exception("MySQL备份失败")
+    logger.info(f"MySQL备份任务完成: {backup_file}")
+    return backup_file
+
+
+async def backup_neo4j_task(ctx):
+    """Neo4j备份任务"""
+    backup_file = await asyncio.to_thread(db_manager.backup_neo4j_parquet)
+    if not backup_file:
+        raise Exception("Neo4j备份失败")
+    logger.info(f"Neo4j备份任务完成: {backup_file}")
+    return backup_file
+
+
+async def index_knowledge_task(ctx):
+    """知识向量增量索引任务，每次写入知识后投递，追上所有未索引的记录"""
+    async with _index_lock:
+        indexed = await asyncio.to_thread(ctx['knowledge_index'].sync_from_db)
+    logger.info(f"向量索引任务完成，新增 {indexed} 条")
+    return indexed
+
+
+async def reindex_knowledge_task(ctx, knowledge_id: int):
+    """单条知识修改或删除后重建其向量，增量同步只覆盖新增记录"""
+    async with _index_lock:
+        changed = await asyncio.to_thread(ctx['knowledge_index'].reindex, knowledge_id)
+    logger.info(f"知识 {knowledge_id} 向量重建完成, 索引{'已更新' if changed else '无变化'}")
+    return changed
+
+
+async def synthesize_qa_task(ctx, textbook_title: str, num_agents: int):
+    """问答对合成任务，多轮LLM调用耗时较长，在worker中执行不占用API进程"""
+    qa_pairs = await ctx['data_synthesizer'].synthesize_qa_pairs(textbook_title, num_agents)
+    logger.info(f"数据合成完成: 生成 {len(qa_pairs)} 个问答对")
+    return qa_pairs
+
+
+class WorkerSettings:
+    """arq worker配置"""
+    functions = [
+        backup_mysql_task, backup_neo4j_task, index_knowledge_task,
+        reindex_knowledge_task, synthesize_qa_task,
+    ]
+    redis_settings = redis_settings
+    on_startup = startup
+    on_shutdown = shutdown
+    max_jobs = settings.WORKER_MAX_JOBS
+    job_timeout = settings.WORKER_JOB_TIMEOUT
+    max_tries = 3